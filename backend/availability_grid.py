@@ -0,0 +1,201 @@
+"""
+Vectorized availability engine - the scheduling horizon as a NumPy grid of fixed quanta
+"""
+from datetime import datetime, date, time, timedelta
+from typing import List, Dict, Tuple, Optional, Iterable
+from work_calendar import work_calendar_for
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the interval engine works without it
+    np = None
+
+DEFAULT_QUANTUM_MINUTES = 15
+
+
+def grid_engine_available() -> bool:
+    """Whether NumPy is installed so the grid engine can be used"""
+    return np is not None
+
+
+class AvailabilityGrid:
+    """
+    Free/busy state of a date range in fixed-size quanta (15 minutes by default)
+    
+    Work hours, excluded dates and busy intervals are stamped in with vectorized
+    range operations; free runs are found with diff over the whole grid at once.
+    Exposes the same covers()/free_gaps()/add_sessions()/remove_slot() surface as
+    BusyIndex, so it can be passed wherever scheduling accepts a busy index.
+    
+    Times that do not fall on a quantum boundary are rounded conservatively:
+    work hours shrink inwards, busy intervals grow outwards.
+    """
+    
+    def __init__(self, start_date: date, end_date: date, calendar_settings: Dict,
+                 quantum_minutes: int = DEFAULT_QUANTUM_MINUTES, exclude_task_id: int = None):
+        if np is None:
+            raise ImportError("The grid availability engine requires numpy")
+        if (24 * 60) % quantum_minutes:
+            raise ValueError("quantum_minutes must divide a day evenly")
+        
+        self.start_date = start_date
+        self.end_date = end_date
+        self.origin = datetime.combine(start_date, time.min)
+        self.quantum = timedelta(minutes=quantum_minutes)
+        self.quantum_minutes = quantum_minutes
+        self.exclude_task_id = exclude_task_id
+        self.days = (end_date - start_date).days + 1
+        self.per_day = (24 * 60) // quantum_minutes
+        
+        self._work = self._stamp_work_hours(calendar_settings)
+        self._busy = np.zeros(self.days * self.per_day, dtype=np.int32)
+        self._slots = {}
+        self._runs = None
+    
+    @classmethod
+    def from_busy_index(cls, busy, start_date: date, end_date: date, calendar_settings: Dict,
+                        exclude_task_id: int = None,
+                        quantum_minutes: int = DEFAULT_QUANTUM_MINUTES) -> 'AvailabilityGrid':
+        """Build a grid from the intervals of a BusyIndex covering the range"""
+        grid = cls(start_date, end_date, calendar_settings, quantum_minutes, exclude_task_id)
+        grid.stamp(
+            (entry.start, entry.end, entry.id if entry.kind == 'slot' else None)
+            for entry in busy.overlapping(grid.origin, grid.range_end, exclude_task_id=exclude_task_id)
+        )
+        return grid
+    
+    @property
+    def range_end(self) -> datetime:
+        return self.origin + timedelta(days=self.days)
+    
+    def _stamp_work_hours(self, calendar_settings: Dict):
+        """Boolean grid of work quanta: work days x work hours, minus excluded dates and ranges"""
+        calendar = work_calendar_for(calendar_settings)
+        
+        weekdays = (self.start_date.weekday() + np.arange(self.days)) % 7
+        is_work_day = np.isin(weekdays, sorted(calendar.work_days))
+        
+        for first, last in calendar.excluded_spans_between(self.start_date, self.end_date):
+            is_work_day[(first - self.start_date).days:(last - self.start_date).days + 1] = False
+        
+        work_start, work_end = calendar.work_start, calendar.work_end
+        first = -(-(work_start.hour * 60 + work_start.minute) // self.quantum_minutes)
+        last = (work_end.hour * 60 + work_end.minute) // self.quantum_minutes
+        
+        time_of_day = np.zeros(self.per_day, dtype=bool)
+        time_of_day[first:last] = True
+        
+        return np.outer(is_work_day, time_of_day).ravel()
+    
+    def _floor(self, moment: datetime) -> int:
+        return int((moment - self.origin) // self.quantum)
+    
+    def _ceil(self, moment: datetime) -> int:
+        return -int((self.origin - moment) // self.quantum)
+    
+    def _to_datetime(self, index: int) -> datetime:
+        return self.origin + self.quantum * int(index)
+    
+    def stamp(self, intervals: Iterable[Tuple[datetime, datetime, Optional[int]]]):
+        """Mark (start, end, slot_id) intervals busy in one vectorized pass"""
+        intervals = list(intervals)
+        if not intervals:
+            return
+        
+        size = self._busy.size
+        starts = np.clip([self._floor(start) for start, _, _ in intervals], 0, size)
+        ends = np.clip([self._ceil(end) for _, end, _ in intervals], 0, size)
+        
+        edges = np.zeros(size + 1, dtype=np.int32)
+        np.add.at(edges, starts, 1)
+        np.add.at(edges, ends, -1)
+        self._busy += np.cumsum(edges[:-1], dtype=np.int32)
+        
+        for (_, _, slot_id), first, last in zip(intervals, starts, ends):
+            if slot_id is not None:
+                self._slots[slot_id] = (int(first), int(last))
+        self._runs = None
+    
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies inside the grid"""
+        return self.origin <= start and end <= self.range_end
+    
+    def covers_dates(self, start_date: date, end_date: date) -> bool:
+        """Whether whole days start_date..end_date lie inside the grid"""
+        return self.start_date <= start_date and end_date <= self.end_date
+    
+    def add(self, start: datetime, end: datetime, kind: str = 'slot',
+            id: int = None, task_id: int = None, title: str = None):
+        """Record a new busy interval"""
+        self.stamp([(start, end, id if kind == 'slot' else None)])
+    
+    def add_sessions(self, sessions: Iterable[Dict], slot_ids: Iterable[Optional[int]] = None):
+        """Record session dicts (as built by create_task_sessions) as busy"""
+        sessions = list(sessions)
+        slot_ids = list(slot_ids) if slot_ids is not None else [None] * len(sessions)
+        self.stamp(
+            (datetime.fromisoformat(session['start_datetime']),
+             datetime.fromisoformat(session['end_datetime']),
+             slot_id)
+            for session, slot_id in zip(sessions, slot_ids)
+        )
+    
+    def remove_slot(self, slot_id: int) -> bool:
+        """Drop a scheduled slot from the grid, returns True if it was present"""
+        span = self._slots.pop(slot_id, None)
+        if span is None:
+            return False
+        self._busy[span[0]:span[1]] -= 1
+        self._runs = None
+        return True
+    
+    def _free(self):
+        return self._work & (self._busy == 0)
+    
+    def _free_runs(self):
+        """Start/end quantum indexes of every free run, split at midnight"""
+        if self._runs is None:
+            per_day = self.per_day
+            padded = np.zeros((self.days, per_day + 2), dtype=np.int8)
+            padded[:, 1:-1] = self._free().reshape(self.days, per_day)
+            edges = np.diff(padded, axis=1)
+            
+            run_starts = np.flatnonzero(edges == 1)
+            run_ends = np.flatnonzero(edges == -1)
+            # Row-major positions in the (days, per_day + 1) edge matrix -> grid indexes
+            run_starts = (run_starts // (per_day + 1)) * per_day + run_starts % (per_day + 1)
+            run_ends = (run_ends // (per_day + 1)) * per_day + run_ends % (per_day + 1)
+            self._runs = (run_starts, run_ends)
+        return self._runs
+    
+    def _check_exclusion(self, exclude_task_id: Optional[int]):
+        if exclude_task_id != self.exclude_task_id:
+            raise ValueError(
+                f"Grid was built excluding task {self.exclude_task_id}, not {exclude_task_id}"
+            )
+    
+    def free_gaps(self, start: datetime, end: datetime,
+                  exclude_task_id: int = None) -> List[Tuple[datetime, datetime]]:
+        """Free work sub-ranges of [start, end) as (start, end) tuples"""
+        self._check_exclusion(exclude_task_id)
+        run_starts, run_ends = self._free_runs()
+        first, last = self._ceil(start), self._floor(end)
+        
+        low = int(np.searchsorted(run_ends, first, side='right'))
+        high = int(np.searchsorted(run_starts, last, side='left'))
+        
+        gaps = []
+        for run_start, run_end in zip(run_starts[low:high], run_ends[low:high]):
+            gap_start, gap_end = max(run_start, first), min(run_end, last)
+            if gap_start < gap_end:
+                gaps.append((self._to_datetime(gap_start), self._to_datetime(gap_end)))
+        return gaps
+    
+    def free_hours(self, start: datetime = None, end: datetime = None,
+                   exclude_task_id: int = None) -> float:
+        """Total free work hours in [start, end) (the whole grid by default)"""
+        self._check_exclusion(exclude_task_id)
+        first = self._ceil(start) if start else 0
+        last = self._floor(end) if end else self._busy.size
+        free_quanta = int(np.count_nonzero(self._free()[max(first, 0):max(last, 0)]))
+        return free_quanta * self.quantum_minutes / 60
@@ -0,0 +1,117 @@
+"""
+Blocked-time occurrences - blocked times expanded into a range-indexed table
+
+Every blocked time is materialized in blocked_time_occurrences: a one-off block
+as a single row, a recurring one (rrule) as one row per occurrence up to a
+rolling horizon. Conflict and availability queries read occurrences, so a
+weekly meeting blocks every week instead of only its first.
+"""
+import threading
+from datetime import datetime, date, time, timedelta
+from typing import List, Dict, Optional
+from database import db
+from rrule_utils import RecurrenceError, compile_rrule, rrule_between
+
+
+# Recurring blocks are expanded at least this far ahead; further on demand
+BLOCK_HORIZON_DAYS = 400
+
+_expanded_until: Optional[date] = None
+_expand_lock = threading.RLock()
+
+
+def expand_blocked_time(block: Dict, until: date) -> int:
+    """
+    Materialize a block's occurrences up to until (inclusive)
+    Continues after the block's expanded_until, so repeated calls only add new rows
+    Returns number of occurrences added
+    """
+    start = datetime.fromisoformat(block['start_datetime'])
+    duration = datetime.fromisoformat(block['end_datetime']) - start
+    
+    if block['rrule']:
+        try:
+            compile_rrule(block['rrule'], start)
+        except Exception as e:
+            raise RecurrenceError(f"Invalid rrule: {str(e)}")
+        
+        after = start
+        if block['expanded_until']:
+            after = datetime.combine(date.fromisoformat(block['expanded_until']) + timedelta(days=1), time.min)
+        starts = rrule_between(block['rrule'], start, after, datetime.combine(until, time.max))
+        expanded_until = until
+    else:
+        starts = [] if block['expanded_until'] else [start]
+        expanded_until = date.max
+    
+    rows = [
+        {
+            'block_id': block['id'],
+            'start_datetime': occurrence.isoformat(),
+            'end_datetime': (occurrence + duration).isoformat()
+        }
+        for occurrence in starts
+    ]
+    with db.transaction():
+        db.insert_many('blocked_time_occurrences', rows)
+        db.update('blocked_times', {'expanded_until': expanded_until.isoformat()}, 'id = ?', (block['id'],))
+    return len(rows)
+
+
+def ensure_block_occurrences(until: date):
+    """Make sure every blocked time is expanded through until (and the rolling horizon)"""
+    if _expanded_until is not None and until <= _expanded_until:
+        return
+    
+    with _expand_lock:
+        if _expanded_until is not None and until <= _expanded_until:
+            return
+        
+        target = max(until, date.today() + timedelta(days=BLOCK_HORIZON_DAYS))
+        blocks = db.execute("""
+            SELECT * FROM blocked_times
+            WHERE expanded_until IS NULL OR expanded_until < ?
+        """, (target.isoformat(),))
+        for block in blocks:
+            try:
+                expand_blocked_time(block, target)
+            except RecurrenceError:
+                # A stored rule that no longer parses still blocks its first occurrence
+                expand_blocked_time({**block, 'rrule': None}, target)
+        
+        # Inside a transaction the occurrences only count once it commits
+        db.after_commit(lambda: _advance_expanded_until(target))
+
+
+def _advance_expanded_until(target: date):
+    global _expanded_until
+    with _expand_lock:
+        if _expanded_until is None or _expanded_until < target:
+            _expanded_until = target
+
+
+def materialize_blocked_time(block_id: int) -> int:
+    """Expand a newly created blocked time to the current horizon"""
+    block = db.execute_one("SELECT * FROM blocked_times WHERE id = ?", (block_id,))
+    if not block:
+        raise RecurrenceError(f"Blocked time {block_id} not found")
+    
+    until = date.today() + timedelta(days=BLOCK_HORIZON_DAYS)
+    if _expanded_until is not None:
+        until = max(until, _expanded_until)
+    return expand_blocked_time(block, until)
+
+
+def blocked_occurrences(range_start: datetime, range_end: datetime) -> List[Dict]:
+    """
+    Blocked-time occurrences overlapping [range_start, range_end), by start time
+    Rows carry the block's id and title, like rows of blocked_times
+    """
+    ensure_block_occurrences(range_end.date())
+    return db.execute("""
+        SELECT b.id, b.title, o.start_datetime, o.end_datetime
+        FROM blocked_time_occurrences o
+        JOIN blocked_times b ON o.block_id = b.id
+        WHERE o.start_datetime < ? AND o.end_datetime > ?
+        ORDER BY o.start_datetime
+    """, (range_end.isoformat(), range_start.isoformat()))
@@ -0,0 +1,204 @@
+"""
+In-memory free/busy index over scheduled slots and blocked times
+"""
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, date, time, timedelta
+from typing import List, Dict, Tuple, Optional, Iterable
+
+
+def parse_stored_datetime(value: str) -> datetime:
+    """Parse a stored timestamp as naive local time (older rows may carry +00:00 or Z)"""
+    return datetime.fromisoformat(value.replace('Z', '')).replace(tzinfo=None)
+
+
+def stored_duration_hours(start: str, end: str) -> float:
+    """Exact hours between two stored timestamps (julianday differences carry float noise)"""
+    return (parse_stored_datetime(end) - parse_stored_datetime(start)).total_seconds() / 3600
+
+
+@dataclass
+class BusyInterval:
+    """A busy period: either an incomplete scheduled slot or a blocked time"""
+    start: datetime
+    end: datetime
+    kind: str  # 'slot' or 'block'
+    id: Optional[int] = None
+    task_id: Optional[int] = None
+    title: Optional[str] = None
+    
+    def as_conflict(self) -> Dict:
+        """Shape used by has_conflict() results"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'start_datetime': self.start.isoformat(),
+            'end_datetime': self.end.isoformat()
+        }
+
+
+class BusyIndex:
+    """
+    Busy intervals for a horizon, kept sorted by start time
+    
+    Loaded with two range queries, then answers overlap and free-gap questions
+    with bisect. Callers keep it current with add()/remove_slot() as they place
+    or drop sessions.
+    """
+    
+    def __init__(self, range_start: datetime, range_end: datetime):
+        self.range_start = range_start
+        self.range_end = range_end
+        self._starts: List[datetime] = []
+        self._entries: List[BusyInterval] = []
+        self._max_duration = timedelta(0)
+    
+    @classmethod
+    def load(cls, range_start: datetime, range_end: datetime) -> 'BusyIndex':
+        """Build an index from the database for [range_start, range_end)"""
+        # Imported here so in-memory use (scenario workers) never opens the database
+        from database import db
+        from block_occurrences import blocked_occurrences
+        from rrule_utils import virtual_instances
+        
+        index = cls(range_start, range_end)
+        
+        # Recurring instances without slot rows (virtual or past the rolling
+        # horizon) are expanded in memory
+        slots = db.execute("""
+            SELECT s.id, s.task_id, t.title, s.start_datetime, s.end_datetime
+            FROM scheduled_slots s
+            JOIN tasks t ON s.task_id = t.id
+            WHERE s.completed = 0
+            AND NOT (s.end_datetime <= ? OR s.start_datetime >= ?)
+        """, (range_start.isoformat(), range_end.isoformat()))
+        slots += virtual_instances(range_start, range_end)
+        
+        blocks = blocked_occurrences(range_start, range_end)
+        
+        entries = [
+            BusyInterval(
+                start=parse_stored_datetime(row['start_datetime']),
+                end=parse_stored_datetime(row['end_datetime']),
+                kind='slot',
+                id=row['id'],
+                task_id=row['task_id'],
+                title=row['title']
+            )
+            for row in slots
+        ] + [
+            BusyInterval(
+                start=parse_stored_datetime(row['start_datetime']),
+                end=parse_stored_datetime(row['end_datetime']),
+                kind='block',
+                id=row['id'],
+                title=row['title']
+            )
+            for row in blocks
+        ]
+        index._bulk_load(entries)
+        return index
+    
+    @classmethod
+    def from_intervals(cls, range_start: datetime, range_end: datetime,
+                       entries: Iterable[BusyInterval]) -> 'BusyIndex':
+        """Build an index from intervals already in memory (no database access)"""
+        index = cls(range_start, range_end)
+        index._bulk_load(list(entries))
+        return index
+    
+    @classmethod
+    def for_dates(cls, start_date: date, end_date: date) -> 'BusyIndex':
+        """Build an index covering whole days from start_date to end_date inclusive"""
+        return cls.load(
+            datetime.combine(start_date, time.min),
+            datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+    
+    def _bulk_load(self, entries: List[BusyInterval]):
+        entries.sort(key=lambda e: e.start)
+        self._entries = entries
+        self._starts = [e.start for e in entries]
+        self._max_duration = max((e.end - e.start for e in entries), default=timedelta(0))
+    
+    def covers(self, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies inside the loaded horizon"""
+        return self.range_start <= start and end <= self.range_end
+    
+    def covers_dates(self, start_date: date, end_date: date) -> bool:
+        """Whether whole days start_date..end_date lie inside the loaded horizon"""
+        return self.covers(
+            datetime.combine(start_date, time.min),
+            datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+    
+    def add(self, start: datetime, end: datetime, kind: str = 'slot',
+            id: int = None, task_id: int = None, title: str = None):
+        """Record a new busy interval"""
+        entry = BusyInterval(start, end, kind, id, task_id, title)
+        position = bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._entries.insert(position, entry)
+        self._max_duration = max(self._max_duration, end - start)
+    
+    def add_sessions(self, sessions: Iterable[Dict], slot_ids: Iterable[Optional[int]] = None):
+        """Record session dicts (as built by create_task_sessions) as busy"""
+        sessions = list(sessions)
+        slot_ids = list(slot_ids) if slot_ids is not None else [None] * len(sessions)
+        for session, slot_id in zip(sessions, slot_ids):
+            self.add(
+                parse_stored_datetime(session['start_datetime']),
+                parse_stored_datetime(session['end_datetime']),
+                kind='slot',
+                id=slot_id,
+                task_id=session['task_id']
+            )
+    
+    def remove_slot(self, slot_id: int) -> bool:
+        """Drop a scheduled slot from the index, returns True if it was present"""
+        for position, entry in enumerate(self._entries):
+            if entry.kind == 'slot' and entry.id == slot_id:
+                del self._entries[position]
+                del self._starts[position]
+                return True
+        return False
+    
+    def overlapping(self, start: datetime, end: datetime,
+                    exclude_task_id: int = None, exclude_slot_id: int = None) -> List[BusyInterval]:
+        """All busy intervals overlapping [start, end), ordered by start"""
+        # Anything starting before (start - longest interval) cannot reach start
+        low = bisect_left(self._starts, start - self._max_duration)
+        high = bisect_left(self._starts, end)
+        
+        result = []
+        for entry in self._entries[low:high]:
+            if entry.end <= start:
+                continue
+            if entry.kind == 'slot':
+                if exclude_task_id and entry.task_id == exclude_task_id:
+                    continue
+                if exclude_slot_id and entry.id == exclude_slot_id:
+                    continue
+            result.append(entry)
+        return result
+    
+    def has_overlap(self, start: datetime, end: datetime,
+                    exclude_task_id: int = None, exclude_slot_id: int = None) -> bool:
+        """Whether anything busy overlaps [start, end)"""
+        return bool(self.overlapping(start, end, exclude_task_id, exclude_slot_id))
+    
+    def free_gaps(self, start: datetime, end: datetime,
+                  exclude_task_id: int = None) -> List[Tuple[datetime, datetime]]:
+        """Free sub-ranges of [start, end) as (start, end) tuples"""
+        available = []
+        current_start = start
+        
+        for entry in self.overlapping(start, end, exclude_task_id=exclude_task_id):
+            if current_start < entry.start:
+                available.append((current_start, entry.start))
+            current_start = max(current_start, entry.end)
+        
+        if current_start < end:
+            available.append((current_start, end))
+        
+        return available
@@ -0,0 +1,295 @@
+"""
+Capacity index - free work hours per day with prefix sums
+
+Answers "how many free work hours between d1 and d2" in O(1). A single index
+is cached per process and kept current from the schedule_changes log, so a
+slot or blocked-time edit only recomputes the days it touched.
+"""
+import threading
+from datetime import datetime, date, time, timedelta
+from itertools import accumulate
+from typing import List, Dict, Tuple
+from database import db
+from busy_index import BusyIndex
+from block_occurrences import blocked_occurrences
+from rrule_utils import virtual_instances
+from scheduling import get_calendar_settings, generate_available_slots
+
+
+# Past this many separate changed day-runs, refresh the whole span in one go
+MAX_REFRESH_RUNS = 8
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def gap_hours(gaps: List[Tuple[datetime, datetime]]) -> float:
+    return sum((gap_end - gap_start).total_seconds() / 3600 for gap_start, gap_end in gaps)
+
+
+class CapacityIndex:
+    """
+    Per-day free work hours (work windows minus busy time) for a date range
+    
+    Also keeps the work-window hours of each task's own incomplete slots per
+    day, so a task's availability can count its own sessions as usable time.
+    """
+    
+    def __init__(self, start_date: date, end_date: date, calendar_settings: Dict):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.calendar_settings = calendar_settings
+        self.days = (end_date - start_date).days + 1
+        
+        self.free = [0.0] * self.days
+        self.slot_hours = [0.0] * self.days
+        self._task_days: Dict[int, Dict[int, float]] = {}
+        self._day_tasks: List[set] = [set() for _ in range(self.days)]
+        self._prefix_free = [0.0] * (self.days + 1)
+        self._prefix_slots = [0.0] * (self.days + 1)
+        
+        self.change_id = db.latest_change_id()
+        self._refresh(start_date, end_date)
+    
+    def covers_dates(self, start_date: date, end_date: date) -> bool:
+        return self.start_date <= start_date and end_date <= self.end_date
+    
+    def _refresh(self, first: date, last: date):
+        """
+        Recompute the given days from the database
+        
+        The index is shared by request threads that read it without a lock, so
+        the new per-day lists and task dicts are built as copies and swapped in
+        with one assignment each rather than changed in place.
+        """
+        first, last = max(first, self.start_date), min(last, self.end_date)
+        if first > last:
+            return
+        
+        busy = BusyIndex.for_dates(first, last)
+        windows = generate_available_slots(first, last, self.calendar_settings)
+        
+        free = list(self.free)
+        slot_hours = list(self.slot_hours)
+        day_tasks = list(self._day_tasks)
+        task_days = dict(self._task_days)
+        copied = set()
+        
+        def days_of(task_id: int) -> Dict[int, float]:
+            if task_id not in copied:
+                task_days[task_id] = dict(task_days.get(task_id, {}))
+                copied.add(task_id)
+            return task_days[task_id]
+        
+        for offset in range((first - self.start_date).days, (last - self.start_date).days + 1):
+            free[offset] = 0.0
+            slot_hours[offset] = 0.0
+            for task_id in day_tasks[offset]:
+                days_of(task_id).pop(offset, None)
+            day_tasks[offset] = set()
+        
+        for window_start, window_end in windows:
+            offset = (window_start.date() - self.start_date).days
+            window_free = gap_hours(busy.free_gaps(window_start, window_end))
+            free[offset] += window_free
+            
+            task_ids = set()
+            for entry in busy.overlapping(window_start, window_end):
+                if entry.kind == 'slot':
+                    slot_hours[offset] += (
+                        min(entry.end, window_end) - max(entry.start, window_start)
+                    ).total_seconds() / 3600
+                    task_ids.add(entry.task_id)
+            
+            # A task's own time is what would free up without its slots
+            # (so overlaps with other busy time are not counted twice)
+            for task_id in task_ids:
+                own = gap_hours(busy.free_gaps(window_start, window_end, exclude_task_id=task_id)) - window_free
+                own_days = days_of(task_id)
+                own_days[offset] = own_days.get(offset, 0) + own
+                day_tasks[offset].add(task_id)
+        
+        self._prefix_free = [0.0] + list(accumulate(free))
+        self._prefix_slots = [0.0] + list(accumulate(slot_hours))
+        self.free = free
+        self.slot_hours = slot_hours
+        self._day_tasks = day_tasks
+        self._task_days = task_days
+    
+    def sync(self) -> bool:
+        """
+        Apply busy-time changes logged since the last sync
+        Returns False if the log has been pruned past us (caller must rebuild)
+        """
+        changes = db.changes_since(self.change_id)
+        if changes is None:
+            return False
+        if not changes:
+            return True
+        
+        # Changed days as sorted offsets, merged into contiguous runs
+        offsets = set()
+        for change in changes:
+            first = max(date.fromisoformat(change['start_datetime'][:10]), self.start_date)
+            last = min(date.fromisoformat(change['end_datetime'][:10]), self.end_date)
+            offsets.update(range((first - self.start_date).days, (last - self.start_date).days + 1))
+        self.change_id = changes[-1]['id']
+        
+        runs = []
+        for offset in sorted(offsets):
+            if runs and offset == runs[-1][1] + 1:
+                runs[-1][1] = offset
+            else:
+                runs.append([offset, offset])
+        if len(runs) > MAX_REFRESH_RUNS:
+            runs = [[runs[0][0], runs[-1][1]]]
+        
+        for first, last in runs:
+            self._refresh(self.start_date + timedelta(days=first), self.start_date + timedelta(days=last))
+        return True
+    
+    def _span(self, start_date: date, end_date: date) -> Tuple[int, int]:
+        low = max((start_date - self.start_date).days, 0)
+        high = min((end_date - self.start_date).days, self.days - 1)
+        return low, high
+    
+    def free_hours(self, start_date: date, end_date: date) -> float:
+        """Free work hours from start_date to end_date inclusive"""
+        low, high = self._span(start_date, end_date)
+        if low > high:
+            return 0.0
+        return self._prefix_free[high + 1] - self._prefix_free[low]
+    
+    def scheduled_hours(self, start_date: date, end_date: date) -> float:
+        """Work hours taken by incomplete slots from start_date to end_date inclusive"""
+        low, high = self._span(start_date, end_date)
+        if low > high:
+            return 0.0
+        return self._prefix_slots[high + 1] - self._prefix_slots[low]
+    
+    def daily_free(self, start_date: date, end_date: date) -> List[float]:
+        """Free work hours for each day from start_date to end_date inclusive"""
+        low, high = self._span(start_date, end_date)
+        return self.free[low:high + 1]
+    
+    def task_hours(self, task_id: int, start_date: date, end_date: date) -> float:
+        """Work hours taken by one task's own incomplete slots in the range"""
+        low, high = self._span(start_date, end_date)
+        return sum(
+            hours for offset, hours in self._task_days.get(task_id, {}).items()
+            if low <= offset <= high
+        )
+
+
+def get_capacity_index(start_date: date, end_date: date) -> CapacityIndex:
+    """
+    Cached capacity index covering start_date..end_date
+    Rebuilt when calendar settings change or the range grows; otherwise only
+    the days touched since the last call are recomputed
+    """
+    global _cache
+    calendar_settings = get_calendar_settings()
+    
+    with _cache_lock:
+        index = _cache
+        if index is not None and index.calendar_settings == calendar_settings \
+                and index.covers_dates(start_date, end_date) and index.sync():
+            return index
+        
+        if index is not None and index.calendar_settings == calendar_settings:
+            start_date = min(start_date, index.start_date)
+            end_date = max(end_date, index.end_date)
+        
+        _cache = CapacityIndex(start_date, end_date, calendar_settings)
+        return _cache
+
+
+def get_capacity_forecast(start_date: date, end_date: date) -> Dict:
+    """
+    Per-day work capacity, committed hours by slot source, blocked hours and free hours
+    
+    Slot hours come from one GROUP BY over scheduled_slots plus the expanded
+    instances of virtual allocations, blocked hours from one range query clipped
+    to work hours, and free hours from the cached capacity index, so a year-long
+    range costs a handful of queries rather than several per day.
+    """
+    index = get_capacity_index(start_date, end_date)
+    windows = {
+        window_start.date(): (window_start, window_end)
+        for window_start, window_end in generate_available_slots(start_date, end_date, index.calendar_settings)
+    }
+    range_start = datetime.combine(start_date, time.min)
+    range_end = datetime.combine(end_date + timedelta(days=1), time.min)
+    
+    committed = db.execute("""
+        SELECT date(start_datetime) as day, source,
+               SUM((julianday(end_datetime) - julianday(start_datetime)) * 24) as hours,
+               SUM(CASE WHEN completed = 1
+                   THEN (julianday(end_datetime) - julianday(start_datetime)) * 24 ELSE 0 END) as completed_hours
+        FROM scheduled_slots
+        WHERE start_datetime >= ? AND start_datetime < ?
+        GROUP BY day, source
+    """, (range_start.isoformat(), range_end.isoformat()))
+    
+    # Virtual allocation instances are never completed (completing one detaches it)
+    virtual_hours = {}
+    for instance in virtual_instances(range_start, range_end):
+        if instance['start_datetime'] >= range_start.isoformat():
+            day = instance['start_datetime'][:10]
+            hours = (datetime.fromisoformat(instance['end_datetime']) -
+                     datetime.fromisoformat(instance['start_datetime'])).total_seconds() / 3600
+            virtual_hours[day] = virtual_hours.get(day, 0) + hours
+    committed += [
+        {'day': day, 'source': 'allocation', 'hours': hours, 'completed_hours': 0}
+        for day, hours in virtual_hours.items()
+    ]
+    
+    blocks = blocked_occurrences(range_start, range_end)
+    
+    days = {}
+    current = start_date
+    for free in index.daily_free(start_date, end_date):
+        window = windows.get(current)
+        days[current.isoformat()] = {
+            'date': current.isoformat(),
+            'capacity_hours': (window[1] - window[0]).total_seconds() / 3600 if window else 0.0,
+            'committed': {'auto': 0.0, 'manual': 0.0, 'allocation': 0.0},
+            'committed_hours': 0.0,
+            'completed_hours': 0.0,
+            'blocked_hours': 0.0,
+            'free_hours': round(free, 2)
+        }
+        current += timedelta(days=1)
+    
+    for row in committed:
+        day = days.get(row['day'])
+        if day is None:
+            continue
+        day['committed'][row['source']] = round(day['committed'].get(row['source'], 0) + row['hours'], 2)
+        day['committed_hours'] = round(day['committed_hours'] + row['hours'], 2)
+        day['completed_hours'] = round(day['completed_hours'] + row['completed_hours'], 2)
+    
+    # Blocked time only costs capacity where it overlaps a work window
+    for block in blocks:
+        block_start = datetime.fromisoformat(block['start_datetime'])
+        block_end = datetime.fromisoformat(block['end_datetime'])
+        current = max(block_start.date(), start_date)
+        while current <= min(block_end.date(), end_date):
+            window = windows.get(current)
+            if window:
+                overlap = (min(block_end, window[1]) - max(block_start, window[0])).total_seconds() / 3600
+                if overlap > 0:
+                    day = days[current.isoformat()]
+                    day['blocked_hours'] = round(day['blocked_hours'] + overlap, 2)
+            current += timedelta(days=1)
+    
+    daily = list(days.values())
+    return {
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'days': daily,
+        'totals': {
+            key: round(sum(day[key] for day in daily), 2)
+            for key in ('capacity_hours', 'committed_hours', 'completed_hours', 'blocked_hours', 'free_hours')
+        }
+    }
@@ -2,29 +2,188 @@
 Database module - handles SQLite connection and operations
 """
 import sqlite3
+import threading
 import json
+from contextlib import contextmanager
 from datetime import datetime, date
 from typing import Any, Optional, List, Dict
 from pathlib import Path
 
 
+# Pragmas applied to every connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA mmap_size = 268435456",   # 256 MB
+    "PRAGMA cache_size = -16000",     # ~16 MB page cache
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Rows kept in schedule_changes; readers further behind than this rebuild
+CHANGE_LOG_RETENTION = 10000
+
+
+def _slot_hours(row: str) -> str:
+    """SQL expression for the length of a slot row in hours"""
+    return f"(julianday({row}.end_datetime) - julianday({row}.start_datetime)) * 24"
+
+
 class Database:
     def __init__(self, db_path: str = "../data/tasks.db"):
         self.db_path = db_path
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        
+        # One long-lived connection per thread (FastAPI runs sync endpoints
+        # in a threadpool, and sqlite3 connections must not be shared)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'connection_reuses': 0,
+            'queries': 0,
+            'writes': 0,
+            'transactions_committed': 0,
+            'transactions_rolled_back': 0
+        }
+        self._data_version = 0
+        
         self.init_database()
     
-    def get_connection(self):
-        """Get SQLite connection with row factory for dict results"""
-        conn = sqlite3.connect(self.db_path)
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new tuned connection"""
+        # Autocommit mode: single statements commit immediately, multi-statement
+        # work is grouped explicitly
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
         conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
         return conn
     
-    def init_database(self):
-        """Initialize database schema"""
+    def get_connection(self) -> sqlite3.Connection:
+        """Get this thread's SQLite connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            with self._lock:
+                self._stats['connection_reuses'] += 1
+            return conn
+        
+        conn = self._open_connection()
+        self._local.conn = conn
+        with self._lock:
+            # Thread idents are recycled; a leftover entry belongs to a dead thread
+            stale = self._connections.get(threading.get_ident())
+            self._connections[threading.get_ident()] = conn
+            self._stats['connections_opened'] += 1
+            if stale is not None:
+                self._stats['connections_closed'] += 1
+        if stale is not None:
+            stale.close()
+        return conn
+    
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+            self._stats['connections_closed'] += 1
+        conn.close()
+    
+    def close_all(self):
+        """Close every pooled connection (used on shutdown)"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            self._stats['connections_closed'] += len(connections)
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool counters"""
+        with self._lock:
+            return {
+                **self._stats,
+                'open_connections': len(self._connections)
+            }
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group statements into a single atomic unit of work
+        
+        The outermost block opens an IMMEDIATE transaction and commits once on
+        exit; nested blocks use savepoints so an inner failure can be caught
+        without losing the outer work. Any exception rolls the block back.
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
+        depth = getattr(self._local, 'tx_depth', 0)
+        if depth == 0:
+            self._local.after_commit = []
+        pending = len(self._local.after_commit)
+        
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+        self._local.tx_depth = depth + 1
         
+        try:
+            yield self
+        except BaseException:
+            self._local.tx_depth = depth
+            del self._local.after_commit[pending:]
+            if depth == 0:
+                conn.execute("ROLLBACK")
+                self._count('transactions_rolled_back')
+                self._bump_data_version()
+            else:
+                conn.execute(f"ROLLBACK TO SAVEPOINT sp_{depth}")
+                conn.execute(f"RELEASE SAVEPOINT sp_{depth}")
+            raise
+        
+        self._local.tx_depth = depth
+        if depth == 0:
+            conn.execute("COMMIT")
+            self._count('transactions_committed')
+            self._bump_data_version()
+            callbacks, self._local.after_commit = self._local.after_commit, []
+            for callback in callbacks:
+                callback()
+        else:
+            conn.execute(f"RELEASE SAVEPOINT sp_{depth}")
+    
+    def in_transaction(self) -> bool:
+        """Whether the calling thread is inside a transaction() block"""
+        return getattr(self._local, 'tx_depth', 0) > 0
+    
+    def after_commit(self, callback):
+        """
+        Run callback once the calling thread's work is durable: straight away
+        outside a transaction, else after the outermost COMMIT (dropped if the
+        enclosing block rolls back)
+        """
+        if self.in_transaction():
+            self._local.after_commit.append(callback)
+        else:
+            callback()
+    
+    def init_database(self):
+        """Initialize database schema"""
+        with self.transaction():
+            self._create_schema(self.get_connection().cursor())
+    
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Create tables, indexes and default rows"""
         # Projects table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS projects (
@@ -71,6 +230,22 @@ class Database:
             )
         """)
         
+        # Migration: how far an allocation's recurring slots have been generated
+        try:
+            cursor.execute("SELECT generated_until FROM time_allocations LIMIT 1")
+        except:
+            cursor.execute("ALTER TABLE time_allocations ADD COLUMN generated_until DATE")
+        
+        # Migration: 'materialized' allocations store every instance as a slot row,
+        # 'virtual' ones are expanded when a range is read and store only exceptions
+        try:
+            cursor.execute("SELECT storage FROM time_allocations LIMIT 1")
+        except:
+            cursor.execute("""
+                ALTER TABLE time_allocations ADD COLUMN storage TEXT
+                CHECK(storage IN ('materialized', 'virtual')) DEFAULT 'materialized'
+            """)
+        
         # Scheduled slots (actual calendar entries)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS scheduled_slots (
@@ -95,7 +270,42 @@ class Database:
             cursor.execute("SELECT is_fixed FROM scheduled_slots LIMIT 1")
         except:
             cursor.execute("ALTER TABLE scheduled_slots ADD COLUMN is_fixed BOOLEAN DEFAULT 0")
-            self.conn.commit()
+        
+        # Migration: the time allocation a recurring slot belongs to (a task can
+        # have several); existing rows are matched to the latest allocation
+        # starting on or before their original date
+        try:
+            cursor.execute("SELECT allocation_id FROM scheduled_slots LIMIT 1")
+        except:
+            cursor.execute("""
+                ALTER TABLE scheduled_slots ADD COLUMN allocation_id INTEGER
+                REFERENCES time_allocations(id) ON DELETE SET NULL
+            """)
+            cursor.execute("""
+                UPDATE scheduled_slots SET allocation_id = (
+                    SELECT a.id FROM time_allocations a
+                    WHERE a.task_id = scheduled_slots.task_id
+                    AND a.start_date <= date(COALESCE(scheduled_slots.original_start, scheduled_slots.start_datetime))
+                    ORDER BY a.start_date DESC LIMIT 1
+                )
+                WHERE source = 'allocation' OR original_start IS NOT NULL
+            """)
+        
+        # Recurring instances that no longer follow the pattern: deleted, or
+        # detached into a slot row (then moved, resized or completed there)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recurring_exceptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                allocation_id INTEGER NOT NULL,
+                original_start DATETIME NOT NULL,
+                original_end DATETIME NOT NULL,
+                kind TEXT CHECK(kind IN ('deleted', 'detached')) NOT NULL,
+                slot_id INTEGER,
+                FOREIGN KEY (allocation_id) REFERENCES time_allocations(id) ON DELETE CASCADE,
+                FOREIGN KEY (slot_id) REFERENCES scheduled_slots(id) ON DELETE SET NULL,
+                UNIQUE (allocation_id, original_start)
+            )
+        """)
         
         # Blocked times (meetings, lunch breaks, etc.)
         cursor.execute("""
@@ -110,6 +320,23 @@ class Database:
             )
         """)
         
+        # Migration: how far a blocked time has been expanded into occurrences
+        try:
+            cursor.execute("SELECT expanded_until FROM blocked_times LIMIT 1")
+        except:
+            cursor.execute("ALTER TABLE blocked_times ADD COLUMN expanded_until DATE")
+        
+        # Blocked-time occurrences (recurring blocks expanded up to a horizon)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS blocked_time_occurrences (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                block_id INTEGER NOT NULL,
+                start_datetime DATETIME NOT NULL,
+                end_datetime DATETIME NOT NULL,
+                FOREIGN KEY (block_id) REFERENCES blocked_times(id) ON DELETE CASCADE
+            )
+        """)
+        
         # Calendar settings
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS calendar_settings (
@@ -122,6 +349,16 @@ class Database:
             )
         """)
         
+        # Migration: excluded date ranges, and a version bumped on every settings change
+        try:
+            cursor.execute("SELECT excluded_ranges FROM calendar_settings LIMIT 1")
+        except:
+            cursor.execute("ALTER TABLE calendar_settings ADD COLUMN excluded_ranges TEXT DEFAULT '[]'")
+        try:
+            cursor.execute("SELECT version FROM calendar_settings LIMIT 1")
+        except:
+            cursor.execute("ALTER TABLE calendar_settings ADD COLUMN version INTEGER DEFAULT 0")
+        
         # Activity log for undo functionality
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS activity_log (
@@ -152,26 +389,163 @@ class Database:
             )
         """)
         
+        # Change log of busy time, fed by triggers, so in-memory caches can
+        # refresh just the time ranges that changed
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schedule_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity_type TEXT NOT NULL,
+                start_datetime DATETIME,
+                end_datetime DATETIME
+            )
+        """)
+        for table, entity_type in (('scheduled_slots', 'slot'), ('blocked_times', 'block'),
+                                   ('blocked_time_occurrences', 'block')):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_change AFTER INSERT ON {table}
+                BEGIN
+                    INSERT INTO schedule_changes (entity_type, start_datetime, end_datetime)
+                    VALUES ('{entity_type}', NEW.start_datetime, NEW.end_datetime);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_update_change AFTER UPDATE ON {table}
+                BEGIN
+                    INSERT INTO schedule_changes (entity_type, start_datetime, end_datetime)
+                    VALUES ('{entity_type}', OLD.start_datetime, OLD.end_datetime),
+                           ('{entity_type}', NEW.start_datetime, NEW.end_datetime);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_change AFTER DELETE ON {table}
+                BEGIN
+                    INSERT INTO schedule_changes (entity_type, start_datetime, end_datetime)
+                    VALUES ('{entity_type}', OLD.start_datetime, OLD.end_datetime);
+                END
+            """)
+        
+        # An allocation is busy wherever its instances have no slot rows: a
+        # virtual one over its whole date span, a materialized one after its
+        # generated_until. Advancing generated_until alone changes nothing busy
+        # (the new rows log themselves), so updates only fire for the pattern
+        # columns. An exception frees (or re-occupies) its original instance.
+        span = ("('slot', CASE WHEN {0}.storage = 'virtual' THEN {0}.start_date"
+                " ELSE COALESCE(date({0}.generated_until, '+1 day'), {0}.start_date) END,"
+                " COALESCE(date({0}.end_date, '+1 day'), '9999-12-31'))")
+        instance = "('slot', {0}.original_start, {0}.original_end)"
+        pattern_columns = 'task_id, rrule, duration_hours, time_of_day, start_date, end_date, storage'
+        for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+            columns = f' OF {pattern_columns}' if event == 'UPDATE' else ''
+            cursor.execute(f"DROP TRIGGER IF EXISTS trg_time_allocations_{event.lower()}_change")
+            cursor.execute(f"""
+                CREATE TRIGGER trg_time_allocations_{event.lower()}_change
+                AFTER {event}{columns} ON time_allocations
+                BEGIN
+                    INSERT INTO schedule_changes (entity_type, start_datetime, end_datetime)
+                    VALUES {', '.join(span.format(row) for row in rows)};
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_recurring_exceptions_{event.lower()}_change
+                AFTER {event} ON recurring_exceptions
+                BEGIN
+                    INSERT INTO schedule_changes (entity_type, start_datetime, end_datetime)
+                    VALUES {', '.join(instance.format(row) for row in rows)};
+                END
+            """)
+        
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_schedule_changes_prune AFTER INSERT ON schedule_changes
+            BEGIN
+                DELETE FROM schedule_changes WHERE id <= NEW.id - {CHANGE_LOG_RETENTION};
+            END
+        """)
+        
+        # Per-task slot hours, kept current by triggers so endpoints read one row
+        # per task instead of aggregating every slot (incomplete hours are
+        # scheduled - completed, remaining hours estimated - scheduled)
+        task_hours_exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_hours'"
+        ).fetchone()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS task_hours (
+                task_id INTEGER PRIMARY KEY,
+                slot_count INTEGER NOT NULL DEFAULT 0,
+                scheduled_hours REAL NOT NULL DEFAULT 0,
+                completed_hours REAL NOT NULL DEFAULT 0,
+                FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE
+            )
+        """)
+        add_new = f"""
+            INSERT OR IGNORE INTO task_hours (task_id) VALUES (NEW.task_id);
+            UPDATE task_hours SET
+                slot_count = slot_count + 1,
+                scheduled_hours = scheduled_hours + {_slot_hours('NEW')},
+                completed_hours = completed_hours + CASE WHEN NEW.completed = 1 THEN {_slot_hours('NEW')} ELSE 0 END
+            WHERE task_id = NEW.task_id;
+        """
+        remove_old = f"""
+            UPDATE task_hours SET
+                slot_count = slot_count - 1,
+                scheduled_hours = scheduled_hours - {_slot_hours('OLD')},
+                completed_hours = completed_hours - CASE WHEN OLD.completed = 1 THEN {_slot_hours('OLD')} ELSE 0 END
+            WHERE task_id = OLD.task_id;
+        """
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_task_hours_insert AFTER INSERT ON scheduled_slots
+            BEGIN {add_new} END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_task_hours_delete AFTER DELETE ON scheduled_slots
+            BEGIN {remove_old} END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_task_hours_update
+            AFTER UPDATE OF task_id, start_datetime, end_datetime, completed ON scheduled_slots
+            BEGIN {remove_old} {add_new} END
+        """)
+        if not task_hours_exists:
+            self._rebuild_task_hours(cursor)
+        
         # Create indexes
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_slots_datetime ON scheduled_slots(start_datetime, end_datetime)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_slots_movable ON scheduled_slots(completed, is_fixed, start_datetime)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scheduled_slots_allocation ON scheduled_slots(allocation_id, start_datetime)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_blocked_times_datetime ON blocked_times(start_datetime, end_datetime)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_blocked_time_occurrences_datetime ON blocked_time_occurrences(start_datetime, end_datetime)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_blocked_time_occurrences_block ON blocked_time_occurrences(block_id)")
         
         # Insert default calendar settings if not exists
         cursor.execute("INSERT OR IGNORE INTO calendar_settings (id) VALUES (1)")
         cursor.execute("INSERT OR IGNORE INTO email_settings (id) VALUES (1)")
-        
-        conn.commit()
-        conn.close()
+    
+    def _rebuild_task_hours(self, cursor):
+        cursor.execute("DELETE FROM task_hours")
+        cursor.execute(f"""
+            INSERT INTO task_hours (task_id, slot_count, scheduled_hours, completed_hours)
+            SELECT task_id, COUNT(*), SUM({_slot_hours('s')}),
+                   COALESCE(SUM(CASE WHEN completed = 1 THEN {_slot_hours('s')} END), 0)
+            FROM scheduled_slots s
+            GROUP BY task_id
+        """)
+    
+    def rebuild_task_hours(self) -> int:
+        """Recompute task_hours from scratch, returns number of tasks with slots"""
+        with self.transaction():
+            cursor = self.get_connection().cursor()
+            self._rebuild_task_hours(cursor)
+            count = cursor.execute("SELECT COUNT(*) FROM task_hours").fetchone()[0]
+        self._written()
+        return count
     
     def execute(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """Execute a SELECT query and return results as list of dicts"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(query, params)
+        cursor = conn.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
+        self._count('queries')
         return [dict(row) for row in rows]
     
     def execute_one(self, query: str, params: tuple = ()) -> Optional[Dict[str, Any]]:
@@ -179,46 +553,100 @@ class Database:
         results = self.execute(query, params)
         return results[0] if results else None
     
+    def latest_change_id(self) -> int:
+        """Id of the newest schedule_changes row (0 if none)"""
+        row = self.execute_one("SELECT COALESCE(MAX(id), 0) as last FROM schedule_changes")
+        return row['last']
+    
+    def changes_since(self, change_id: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        Busy-time changes logged after change_id, oldest first
+        Returns None if rows after change_id have already been pruned
+        """
+        first = self.execute_one("SELECT MIN(id) as first FROM schedule_changes")['first']
+        if first is not None and first > change_id + 1:
+            return None
+        return self.execute(
+            "SELECT * FROM schedule_changes WHERE id > ? ORDER BY id", (change_id,)
+        )
+    
     def insert(self, table: str, data: Dict[str, Any]) -> int:
         """Insert a row and return the new row ID"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         columns = ', '.join(data.keys())
         placeholders = ', '.join(['?' for _ in data])
         query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
         
-        cursor.execute(query, tuple(data.values()))
-        row_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return row_id
+        cursor = conn.execute(query, tuple(data.values()))
+        self._written()
+        return cursor.lastrowid
+    
+    def insert_many(self, table: str, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Insert many rows with a single executemany and return their new IDs
+        
+        All rows must share the same columns. IDs are contiguous because the
+        batch runs inside one write transaction.
+        """
+        if not rows:
+            return []
+        
+        columns = list(rows[0].keys())
+        placeholders = ', '.join(['?' for _ in columns])
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        params = [tuple(row[column] for column in columns) for row in rows]
+        
+        with self.transaction():
+            conn = self.get_connection()
+            conn.executemany(query, params)
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        
+        self._written()
+        first_id = last_id - len(rows) + 1
+        return list(range(first_id, last_id + 1))
     
     def update(self, table: str, data: Dict[str, Any], where: str, where_params: tuple = ()) -> int:
         """Update rows and return number of rows affected"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         set_clause = ', '.join([f"{k} = ?" for k in data.keys()])
         query = f"UPDATE {table} SET {set_clause} WHERE {where}"
         
-        cursor.execute(query, tuple(data.values()) + where_params)
-        rows_affected = cursor.rowcount
-        conn.commit()
-        conn.close()
-        return rows_affected
+        cursor = conn.execute(query, tuple(data.values()) + where_params)
+        self._written()
+        return cursor.rowcount
     
     def delete(self, table: str, where: str, where_params: tuple = ()) -> int:
         """Delete rows and return number of rows affected"""
         conn = self.get_connection()
-        cursor = conn.cursor()
         
         query = f"DELETE FROM {table} WHERE {where}"
-        cursor.execute(query, where_params)
-        rows_affected = cursor.rowcount
-        conn.commit()
-        conn.close()
-        return rows_affected
+        cursor = conn.execute(query, where_params)
+        self._written()
+        return cursor.rowcount
+    
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+    
+    def _written(self):
+        """Count a write and bump the data version"""
+        with self._lock:
+            self._stats['writes'] += 1
+            self._data_version += 1
+    
+    def _bump_data_version(self):
+        with self._lock:
+            self._data_version += 1
+    
+    def data_version(self) -> int:
+        """
+        Counter bumped by every write and by every commit or rollback, so
+        anything cached against one version is stale once data may have changed
+        (responses read mid-transaction are superseded by the commit's bump)
+        """
+        return self._data_version
 
 
 # Global database instance
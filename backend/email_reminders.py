@@ -7,6 +7,7 @@ from email.mime.multipart import MIMEMultipart
 from datetime import datetime, date, timedelta
 from typing import Dict, Optional
 from database import db
+from rrule_utils import virtual_instances
 
 
 class EmailError(Exception):
@@ -60,18 +61,16 @@ def generate_monday_digest() -> str:
             t.priority, 
             t.status, 
             p.name as project_name,
-            COUNT(s.id) as scheduled_sessions,
-            SUM(CAST((julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 AS REAL)) as scheduled_hours
+            COALESCE(h.slot_count, 0) as scheduled_sessions,
+            ROUND(h.scheduled_hours, 6) as scheduled_hours
         FROM tasks t
         LEFT JOIN projects p ON t.project_id = p.id
-        LEFT JOIN scheduled_slots s ON t.id = s.task_id
-            AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
+        LEFT JOIN task_hours h ON h.task_id = t.id
         WHERE t.status != 'completed'
         AND t.deadline IS NOT NULL
         AND t.deadline <= ?
         AND t.deadline >= ?
         AND t.archived = 0
-        GROUP BY t.id
         ORDER BY t.deadline ASC, t.priority DESC
     """, (week_end.isoformat(), date.today().isoformat()))
     
@@ -165,7 +164,6 @@ def generate_daily_deadline_alert() -> str:
         LEFT JOIN projects p ON t.project_id = p.id
         LEFT JOIN scheduled_slots s ON t.id = s.task_id
             AND DATE(s.start_datetime) = DATE('now')
-            AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
         WHERE t.deadline = DATE('now')
         AND t.status != 'completed'
         AND t.archived = 0
@@ -176,6 +174,17 @@ def generate_daily_deadline_alert() -> str:
     if not today_deadlines:
         return None
     
+    # Today's instances of virtual allocations have no slot rows
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    for instance in virtual_instances(today_start, today_start + timedelta(days=1)):
+        for task in today_deadlines:
+            if task['id'] == instance['task_id'] and instance['start_datetime'] >= today_start.isoformat():
+                task['scheduled_sessions'] += 1
+                task['scheduled_hours'] = (task['scheduled_hours'] or 0) + (
+                    datetime.fromisoformat(instance['end_datetime']) -
+                    datetime.fromisoformat(instance['start_datetime'])
+                ).total_seconds() / 3600
+    
     html = f"""
     <html>
     <head>
@@ -1,7 +1,7 @@
 """
 Main FastAPI application
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from database import db
 from models import (
@@ -9,22 +9,35 @@ from models import (
     CalendarSettingsUpdate, BlockedTimeCreate,
     TimeAllocationCreate, TimeAllocationEdit,
     ReallocateRequest, EmailSettingsUpdate,
-    ManualSlotCreate, SlotMove
+    ManualSlotCreate, SlotMove, ScenarioRequest, ConflictCheckRequest,
+    BulkSlotRequest, AllocationInstance
 )
 from datetime import datetime, date, timedelta
+from typing import Optional
+from apscheduler.schedulers.background import BackgroundScheduler
 import json
 
 # Import scheduling modules
 from scheduling import (
     auto_schedule_task, auto_schedule_all_tasks, 
     attempt_with_bumping, reallocate_to_available_time,
-    check_deadline_feasibility, SchedulingError, has_conflict
+    check_deadline_feasibility, check_all_deadlines_feasibility,
+    SchedulingError, has_conflict, has_conflicts_batch, pack_gap,
+    find_schedule_overlaps, delete_scheduled_slot, apply_slot_operations
 )
 from rrule_utils import (
     validate_rrule, generate_recurring_slots, 
     edit_recurring_instance, delete_recurring_instance,
-    regenerate_all_recurring_slots, RecurrenceError
+    regenerate_all_recurring_slots, ensure_recurring_slots, RecurrenceError,
+    RECURRING_HORIZON_DAYS, virtual_instances, detach_virtual_instance, delete_virtual_instance,
+    rrule_cache_stats
 )
+from scenarios import run_scenarios, start_scenario_pool, shutdown_scenario_pool
+from capacity import get_capacity_forecast
+from work_calendar import get_work_calendar
+from busy_index import stored_duration_hours
+from block_occurrences import materialize_blocked_time, ensure_block_occurrences, BLOCK_HORIZON_DAYS
+from response_cache import ResponseCacheMiddleware, response_cache_stats
 from email_reminders import (
     send_monday_digest, send_daily_deadline_alert,
     test_email_connection, get_email_settings as get_email_settings_from_db
@@ -32,6 +45,14 @@ from email_reminders import (
 
 app = FastAPI(title="PhD Task Manager", version="1.0.0")
 
+# Fill suggestions: top-scoring slots considered for combinations, combinations returned
+FILL_COMBINATION_CANDIDATES = 40
+FILL_COMBINATIONS = 3
+
+# ETags and cached responses for repeated reads (added before CORS so that
+# 304s and cache hits still pass through the CORS middleware)
+app.add_middleware(ResponseCacheMiddleware)
+
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +63,34 @@ app.add_middleware(
 )
 
 
+# Daily jobs run in a background thread alongside the API
+background_jobs = BackgroundScheduler()
+
+
+def extend_horizons():
+    """Push the recurring-slot and blocked-time horizons forward (runs daily)"""
+    ensure_recurring_slots(date.today() + timedelta(days=RECURRING_HORIZON_DAYS))
+    ensure_block_occurrences(date.today() + timedelta(days=BLOCK_HORIZON_DAYS))
+
+
+@app.on_event("startup")
+def start_background_jobs():
+    """Catch the horizons up, schedule the daily extender and start the scenario workers"""
+    extend_horizons()
+    background_jobs.add_job(extend_horizons, 'cron', hour=2, id='extend_horizons', replace_existing=True)
+    background_jobs.start()
+    start_scenario_pool()
+
+
+@app.on_event("shutdown")
+def close_database_connections():
+    """Stop background jobs and scenario workers, and close pooled SQLite connections on shutdown"""
+    if background_jobs.running:
+        background_jobs.shutdown(wait=False)
+    shutdown_scenario_pool()
+    db.close_all()
+
+
 def serialize_for_json(obj):
     """Convert dates/datetimes to strings for JSON serialization"""
     if isinstance(obj, (date, datetime)):
@@ -53,6 +102,12 @@ def serialize_for_json(obj):
     return obj
 
 
+def check_project_exists(project_id: Optional[int]):
+    """Reject a task referencing a missing project (foreign keys are enforced)"""
+    if project_id is not None and not db.execute_one("SELECT id FROM projects WHERE id = ?", (project_id,)):
+        raise HTTPException(404, "Project not found")
+
+
 # ============================================================================
 # PROJECTS
 # ============================================================================
@@ -127,16 +182,14 @@ def get_unscheduled_tasks():
             t.*,
             p.name as project_name,
             p.colour as project_colour,
-            COALESCE(SUM(CAST((julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 AS REAL)), 0) as scheduled_hours
+            ROUND(COALESCE(h.scheduled_hours, 0), 6) as scheduled_hours
         FROM tasks t
         LEFT JOIN projects p ON t.project_id = p.id
-        LEFT JOIN scheduled_slots s ON t.id = s.task_id
-            AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
+        LEFT JOIN task_hours h ON h.task_id = t.id
         WHERE t.status != 'completed'
         AND t.archived = 0
         AND t.has_time_allocation = 0
-        GROUP BY t.id
-        HAVING scheduled_hours < t.estimated_hours
+        AND ROUND(COALESCE(h.scheduled_hours, 0), 6) < t.estimated_hours
         ORDER BY t.deadline ASC, t.priority DESC
     """)
     
@@ -153,79 +206,54 @@ def get_unscheduled_tasks():
 @app.get("/tasks/sanity-check")
 def sanity_check_tasks():
     """
-    Check that each task's total slot duration matches estimated_hours
-    Returns list of tasks with mismatches
+    Check that each task's total slot duration matches estimated_hours, and
+    find double-booked slots and slots overlapping blocked times
+    Returns list of tasks with mismatches and list of overlaps
     """
-    print("=== SANITY CHECK STARTED ===")
     try:
-        # Get all active tasks
-        print("Fetching active tasks...")
-        tasks = db.execute("SELECT * FROM tasks WHERE status != 'completed'")
-        print(f"Found {len(tasks)} active tasks")
+        # Slot hours for every active task from the trigger-maintained aggregate;
+        # tasks with a virtual allocation have no stored rows for their instances
+        tasks = db.execute("""
+            SELECT t.id, t.title, t.estimated_hours,
+                   COALESCE(h.slot_count, 0) as slot_count,
+                   COALESCE(h.scheduled_hours, 0) as scheduled_hours,
+                   COALESCE(h.completed_hours, 0) as completed_hours
+            FROM tasks t
+            LEFT JOIN task_hours h ON h.task_id = t.id
+            WHERE t.status != 'completed'
+            AND NOT EXISTS (
+                SELECT 1 FROM time_allocations a WHERE a.task_id = t.id AND a.storage = 'virtual'
+            )
+        """)
         
         mismatches = []
-        
         for task in tasks:
-            print(f"Processing task {task['id']}: {task['title']}")
-            try:
-                # Get all slots (completed and incomplete) for this task
-                slots = db.execute("""
-                    SELECT start_datetime, end_datetime, completed
-                    FROM scheduled_slots
-                    WHERE task_id = ?
-                """, (task['id'],))
-                
-                print(f"  Task {task['id']} has {len(slots)} slots")
-                
-                # Calculate total scheduled hours
-                total_scheduled_hours = 0
-                completed_hours = 0
-                incomplete_hours = 0
-                
-                for slot in slots:
-                    start = datetime.fromisoformat(slot['start_datetime'].replace('+00:00', '').replace('Z', ''))
-                    end = datetime.fromisoformat(slot['end_datetime'].replace('+00:00', '').replace('Z', ''))
-                    duration = (end - start).total_seconds() / 3600
-                    
-                    total_scheduled_hours += duration
-                    if slot['completed']:
-                        completed_hours += duration
-                    else:
-                        incomplete_hours += duration
-                
-                # Check for mismatch
-                estimated = task['estimated_hours']
-                difference = abs(total_scheduled_hours - estimated)
-                
-                print(f"  Estimated: {estimated}h, Scheduled: {total_scheduled_hours}h, Diff: {difference}h")
-                
-                # Allow 0.1 hour tolerance for rounding
-                if difference > 0.1:
-                    print(f"  MISMATCH FOUND for task {task['id']}")
-                    mismatches.append({
-                        'task_id': task['id'],
-                        'title': task['title'],
-                        'estimated_hours': estimated,
-                        'scheduled_hours': round(total_scheduled_hours, 2),
-                        'completed_hours': round(completed_hours, 2),
-                        'incomplete_hours': round(incomplete_hours, 2),
-                        'difference': round(estimated - total_scheduled_hours, 2),
-                        'slot_count': len(slots)
-                    })
-            except Exception as e:
-                print(f"ERROR processing task {task['id']}: {e}")
-                import traceback
-                traceback.print_exc()
-                # Skip this task and continue
-                continue
+            estimated = task['estimated_hours']
+            scheduled = task['scheduled_hours']
+            
+            # Allow 0.1 hour tolerance for rounding
+            if abs(scheduled - estimated) > 0.1:
+                mismatches.append({
+                    'task_id': task['id'],
+                    'title': task['title'],
+                    'estimated_hours': estimated,
+                    'scheduled_hours': round(scheduled, 2),
+                    'completed_hours': round(task['completed_hours'], 2),
+                    'incomplete_hours': round(scheduled - task['completed_hours'], 2),
+                    'difference': round(estimated - scheduled, 2),
+                    'slot_count': task['slot_count']
+                })
         
-        result = {
+        overlaps = find_schedule_overlaps()
+        
+        return {
             "total_tasks": len(tasks),
             "mismatches": mismatches,
-            "mismatch_count": len(mismatches)
+            "mismatch_count": len(mismatches),
+            "overlaps": overlaps,
+            "double_booked_count": sum(1 for o in overlaps if o['type'] == 'double_booked'),
+            "blocked_time_overlap_count": sum(1 for o in overlaps if o['type'] == 'blocked_time')
         }
-        print(f"=== SANITY CHECK COMPLETE: {len(mismatches)} mismatches found ===")
-        return result
     except Exception as e:
         print(f"ERROR in sanity_check_tasks: {type(e).__name__}: {e}")
         import traceback
@@ -234,89 +262,84 @@ def sanity_check_tasks():
 
 
 @app.get("/slots/fill-suggestions")
-def get_fill_suggestions(start_time: str, end_time: str):
+def get_fill_suggestions(start_time: str, end_time: str,
+                         limit: int = Query(10, ge=1, le=50),
+                         lookahead_days: int = Query(60, ge=1, le=366)):
     """
     Get suggestions for tasks that could be moved to fill an empty time slot
-    Looks at future slots and suggests which could be pulled forward
+    Looks at movable slots up to lookahead_days after the empty slot; the duration
+    filter, score and top-k are done in SQL. Also offers combinations of several
+    slots that fill the gap together.
     """
-    print(f"Getting fill suggestions for {start_time} to {end_time}")
-    
     try:
         # Parse times
         slot_start = datetime.fromisoformat(start_time.replace('+00:00', '').replace('Z', ''))
         slot_end = datetime.fromisoformat(end_time.replace('+00:00', '').replace('Z', ''))
         slot_duration = (slot_end - slot_start).total_seconds() / 3600
         
-        print(f"Available slot duration: {slot_duration}h")
+        # Score: task priority (P1=150, P2=100, P3=50), deadline proximity,
+        # and how far in the future the slot is (capped at 100)
+        candidates = db.execute("""
+            SELECT *, COUNT(*) OVER () as total_found
+            FROM (
+                SELECT s.id as slot_id, s.task_id, t.title as task_title, t.priority, t.deadline,
+                       s.start_datetime as current_start, s.end_datetime as current_end,
+                       (julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 as duration,
+                       CAST(julianday(date(s.start_datetime)) - julianday(date(?)) AS INTEGER) as days_until,
+                       (julianday(s.start_datetime) - julianday(?)) * 24 as hours_until,
+                       (4 - t.priority) * 50
+                       + CASE WHEN COALESCE(t.deadline, '') = '' THEN 0
+                              ELSE MAX(0, 100 - (julianday(date(t.deadline)) - julianday(date(?)))) END
+                       + MIN((julianday(s.start_datetime) - julianday(?)) * 10, 100) as score
+                FROM scheduled_slots s
+                JOIN tasks t ON s.task_id = t.id
+                WHERE s.completed = 0
+                AND s.is_fixed = 0
+                AND s.start_datetime > ?
+                AND s.start_datetime < ?
+                AND t.is_reschedulable = 1
+            )
+            WHERE duration <= ? + 1e-6
+            ORDER BY score DESC, current_start
+            LIMIT ?
+        """, (
+            slot_start.isoformat(), slot_start.isoformat(), slot_start.isoformat(), slot_start.isoformat(),
+            slot_start.isoformat(), (slot_start + timedelta(days=lookahead_days)).isoformat(),
+            slot_duration, max(limit, FILL_COMBINATION_CANDIDATES)
+        ))
         
-        # Get all future incomplete slots (after the empty slot)
-        future_slots = db.execute("""
-            SELECT s.*, t.title, t.priority, t.deadline, t.is_reschedulable
-            FROM scheduled_slots s
-            JOIN tasks t ON s.task_id = t.id
-            WHERE s.start_datetime > ?
-            AND s.completed = 0
-            AND s.is_fixed = 0
-            AND t.is_reschedulable = 1
-            ORDER BY s.start_datetime
-        """, (slot_start.isoformat(),))
+        total_found = candidates[0]['total_found'] if candidates else 0
         
-        print(f"Found {len(future_slots)} future movable slots")
+        for candidate in candidates:
+            del candidate['total_found']
+            candidate['duration'] = round(stored_duration_hours(candidate['current_start'], candidate['current_end']), 2)
+            candidate['hours_until'] = round(candidate['hours_until'], 1)
+            candidate['score'] = round(candidate['score'], 1)
         
-        suggestions = []
-        
-        for slot in future_slots:
-            # Calculate slot duration
-            slot_start_time = datetime.fromisoformat(slot['start_datetime'].replace('+00:00', '').replace('Z', ''))
-            slot_end_time = datetime.fromisoformat(slot['end_datetime'].replace('+00:00', '').replace('Z', ''))
-            task_duration = (slot_end_time - slot_start_time).total_seconds() / 3600
-            
-            # Check if it fits in available time
-            if task_duration <= slot_duration:
-                # Calculate days until scheduled
-                days_until = (slot_start_time.date() - slot_start.date()).days
-                hours_until = (slot_start_time - slot_start).total_seconds() / 3600
-                
-                # Calculate priority score (higher = better to move)
-                # Factors: task priority, deadline proximity, how far in future
-                deadline_score = 0
-                if slot['deadline']:
-                    deadline_dt = datetime.fromisoformat(slot['deadline'])
-                    days_to_deadline = (deadline_dt.date() - slot_start.date()).days
-                    deadline_score = max(0, 100 - days_to_deadline)  # Closer deadline = higher score
-                
-                priority_score = (4 - slot['priority']) * 50  # P1=150, P2=100, P3=50
-                future_score = min(hours_until / 24 * 10, 100)  # Further in future = higher score
-                
-                total_score = priority_score + deadline_score + future_score
-                
-                suggestions.append({
-                    'slot_id': slot['id'],
-                    'task_id': slot['task_id'],
-                    'task_title': slot['title'],
-                    'priority': slot['priority'],
-                    'deadline': slot['deadline'],
-                    'current_start': slot['start_datetime'],
-                    'current_end': slot['end_datetime'],
-                    'duration': round(task_duration, 2),
-                    'days_until': days_until,
-                    'hours_until': round(hours_until, 1),
-                    'score': round(total_score, 1)
-                })
-        
-        # Sort by score (highest first)
-        suggestions.sort(key=lambda x: x['score'], reverse=True)
+        # Best-scoring set of two or more slots for each amount of the gap filled,
+        # fullest first
+        packings = pack_gap(
+            [(candidate['duration'], candidate['score'], candidate) for candidate in candidates],
+            slot_duration
+        )
+        combinations = [
+            {
+                'slot_ids': [slot['slot_id'] for slot in slots],
+                'total_duration': round(sum(slot['duration'] for slot in slots), 2),
+                'score': round(score, 1),
+                'slots': slots
+            }
+            for _, (score, slots) in sorted(packings.items(), reverse=True)
+            if len(slots) > 1
+        ][:FILL_COMBINATIONS]
         
-        # Return top 10 suggestions
-        result = {
+        return {
             'available_duration': round(slot_duration, 2),
-            'suggestions': suggestions[:10],
-            'total_found': len(suggestions)
+            'suggestions': candidates[:limit],
+            'combinations': combinations,
+            'total_found': total_found
         }
-        
-        print(f"Returning {len(result['suggestions'])} suggestions")
-        return result
-        
+    
     except Exception as e:
         print(f"ERROR in get_fill_suggestions: {e}")
         import traceback
@@ -346,20 +369,22 @@ def create_task(task: TaskCreate):
     # Validate
     if task.deadline and task.start_date and task.deadline < task.start_date:
         raise HTTPException(400, "Deadline cannot be before start date")
+    check_project_exists(task.project_id)
     
     task_dict = task.dict()
     task_dict['has_time_allocation'] = False
     task_dict['status'] = 'not_started'
     
-    task_id = db.insert('tasks', task_dict)
-    
-    # Log activity (serialize dates for JSON)
-    db.insert('activity_log', {
-        'action': 'create_task',
-        'entity_type': 'task',
-        'entity_id': task_id,
-        'new_data': json.dumps(serialize_for_json(task_dict))
-    })
+    with db.transaction():
+        task_id = db.insert('tasks', task_dict)
+        
+        # Log activity (serialize dates for JSON)
+        db.insert('activity_log', {
+            'action': 'create_task',
+            'entity_type': 'task',
+            'entity_id': task_id,
+            'new_data': json.dumps(serialize_for_json(task_dict))
+        })
     
     return {"id": task_id, **task_dict}
 
@@ -372,40 +397,39 @@ def update_task(task_id: int, updates: TaskUpdate):
         raise HTTPException(404, "Task not found")
     
     update_dict = updates.dict(exclude_none=True)
+    check_project_exists(update_dict.get('project_id'))
     
+    rescheduling = None
     if update_dict:
         # Check if dates changed
         dates_changed = ('start_date' in update_dict or 'deadline' in update_dict)
         
-        db.update('tasks', update_dict, 'id = ?', (task_id,))
-        
-        # If dates changed and task is auto-scheduled, reschedule it
-        if dates_changed and not task['has_time_allocation'] and task['is_reschedulable']:
-            # Delete existing non-fixed, incomplete slots (includes auto, manual, and moved slots)
-            deleted = db.delete('scheduled_slots', 
-                              'task_id = ? AND is_fixed = 0 AND completed = 0 AND source != ?', 
-                              (task_id, 'allocation'))
-            
-            print(f"Deleted {deleted} non-fixed slots for task {task_id} before rescheduling")
-            
-            # Try to reschedule
-            try:
-                from scheduling import auto_schedule_task
-                auto_schedule_task(task_id)
-            except Exception as e:
-                # Rescheduling failed, but task update succeeded
-                print(f"Warning: Could not reschedule task {task_id}: {e}")
-        
-        # Log activity (serialize dates for JSON)
-        db.insert('activity_log', {
-            'action': 'update_task',
-            'entity_type': 'task',
-            'entity_id': task_id,
-            'old_data': json.dumps(serialize_for_json(task)),
-            'new_data': json.dumps(serialize_for_json(update_dict))
-        })
+        # A failed reschedule rolls the update back with it
+        try:
+            with db.transaction():
+                db.update('tasks', update_dict, 'id = ?', (task_id,))
+                
+                # If dates changed and task is auto-scheduled, reschedule it
+                if dates_changed and not task['has_time_allocation'] and task['is_reschedulable']:
+                    # Keep sessions still inside the new window, place only the missing hours
+                    from scheduling import reschedule_task_window
+                    rescheduling = reschedule_task_window(task_id)
+                
+                # Log activity (serialize dates for JSON)
+                db.insert('activity_log', {
+                    'action': 'update_task',
+                    'entity_type': 'task',
+                    'entity_id': task_id,
+                    'old_data': json.dumps(serialize_for_json(task)),
+                    'new_data': json.dumps(serialize_for_json(update_dict))
+                })
+        except SchedulingError as e:
+            raise HTTPException(400, f"Could not reschedule task: {str(e)}")
     
-    return get_task(task_id)
+    updated = get_task(task_id)
+    if rescheduling is not None:
+        updated['rescheduling'] = rescheduling
+    return updated
 
 
 @app.delete("/tasks/{task_id}")
@@ -415,22 +439,23 @@ def delete_task(task_id: int):
     if not task:
         raise HTTPException(404, "Task not found")
     
-    # Log before deleting (serialize dates for JSON)
-    db.insert('activity_log', {
-        'action': 'delete_task',
-        'entity_type': 'task',
-        'entity_id': task_id,
-        'old_data': json.dumps(serialize_for_json(task))
-    })
-    
-    # Delete scheduled slots
-    db.delete('scheduled_slots', 'task_id = ?', (task_id,))
-    
-    # Delete time allocations
-    db.delete('time_allocations', 'task_id = ?', (task_id,))
-    
-    # Delete task
-    db.delete('tasks', 'id = ?', (task_id,))
+    with db.transaction():
+        # Log before deleting (serialize dates for JSON)
+        db.insert('activity_log', {
+            'action': 'delete_task',
+            'entity_type': 'task',
+            'entity_id': task_id,
+            'old_data': json.dumps(serialize_for_json(task))
+        })
+        
+        # Delete scheduled slots
+        db.delete('scheduled_slots', 'task_id = ?', (task_id,))
+        
+        # Delete time allocations
+        db.delete('time_allocations', 'task_id = ?', (task_id,))
+        
+        # Delete task
+        db.delete('tasks', 'id = ?', (task_id,))
     
     return {"success": True}
 
@@ -444,22 +469,23 @@ def complete_task(task_id: int):
     
     now = datetime.now()
     
-    # Update task
-    db.update('tasks', {
-        'status': 'completed',
-        'completed_at': now.isoformat()
-    }, 'id = ?', (task_id,))
-    
-    # Delete future slots (including today's future slots)
-    # Use datetime comparison properly
-    deleted_count = db.delete('scheduled_slots', 
-                              'task_id = ? AND datetime(start_datetime) > datetime(?)', 
-                              (task_id, now.isoformat()))
-    
-    # End time allocation if exists
-    db.update('time_allocations', {
-        'end_date': date.today().isoformat()
-    }, 'task_id = ?', (task_id,))
+    with db.transaction():
+        # Update task
+        db.update('tasks', {
+            'status': 'completed',
+            'completed_at': now.isoformat()
+        }, 'id = ?', (task_id,))
+        
+        # Delete future slots (including today's future slots)
+        # Use datetime comparison properly
+        deleted_count = db.delete('scheduled_slots', 
+                                  'task_id = ? AND datetime(start_datetime) > datetime(?)', 
+                                  (task_id, now.isoformat()))
+        
+        # End time allocation if exists
+        db.update('time_allocations', {
+            'end_date': date.today().isoformat()
+        }, 'task_id = ?', (task_id,))
     
     return {
         "success": True,
@@ -486,11 +512,16 @@ def get_slots(start_date: date = None, end_date: date = None):
         FROM scheduled_slots s
         JOIN tasks t ON s.task_id = t.id
         LEFT JOIN projects p ON t.project_id = p.id
-        WHERE (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
-        AND s.completed = 0
+        WHERE s.completed = 0
     """
     params = []
     
+    # Instances without slot rows (virtual allocations, and materialized ones
+    # past the rolling horizon) are expanded for the range; open ends default
+    # to today and the recurring horizon
+    range_start = start_date or date.today()
+    range_end = end_date or range_start + timedelta(days=RECURRING_HORIZON_DAYS)
+    
     if start_date:
         query += " AND DATE(s.start_datetime) >= ?"
         params.append(start_date.isoformat())
@@ -502,6 +533,17 @@ def get_slots(start_date: date = None, end_date: date = None):
     query += " ORDER BY s.start_datetime"
     
     slots = db.execute(query, tuple(params))
+    
+    instances = virtual_instances(
+        datetime.combine(range_start, datetime.min.time()),
+        datetime.combine(range_end + timedelta(days=1), datetime.min.time())
+    )
+    if instances:
+        slots = sorted(
+            slots + [i for i in instances if i['start_datetime'][:10] >= range_start.isoformat()],
+            key=lambda slot: slot['start_datetime']
+        )
+    
     print(f"get_slots: Returning {len(slots)} slots (completed=0 only)")
     return {"slots": slots}
 
@@ -513,16 +555,7 @@ def delete_slot(slot_id: int):
     if not slot:
         raise HTTPException(404, "Slot not found")
     
-    if slot['source'] == 'allocation':
-        # Mark as deleted override so it doesn't regenerate
-        db.update('scheduled_slots', {
-            'is_override': 1,
-            'start_datetime': None,
-            'end_datetime': None
-        }, 'id = ?', (slot_id,))
-    else:
-        db.delete('scheduled_slots', 'id = ?', (slot_id,))
-    
+    delete_scheduled_slot(slot)
     return {"success": True}
 
 
@@ -576,6 +609,50 @@ def create_manual_slot(slot_data: ManualSlotCreate):
     }
 
 
+@app.post("/slots/conflicts")
+def check_slot_conflicts(request: ConflictCheckRequest):
+    """Check many candidate intervals (e.g. a week of drop targets) in one request"""
+    # Stored times are naive; drop the offset of ...Z / +00:00 inputs like /slots/bulk does
+    intervals = [
+        (i.start_datetime.replace(tzinfo=None), i.end_datetime.replace(tzinfo=None), i.exclude_slot_id)
+        for i in request.intervals
+    ]
+    for start, end, _ in intervals:
+        if end <= start:
+            raise HTTPException(400, "Each interval must end after it starts")
+    
+    results = has_conflicts_batch(intervals, request.exclude_slot_ids)
+    return {
+        "results": [
+            {
+                "start_datetime": start.isoformat(),
+                "end_datetime": end.isoformat(),
+                **result
+            }
+            for (start, end, _), result in zip(intervals, results)
+        ],
+        "conflict_count": sum(1 for result in results if result['has_conflict'])
+    }
+
+
+@app.post("/slots/bulk")
+def bulk_slot_operations(request: BulkSlotRequest):
+    """
+    Move, shift, delete, fix or unfix many slots in one request (multi-select)
+    All operations are validated together and applied in one transaction; if any
+    fails (e.g. a move conflicts) nothing is written and 409 lists per-operation results
+    (a dry run returns them with 200)
+    """
+    try:
+        result = apply_slot_operations([operation.dict() for operation in request.operations], request.dry_run)
+    except SchedulingError as e:
+        raise HTTPException(400, str(e))
+    
+    if not result['success'] and not request.dry_run:
+        raise HTTPException(409, result)
+    return result
+
+
 @app.post("/slots/{slot_id}/complete")
 def complete_slot(slot_id: int):
     """Mark a single slot as completed, and complete task if all slots are done"""
@@ -585,32 +662,32 @@ def complete_slot(slot_id: int):
     
     print(f"Completing slot {slot_id}, task_id={slot['task_id']}")
     
-    # Mark this slot complete
-    db.update('scheduled_slots', {
-        'completed': 1,
-        'completed_at': datetime.now().isoformat()
-    }, 'id = ?', (slot_id,))
-    
-    # Check if all slots for this task are now completed
-    remaining_slots = db.execute("""
-        SELECT COUNT(*) as count FROM scheduled_slots
-        WHERE task_id = ?
-        AND completed = 0
-        AND (is_override = 0 OR (is_override = 1 AND start_datetime IS NOT NULL))
-    """, (slot['task_id'],))
-    
-    remaining_count = remaining_slots[0]['count']
-    print(f"Task {slot['task_id']} has {remaining_count} incomplete slots remaining")
-    
-    # If no incomplete slots remain, mark task as completed
-    if remaining_count == 0:
-        print(f"All slots complete! Marking task {slot['task_id']} as completed")
-        db.update('tasks', {
-            'status': 'completed',
+    with db.transaction():
+        # Mark this slot complete
+        db.update('scheduled_slots', {
+            'completed': 1,
             'completed_at': datetime.now().isoformat()
-        }, 'id = ?', (slot['task_id'],))
+        }, 'id = ?', (slot_id,))
+        
+        # Check if all slots for this task are now completed
+        remaining_slots = db.execute("""
+            SELECT COUNT(*) as count FROM scheduled_slots
+            WHERE task_id = ?
+            AND completed = 0
+        """, (slot['task_id'],))
+        
+        remaining_count = remaining_slots[0]['count']
+        print(f"Task {slot['task_id']} has {remaining_count} incomplete slots remaining")
         
-        return {"success": True, "completed": True, "task_completed": True}
+        # If no incomplete slots remain, mark task as completed
+        if remaining_count == 0:
+            print(f"All slots complete! Marking task {slot['task_id']} as completed")
+            db.update('tasks', {
+                'status': 'completed',
+                'completed_at': datetime.now().isoformat()
+            }, 'id = ?', (slot['task_id'],))
+            
+            return {"success": True, "completed": True, "task_completed": True}
     
     return {"success": True, "completed": True, "task_completed": False}
 
@@ -648,21 +725,27 @@ def create_blocked_time(block: BlockedTimeCreate):
     block_dict = block.dict()
     block_dict['is_recurring'] = bool(block.rrule)
     
-    block_id = db.insert('blocked_times', {
-        'title': block_dict['title'],
-        'description': block_dict['description'],
-        'start_datetime': block_dict['start_datetime'].isoformat(),
-        'end_datetime': block_dict['end_datetime'].isoformat(),
-        'rrule': block_dict['rrule'],
-        'is_recurring': block_dict['is_recurring']
-    })
+    try:
+        with db.transaction():
+            block_id = db.insert('blocked_times', {
+                'title': block_dict['title'],
+                'description': block_dict['description'],
+                'start_datetime': block_dict['start_datetime'].isoformat(),
+                'end_datetime': block_dict['end_datetime'].isoformat(),
+                'rrule': block_dict['rrule'],
+                'is_recurring': block_dict['is_recurring']
+            })
+            # Expand occurrences now so conflict checks see every repeat
+            block_dict['occurrences'] = materialize_blocked_time(block_id)
+    except RecurrenceError as e:
+        raise HTTPException(400, str(e))
     
     return {"id": block_id, **block_dict}
 
 
 @app.delete("/blocked-times/{block_id}")
 def delete_blocked_time(block_id: int):
-    """Delete a blocked time"""
+    """Delete a blocked time (its occurrences go with it)"""
     db.delete('blocked_times', 'id = ?', (block_id,))
     return {"success": True}
 
@@ -674,10 +757,7 @@ def delete_blocked_time(block_id: int):
 @app.get("/settings/calendar")
 def get_calendar_settings():
     """Get calendar settings"""
-    settings = db.execute_one("SELECT * FROM calendar_settings WHERE id = 1")
-    if settings:
-        settings['excluded_dates'] = json.loads(settings['excluded_dates'])
-    return settings
+    return get_work_calendar().settings
 
 
 @app.patch("/settings/calendar")
@@ -687,9 +767,15 @@ def update_calendar_settings(updates: CalendarSettingsUpdate):
     
     if 'excluded_dates' in update_dict:
         update_dict['excluded_dates'] = json.dumps(update_dict['excluded_dates'])
+    if 'excluded_ranges' in update_dict:
+        update_dict['excluded_ranges'] = json.dumps(serialize_for_json(update_dict['excluded_ranges']))
     
     if update_dict:
-        db.update('calendar_settings', update_dict, 'id = 1')
+        # Bump the version so cached work calendars are rebuilt
+        with db.transaction():
+            current = db.execute_one("SELECT version FROM calendar_settings WHERE id = 1")
+            update_dict['version'] = (current['version'] or 0) + 1
+            db.update('calendar_settings', update_dict, 'id = 1')
     
     return get_calendar_settings()
 
@@ -699,20 +785,25 @@ def update_calendar_settings(updates: CalendarSettingsUpdate):
 # ============================================================================
 
 @app.post("/schedule/auto")
-def auto_schedule():
-    """Auto-schedule all unscheduled, reschedulable tasks"""
+def auto_schedule(strategy: str = 'greedy', dry_run: bool = False):
+    """
+    Auto-schedule all unscheduled, reschedulable tasks
+    strategy: 'greedy' (default) or 'solver' (global, deadline-aware; reports infeasible tasks)
+    If dry_run=True, returns the plan without saving it
+    """
     try:
-        result = auto_schedule_all_tasks()
+        result = auto_schedule_all_tasks(strategy, dry_run=dry_run)
         return result
     except SchedulingError as e:
         raise HTTPException(400, str(e))
 
 
 @app.post("/schedule/task/{task_id}")
-def schedule_single_task(task_id: int, force_bump: bool = False):
+def schedule_single_task(task_id: int, force_bump: bool = False, dry_run: bool = False):
     """
     Schedule a single task
     If force_bump=True, will bump lower priority tasks if needed
+    If dry_run=True, returns the plan (including bumps) without saving it
     """
     task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
     if not task:
@@ -720,15 +811,41 @@ def schedule_single_task(task_id: int, force_bump: bool = False):
     
     try:
         if force_bump or task['priority'] >= 4:
-            result = attempt_with_bumping(task_id)
+            result = attempt_with_bumping(task_id, dry_run=dry_run)
         else:
-            result = auto_schedule_task(task_id)
+            result = auto_schedule_task(task_id, dry_run=dry_run)
         
         return result
     except SchedulingError as e:
         raise HTTPException(400, str(e))
 
 
+@app.post("/schedule/preview")
+def preview_task_schedule(task: TaskCreate, force_bump: bool = False):
+    """
+    Preview how an unsaved task would be scheduled (nothing is written)
+    Lets the task form show the plan, and any bumps, while it is being edited
+    """
+    if task.deadline and task.start_date and task.deadline < task.start_date:
+        raise HTTPException(400, "Deadline cannot be before start date")
+    
+    task_dict = serialize_for_json(task.dict())
+    task_dict['id'] = None
+    task_dict['has_time_allocation'] = False
+    task_dict['status'] = 'not_started'
+    
+    try:
+        if force_bump or task.priority >= 4:
+            return attempt_with_bumping(None, dry_run=True, task=task_dict)
+        return auto_schedule_task(None, dry_run=True, task=task_dict)
+    except SchedulingError as e:
+        return {
+            "scheduled": False,
+            "dry_run": True,
+            "error": str(e)
+        }
+
+
 @app.post("/tasks/with-scheduling")
 def create_task_with_scheduling(task: TaskCreate, force_bump: bool = False):
     """
@@ -738,58 +855,65 @@ def create_task_with_scheduling(task: TaskCreate, force_bump: bool = False):
     # Validate
     if task.deadline and task.start_date and task.deadline < task.start_date:
         raise HTTPException(400, "Deadline cannot be before start date")
+    check_project_exists(task.project_id)
     
     task_dict = task.dict()
     task_dict['has_time_allocation'] = False
     task_dict['status'] = 'not_started'
     
-    task_id = db.insert('tasks', task_dict)
-    
-    # Log activity
-    db.insert('activity_log', {
-        'action': 'create_task',
-        'entity_type': 'task',
-        'entity_id': task_id,
-        'new_data': json.dumps(serialize_for_json(task_dict))
-    })
-    
-    # Try to schedule
-    should_bump = force_bump or task.priority >= 4
-    
-    try:
-        if should_bump:
-            schedule_result = attempt_with_bumping(task_id)
-        else:
-            schedule_result = auto_schedule_task(task_id)
+    # Task creation and its scheduling commit together; a scheduling failure
+    # only rolls back its own savepoint
+    with db.transaction():
+        task_id = db.insert('tasks', task_dict)
         
-        return {
-            "task_id": task_id,
-            **task_dict,
-            "scheduling": schedule_result
-        }
-    except SchedulingError as e:
-        # Task created but couldn't schedule
-        return {
-            "task_id": task_id,
-            **task_dict,
-            "scheduling": {
-                "scheduled": False,
-                "error": str(e)
+        # Log activity
+        db.insert('activity_log', {
+            'action': 'create_task',
+            'entity_type': 'task',
+            'entity_id': task_id,
+            'new_data': json.dumps(serialize_for_json(task_dict))
+        })
+        
+        # Try to schedule
+        should_bump = force_bump or task.priority >= 4
+        
+        try:
+            if should_bump:
+                schedule_result = attempt_with_bumping(task_id)
+            else:
+                schedule_result = auto_schedule_task(task_id)
+            
+            return {
+                "task_id": task_id,
+                **task_dict,
+                "scheduling": schedule_result
+            }
+        except SchedulingError as e:
+            # Task created but couldn't schedule
+            return {
+                "task_id": task_id,
+                **task_dict,
+                "scheduling": {
+                    "scheduled": False,
+                    "error": str(e)
+                }
             }
-        }
 
 
 @app.post("/schedule/reallocate-now")
-def reallocate_now(request: ReallocateRequest):
+def reallocate_now(request: ReallocateRequest, dry_run: bool = False):
     """
     Find tasks that could be moved into newly available time
+    If dry_run=True, auto mode reports the move without making it
     """
     try:
         result = reallocate_to_available_time(
             request.available_start,
             request.available_end,
             request.mode,
-            request.max_suggestions
+            request.max_suggestions,
+            dry_run=dry_run,
+            pack=request.pack
         )
         return result
     except Exception as e:
@@ -812,22 +936,23 @@ def accept_reallocation(slot_id: int, new_start: datetime):
     if conflict['has_conflict']:
         raise HTTPException(409, "Time slot conflicts with existing schedule")
     
-    # Move the slot
-    db.update('scheduled_slots', {
-        'start_datetime': new_start.isoformat(),
-        'end_datetime': new_end.isoformat(),
-        'source': 'manual',
-        'is_override': 1,
-        'original_start': slot['start_datetime']
-    }, 'id = ?', (slot_id,))
-    
-    db.insert('activity_log', {
-        'action': 'reallocate_accept',
-        'entity_type': 'slot',
-        'entity_id': slot_id,
-        'old_data': json.dumps({'start': slot['start_datetime']}),
-        'new_data': json.dumps({'start': new_start.isoformat()})
-    })
+    with db.transaction():
+        # Move the slot
+        db.update('scheduled_slots', {
+            'start_datetime': new_start.isoformat(),
+            'end_datetime': new_end.isoformat(),
+            'source': 'manual',
+            'is_override': 1,
+            'original_start': slot['start_datetime']
+        }, 'id = ?', (slot_id,))
+        
+        db.insert('activity_log', {
+            'action': 'reallocate_accept',
+            'entity_type': 'slot',
+            'entity_id': slot_id,
+            'old_data': json.dumps({'start': slot['start_datetime']}),
+            'new_data': json.dumps({'start': new_start.isoformat()})
+        })
     
     return {"success": True}
 
@@ -879,7 +1004,23 @@ def move_slot(slot_id: int, move_data: SlotMove):
         if conflict['has_conflict']:
             # Get the first conflicting slot
             slot_conflicts = conflict.get('slot_conflicts', [])
-            if slot_conflicts:
+            if slot_conflicts and slot_conflicts[0]['id'] is None:
+                # A recurring instance without a slot row; the frontend detaches it to swap
+                instance = slot_conflicts[0]
+                return {
+                    "success": False,
+                    "conflict": True,
+                    "conflicting_slot": {
+                        "id": None,
+                        "allocation_id": instance['allocation_id'],
+                        "original_start": instance['original_start'],
+                        "task_title": instance['title'],
+                        "start": instance['start_datetime'],
+                        "end": instance['end_datetime'],
+                        "is_fixed": False
+                    }
+                }
+            elif slot_conflicts:
                 conflicting_slot_id = slot_conflicts[0]['id']
                 print(f"Conflict detected with slot {conflicting_slot_id}")
                 
@@ -924,7 +1065,7 @@ def move_slot(slot_id: int, move_data: SlotMove):
         
         print(f"Slot {slot_id} moved successfully")
         return {"success": True}
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -972,39 +1113,65 @@ def move_slot_with_swap(slot_id: int, swap_with_id: int, move_data: SlotMove):
     print(f"Swapping: Slot {slot_id} -> {new_slot1_start} to {new_slot1_end}")
     print(f"Swapping: Slot {swap_with_id} -> {new_slot2_start} to {new_slot2_end}")
     
-    # Update both slots
-    db.update('scheduled_slots', {
-        'start_datetime': new_slot1_start.isoformat(),
-        'end_datetime': new_slot1_end.isoformat(),
-        'is_override': 1,
-        'source': 'manual'
-    }, 'id = ?', (slot_id,))
-    
-    db.update('scheduled_slots', {
-        'start_datetime': new_slot2_start.isoformat(),
-        'end_datetime': new_slot2_end.isoformat(),
-        'is_override': 1,
-        'source': 'manual'
-    }, 'id = ?', (swap_with_id,))
+    with db.transaction():
+        # Update both slots
+        db.update('scheduled_slots', {
+            'start_datetime': new_slot1_start.isoformat(),
+            'end_datetime': new_slot1_end.isoformat(),
+            'is_override': 1,
+            'source': 'manual'
+        }, 'id = ?', (slot_id,))
+        
+        db.update('scheduled_slots', {
+            'start_datetime': new_slot2_start.isoformat(),
+            'end_datetime': new_slot2_end.isoformat(),
+            'is_override': 1,
+            'source': 'manual'
+        }, 'id = ?', (swap_with_id,))
     
     print(f"Swap completed successfully")
     return {"success": True}
 
 
+@app.get("/schedule/feasibility")
+def check_all_feasibility_endpoint():
+    """Check every open task against its deadline, alone and cumulatively (EDF)"""
+    return check_all_deadlines_feasibility()
+
+
 @app.get("/schedule/feasibility/{task_id}")
-def check_task_feasibility_endpoint(task_id: int):
-    """Check if a task can fit within its deadline"""
+def check_task_feasibility_endpoint(task_id: int, engine: str = 'capacity'):
+    """
+    Check if a task can fit within its deadline
+    engine: 'capacity' (default, cached), 'interval' or 'grid' (vectorized, needs numpy)
+    """
     task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
     if not task:
         raise HTTPException(404, "Task not found")
     
     try:
-        result = check_deadline_feasibility(task)
+        result = check_deadline_feasibility(task, engine=engine)
         return result
     except Exception as e:
         raise HTTPException(400, str(e))
 
 
+@app.post("/schedule/scenarios")
+def evaluate_scenarios(request: ScenarioRequest):
+    """
+    Compare what-if scenarios (extra tasks, time off, different work hours)
+    Each is planned in parallel against one snapshot of the schedule; nothing is saved
+    """
+    try:
+        return run_scenarios(
+            [scenario.dict() for scenario in request.scenarios],
+            request.strategy,
+            request.timeout_seconds
+        )
+    except SchedulingError as e:
+        raise HTTPException(400, str(e))
+
+
 # ============================================================================
 # TIME ALLOCATIONS (Recurring Patterns)
 # ============================================================================
@@ -1022,28 +1189,31 @@ def create_time_allocation(allocation: TimeAllocationCreate):
     if not validation['valid']:
         raise HTTPException(400, f"Invalid rrule: {validation['error']}")
     
-    # Create allocation
-    allocation_id = db.insert('time_allocations', {
-        'task_id': allocation.task_id,
-        'rrule': allocation.rrule,
-        'duration_hours': allocation.duration_hours,
-        'time_of_day': allocation.time_of_day,
-        'start_date': allocation.start_date.isoformat(),
-        'end_date': allocation.end_date.isoformat() if allocation.end_date else None
-    })
-    
-    # Mark task as having time allocation
-    db.update('tasks', {'has_time_allocation': 1}, 'id = ?', (allocation.task_id,))
-    
-    # Generate slots
+    # Create allocation, flag the task and generate its slots atomically
     try:
-        generated = generate_recurring_slots(allocation_id)
-        return {
-            "id": allocation_id,
-            "slots_generated": len(generated)
-        }
+        with db.transaction():
+            allocation_id = db.insert('time_allocations', {
+                'task_id': allocation.task_id,
+                'rrule': allocation.rrule,
+                'duration_hours': allocation.duration_hours,
+                'time_of_day': allocation.time_of_day,
+                'start_date': allocation.start_date.isoformat(),
+                'end_date': allocation.end_date.isoformat() if allocation.end_date else None,
+                'storage': allocation.storage
+            })
+            
+            # Mark task as having time allocation
+            db.update('tasks', {'has_time_allocation': 1}, 'id = ?', (allocation.task_id,))
+            
+            # Generate slots
+            generated = generate_recurring_slots(allocation_id)
     except RecurrenceError as e:
         raise HTTPException(400, str(e))
+    
+    return {
+        "id": allocation_id,
+        "slots_generated": len(generated)
+    }
 
 
 @app.get("/time-allocations/{task_id}")
@@ -1055,6 +1225,29 @@ def get_time_allocations(task_id: int):
     return {"allocations": allocations}
 
 
+@app.post("/time-allocations/{allocation_id}/instances/detach")
+def detach_allocation_instance(allocation_id: int, instance: AllocationInstance):
+    """
+    Turn one instance without a slot row (of a virtual allocation, or past a
+    materialized one's generated range) into a slot row, to move, resize or
+    complete it through the slot endpoints
+    """
+    try:
+        return {"slot": detach_virtual_instance(allocation_id, instance.original_start)}
+    except RecurrenceError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.delete("/time-allocations/{allocation_id}/instances")
+def delete_allocation_instance(allocation_id: int, original_start: datetime):
+    """Delete one instance without a slot row; the pattern continues"""
+    try:
+        delete_virtual_instance(allocation_id, original_start)
+    except RecurrenceError as e:
+        raise HTTPException(400, str(e))
+    return {"success": True}
+
+
 @app.put("/slots/{slot_id}/edit-recurrence")
 def edit_recurring_slot(slot_id: int, edit: TimeAllocationEdit):
     """Edit a recurring time allocation instance"""
@@ -1193,6 +1386,48 @@ def get_stats():
     }
 
 
+@app.get("/stats/capacity")
+def get_capacity_stats(from_date: Optional[date] = Query(None, alias='from'),
+                       to_date: Optional[date] = Query(None, alias='to')):
+    """
+    Per-day capacity forecast: work hours, committed hours by source, blocked and free hours
+    Defaults to the next 30 days; at most two years per request
+    """
+    from_date = from_date or date.today()
+    to_date = to_date or (from_date + timedelta(days=30))
+    
+    if to_date < from_date:
+        raise HTTPException(400, "'to' cannot be before 'from'")
+    if (to_date - from_date).days > 731:
+        raise HTTPException(400, "Range cannot exceed two years")
+    
+    return get_capacity_forecast(from_date, to_date)
+
+
+@app.get("/stats/database")
+def get_database_stats():
+    """Get SQLite connection pool statistics"""
+    return db.pool_stats()
+
+
+@app.get("/stats/rrule-cache")
+def get_rrule_cache_stats():
+    """Hit/miss counters of the parsed-rule and occurrence-window caches"""
+    return rrule_cache_stats()
+
+
+@app.get("/stats/response-cache")
+def get_response_cache_stats():
+    """Hit, miss and 304 counters of the read response cache"""
+    return response_cache_stats()
+
+
+@app.post("/stats/task-hours/rebuild")
+def rebuild_task_hours():
+    """Recompute the per-task slot hour aggregates from scheduled_slots"""
+    return {"success": True, "tasks": db.rebuild_task_hours()}
+
+
 # ============================================================================
 # UTILITY
 # ============================================================================
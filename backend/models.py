@@ -45,6 +45,11 @@ class TimeAllocationCreate(BaseModel):
     time_of_day: str  # "14:00"
     start_date: date
     end_date: Optional[date] = None
+    storage: Literal['materialized', 'virtual'] = 'materialized'  # virtual: expanded on read
+
+
+class AllocationInstance(BaseModel):
+    original_start: datetime  # start of the instance in the pattern
 
 
 class TimeAllocationEdit(BaseModel):
@@ -67,6 +72,29 @@ class ReallocateRequest(BaseModel):
     available_end: datetime
     mode: Literal['interactive', 'auto'] = 'interactive'
     max_suggestions: int = 5
+    pack: bool = False  # fill the time with several slots back to back
+
+
+class TimeOff(BaseModel):
+    start_date: date
+    end_date: date
+
+
+class Scenario(BaseModel):
+    name: str
+    add_tasks: List[TaskCreate] = []
+    time_off: List[TimeOff] = []
+    # Calendar overrides for this scenario only
+    work_schedule: Optional[Literal['weekdays', 'all_week', 'custom']] = None
+    custom_days: Optional[str] = None  # 'MO,TU,WE,TH,FR'
+    work_start_time: Optional[str] = None  # '08:00'
+    work_end_time: Optional[str] = None  # '18:00'
+
+
+class ScenarioRequest(BaseModel):
+    scenarios: List[Scenario] = Field(min_length=1, max_length=16)
+    strategy: Literal['greedy', 'solver'] = 'greedy'
+    timeout_seconds: float = Field(default=10.0, gt=0, le=120)
 
 
 class CalendarSettingsUpdate(BaseModel):
@@ -75,6 +103,7 @@ class CalendarSettingsUpdate(BaseModel):
     work_start_time: Optional[str] = None  # '09:00'
     work_end_time: Optional[str] = None  # '17:00'
     excluded_dates: Optional[List[str]] = None  # ['2025-12-25', '2025-12-26']
+    excluded_ranges: Optional[List[TimeOff]] = None  # vacations, inclusive
 
 
 class EmailSettingsUpdate(BaseModel):
@@ -96,6 +125,29 @@ class ManualSlotCreate(BaseModel):
     is_fixed: bool = False
 
 
+class ConflictInterval(BaseModel):
+    start_datetime: datetime
+    end_datetime: datetime
+    exclude_slot_id: Optional[int] = None  # e.g. the slot being dragged
+
+
+class ConflictCheckRequest(BaseModel):
+    intervals: List[ConflictInterval] = Field(min_length=1, max_length=2000)
+    exclude_slot_ids: List[int] = []  # ignored for every interval
+
+
+class BulkSlotOperation(BaseModel):
+    op: Literal['move', 'delete', 'fix', 'unfix']
+    slot_id: int
+    new_start: Optional[datetime] = None  # move to this time
+    shift_minutes: Optional[int] = None  # or shift by this much (negative = earlier)
+
+
+class BulkSlotRequest(BaseModel):
+    operations: List[BulkSlotOperation] = Field(min_length=1, max_length=2000)
+    dry_run: bool = False  # validate only
+
+
 class SlotMove(BaseModel):
     new_start: datetime
     swap_with_slot_id: Optional[int] = None  # For handling conflicts
@@ -0,0 +1,136 @@
+"""
+Schedule planning on in-memory data - task windows, work windows and sessions
+
+Nothing here opens the database: given a calendar settings dict and a covering
+busy index, tasks are split into sessions and planned in memory, so scenario
+worker processes can import this without the rest of the backend.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple, Iterable, Iterator
+from busy_index import BusyIndex
+from work_calendar import work_calendar_for
+
+
+# Constants
+MAX_SESSION_HOURS = 4
+
+
+def get_task_window(task: Dict) -> Tuple[date, date]:
+    """Date range a task may be scheduled in: start date (or today) to deadline (or a year out)"""
+    start_date = datetime.fromisoformat(task['start_date']).date() if task['start_date'] else date.today()
+    end_date = datetime.fromisoformat(task['deadline']).date() if task['deadline'] else (date.today() + timedelta(days=365))
+    return start_date, end_date
+
+
+def generate_available_slots(start_date: date, end_date: date, 
+                            calendar_settings: Dict) -> List[Tuple[datetime, datetime]]:
+    """
+    Generate all possible work slots based on calendar settings
+    Returns list of (start_datetime, end_datetime) tuples
+    """
+    return work_calendar_for(calendar_settings).windows(start_date, end_date)
+
+
+def iter_available_slots(start_date: date, end_date: date,
+                         calendar_settings: Dict) -> Iterator[Tuple[datetime, datetime]]:
+    """Same work slots as generate_available_slots, generated lazily"""
+    return work_calendar_for(calendar_settings).iter_windows(start_date, end_date)
+
+
+def create_task_sessions(task: Dict, available_slots: Iterable[Tuple[datetime, datetime]], 
+                        min_session_hours: float = None,
+                        busy: BusyIndex = None,
+                        avoid_own_slots: bool = False) -> Tuple[List[Dict], float]:
+    """
+    Split task into sessions and fit them into available slots
+    Conflicts are read from the busy index if given (the index is not updated;
+    callers add the sessions they keep)
+    The task's own slots are ignored as conflicts unless avoid_own_slots is set
+    Returns (list of session dicts, remaining_hours)
+    """
+    if min_session_hours is None:
+        min_session_hours = task.get('min_session_hours', 2.0)
+    
+    sessions = []
+    remaining = task['estimated_hours']
+    
+    for slot_start, slot_end in available_slots:
+        if remaining <= 0:
+            break
+        
+        # Get available time within this slot (accounting for conflicts)
+        exclude_task_id = None if avoid_own_slots else task.get('id')
+        if busy is not None and busy.covers(slot_start, slot_end):
+            available_ranges = busy.free_gaps(slot_start, slot_end, exclude_task_id=exclude_task_id)
+        else:
+            # Without a covering index, conflicts are read from the database
+            from scheduling import get_available_time_in_slot
+            available_ranges = get_available_time_in_slot(slot_start, slot_end, exclude_task_id)
+        
+        for range_start, range_end in available_ranges:
+            if remaining <= 0:
+                break
+            
+            range_duration = (range_end - range_start).total_seconds() / 3600
+            
+            # Only use this range if it's at least min_session_hours
+            if range_duration >= min_session_hours:
+                session_duration = min(MAX_SESSION_HOURS, range_duration, remaining)
+                session_end = range_start + timedelta(hours=session_duration)
+                
+                sessions.append({
+                    'task_id': task['id'],
+                    'start_datetime': range_start.isoformat(),
+                    'end_datetime': session_end.isoformat(),
+                    'source': 'auto',
+                    'is_override': 0
+                })
+                
+                remaining -= session_duration
+    
+    return sessions, remaining
+
+
+def plan_tasks_greedy(tasks: List[Dict], windows: Dict[int, Tuple[date, date]],
+                      available_slots: List[Tuple[datetime, datetime]],
+                      busy: BusyIndex) -> Dict:
+    """
+    Plan tasks one at a time, in the given order, earliest gap first
+    Each task sees the sessions planned before it; busy is updated as it goes
+    Returns dict with sessions plus scheduled/partial/failed summaries
+    """
+    slot_dates = [slot_start.date() for slot_start, _ in available_slots]
+    
+    scheduled = []
+    partial = []
+    all_sessions = []
+    
+    for task in tasks:
+        start_date, end_date = windows[task['id']]
+        task_slots = available_slots[bisect_left(slot_dates, start_date):bisect_right(slot_dates, end_date)]
+        
+        sessions, remaining = create_task_sessions(task, task_slots, busy=busy)
+        busy.add_sessions(sessions)
+        all_sessions.extend(sessions)
+        
+        if remaining == 0:
+            scheduled.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'sessions': len(sessions)
+            })
+        else:
+            partial.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'scheduled_hours': task['estimated_hours'] - remaining,
+                'remaining_hours': remaining
+            })
+    
+    return {
+        "sessions": all_sessions,
+        "scheduled": scheduled,
+        "partial": partial,
+        "failed": []
+    }
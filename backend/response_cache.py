@@ -0,0 +1,93 @@
+"""
+Response cache - ETags and an in-process LRU for repeated read requests
+
+The database bumps a data version on every write and commit. GET requests to
+the cached routes are keyed by path, query, data version and today's date (some
+reads depend on the date): a matching If-None-Match is answered with 304 and
+any other repeat is served from the LRU, without running SQL either way.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from database import db
+
+
+# Reads the frontend repeats after every mutation
+CACHED_PATHS = frozenset({
+    '/projects', '/tasks', '/tasks/unscheduled', '/slots', '/blocked-times',
+    '/settings/calendar', '/stats/overview'
+})
+RESPONSE_CACHE_SIZE = 128
+
+# The data version restarts with the process; tags from a previous run must not match
+_process_tag = os.urandom(8).hex()
+
+_responses: 'OrderedDict[str, Dict]' = OrderedDict()
+_responses_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+
+def _count(counter: str):
+    with _responses_lock:
+        _stats[counter] += 1
+
+
+def response_cache_stats() -> Dict:
+    """Hit, miss and 304 counters plus the number of cached responses"""
+    with _responses_lock:
+        return {**_stats, 'size': len(_responses), 'max_size': RESPONSE_CACHE_SIZE}
+
+
+def _etag(request: Request, version: int) -> str:
+    key = f"{_process_tag}|{request.url.path}?{sorted(request.query_params.multi_items())}|{version}|{date.today()}"
+    return '"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches etag (weak comparison)"""
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in [candidate.removeprefix('W/') for candidate in candidates]
+
+
+class ResponseCacheMiddleware(BaseHTTPMiddleware):
+    """Conditional GET and LRU response cache for CACHED_PATHS"""
+    
+    async def dispatch(self, request: Request, call_next):
+        if request.method != 'GET' or request.url.path not in CACHED_PATHS:
+            return await call_next(request)
+        
+        # Read the version before the endpoint runs: if a write lands meanwhile
+        # the version moves on and this entry is never served again
+        etag = _etag(request, db.data_version())
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        
+        if _matches(request.headers.get('if-none-match', ''), etag):
+            _count('not_modified')
+            return Response(status_code=304, headers=headers)
+        
+        with _responses_lock:
+            cached = _responses.get(etag)
+            if cached is not None:
+                _responses.move_to_end(etag)
+                _stats['hits'] += 1
+        if cached is not None:
+            return Response(cached['body'], status_code=200, headers=headers, media_type=cached['media_type'])
+        
+        _count('misses')
+        response = await call_next(request)
+        if response.status_code != 200:
+            return response
+        
+        body = b''.join([chunk async for chunk in response.body_iterator])
+        media_type = response.headers.get('content-type')
+        with _responses_lock:
+            _responses[etag] = {'body': body, 'media_type': media_type}
+            if len(_responses) > RESPONSE_CACHE_SIZE:
+                _responses.popitem(last=False)
+        return Response(body, status_code=200, headers=headers, media_type=media_type)
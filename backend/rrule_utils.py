@@ -3,23 +3,63 @@ Recurring pattern utilities using rrule (iCalendar format)
 """
 from datetime import datetime, date, time, timedelta
 from dateutil.rrule import rrulestr
-from typing import List, Dict, Optional
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
+import threading
 from database import db
 import json
 
 
+# Recurring slots are generated this far ahead; a daily job moves the horizon on
+RECURRING_HORIZON_DAYS = 84
+
+# Parsed rules keyed by (rrule, dtstart), and expanded occurrence windows
+RRULE_CACHE_SIZE = 512
+RRULE_WINDOW_CACHE_SIZE = 2048
+
+# Task and project columns carried by virtual instances, as on /slots rows
+TASK_COLUMNS = ('title', 'priority', 'status', 'is_reschedulable', 'project_name', 'project_colour')
+
+_generated_until: Optional[date] = None
+_generate_lock = threading.RLock()
+
+
 class RecurrenceError(Exception):
     """Raised when recurrence operations fail"""
     pass
 
 
+@lru_cache(maxsize=RRULE_CACHE_SIZE)
+def compile_rrule(rrule_string: str, dtstart: datetime):
+    """
+    Parsed rule for an rrule string and dtstart, shared by every caller
+    Rules are never mutated after parsing, so one object serves all threads
+    """
+    return rrulestr(rrule_string, dtstart=dtstart)
+
+
+@lru_cache(maxsize=RRULE_WINDOW_CACHE_SIZE)
+def rrule_between(rrule_string: str, dtstart: datetime, after: datetime, before: datetime) -> Tuple[datetime, ...]:
+    """Occurrences from after to before (inclusive), memoized per window"""
+    return tuple(compile_rrule(rrule_string, dtstart).between(after, before, inc=True))
+
+
+def rrule_cache_stats() -> Dict:
+    """Hit/miss counters of the rule and occurrence-window caches"""
+    return {
+        name: {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+        for name, info in (('rules', compile_rrule.cache_info()), ('windows', rrule_between.cache_info()))
+    }
+
+
 def validate_rrule(rrule_string: str) -> Dict:
     """
     Validate and parse rrule string
     Returns dict with validation result and example date
     """
     try:
-        rule = rrulestr(rrule_string, dtstart=datetime.now())
+        # Anchored at today's midnight so repeated validation hits the cache
+        rule = compile_rrule(rrule_string, datetime.combine(date.today(), time.min))
         
         # Test it generates at least one occurrence
         occurrences = list(rule[:5])  # Get first 5
@@ -42,10 +82,23 @@ def validate_rrule(rrule_string: str) -> Dict:
         }
 
 
-def generate_recurring_slots(time_allocation_id: int, from_date: Optional[date] = None) -> List[Dict]:
+def recurring_horizon() -> date:
+    """Date recurring slots are generated through by default"""
+    horizon = date.today() + timedelta(days=RECURRING_HORIZON_DAYS)
+    if _generated_until is not None:
+        horizon = max(horizon, _generated_until)
+    return horizon
+
+
+def generate_recurring_slots(time_allocation_id: int, from_date: Optional[date] = None,
+                             until: Optional[date] = None) -> List[Dict]:
     """
-    Generate scheduled slots from a time allocation pattern
-    Respects existing overrides (manually edited instances)
+    Generate scheduled slots from a time allocation pattern, from from_date
+    through until (the rolling horizon by default) or the allocation's end date
+    
+    The occurrence set is computed in memory and diffed against the
+    allocation's existing slots and overrides (manually edited instances) from
+    one query; only missing slots are inserted, in one batch
     """
     allocation = db.execute_one(
         "SELECT * FROM time_allocations WHERE id = ?",
@@ -55,75 +108,321 @@ def generate_recurring_slots(time_allocation_id: int, from_date: Optional[date]
     if not allocation:
         raise RecurrenceError(f"Time allocation {time_allocation_id} not found")
     
+    # Virtual allocations are expanded on read (see virtual_instances)
+    if allocation['storage'] == 'virtual':
+        return []
+    
+    start_date = datetime.fromisoformat(allocation['start_date']).date()
     if from_date is None:
-        from_date = datetime.fromisoformat(allocation['start_date']).date()
+        from_date = start_date
     
-    # Parse rrule
+    # Parse rrule (anchored at the allocation start, so intervals keep their phase)
+    dtstart = datetime.combine(start_date, time(0, 0))
     try:
-        rule = rrulestr(
-            allocation['rrule'],
-            dtstart=datetime.combine(from_date, time(0, 0))
-        )
+        compile_rrule(allocation['rrule'], dtstart)
     except Exception as e:
         raise RecurrenceError(f"Invalid rrule: {str(e)}")
     
-    # Get existing overrides for this task
-    existing_overrides = db.execute("""
-        SELECT original_start FROM scheduled_slots
-        WHERE task_id = ? AND is_override = 1 AND original_start IS NOT NULL
-    """, (allocation['task_id'],))
-    
-    override_dates = {
-        datetime.fromisoformat(row['original_start'])
-        for row in existing_overrides
-    }
-    
     # Determine end date
+    end_date = until or recurring_horizon()
     if allocation['end_date']:
-        end_date = datetime.fromisoformat(allocation['end_date']).date()
-    else:
-        # Generate for next year if no end date
-        end_date = (datetime.now() + timedelta(days=365)).date()
+        end_date = min(end_date, datetime.fromisoformat(allocation['end_date']).date())
     
     # Parse time of day
     time_of_day = datetime.strptime(allocation['time_of_day'], "%H:%M").time()
     
-    # Generate occurrences
-    generated = []
-    for occurrence in rule:
-        if occurrence.date() > end_date:
-            break
-        
-        # Create datetime with specified time
-        slot_start = datetime.combine(occurrence.date(), time_of_day)
-        
-        # Skip if this instance has been manually overridden
-        if slot_start in override_dates:
-            continue
+    occurrences = rrule_between(
+        allocation['rrule'], dtstart, datetime.combine(from_date, time.min), datetime.combine(end_date, time.max)
+    ) if from_date <= end_date else ()
+    slot_starts = [datetime.combine(occurrence.date(), time_of_day) for occurrence in occurrences]
+    
+    # Live slots, overrides (moved instances) and deleted instances already in
+    # the window; rows from before allocation_id existed match on the task
+    taken = set()
+    if slot_starts:
+        range_start, range_end = slot_starts[0].isoformat(), slot_starts[-1].isoformat()
+        for row in db.execute("""
+            SELECT CASE WHEN is_override = 1 THEN original_start ELSE start_datetime END as start
+            FROM scheduled_slots
+            WHERE (allocation_id = ?
+                   OR (allocation_id IS NULL AND task_id = ? AND (source = 'allocation' OR is_override = 1)))
+            AND ((is_override = 0 AND start_datetime BETWEEN ? AND ?)
+                 OR (is_override = 1 AND original_start BETWEEN ? AND ?))
+            UNION ALL
+            SELECT original_start FROM recurring_exceptions
+            WHERE allocation_id = ? AND original_start BETWEEN ? AND ?
+        """, (time_allocation_id, allocation['task_id'], range_start, range_end, range_start, range_end,
+              time_allocation_id, range_start, range_end)):
+            taken.add(datetime.fromisoformat(row['start']))
+    
+    duration = timedelta(hours=allocation['duration_hours'])
+    new_slots = [
+        {
+            'task_id': allocation['task_id'],
+            'start_datetime': slot_start.isoformat(),
+            'end_datetime': (slot_start + duration).isoformat(),
+            'source': 'allocation',
+            'is_override': 0,
+            'allocation_id': time_allocation_id
+        }
+        for slot_start in slot_starts
+        if slot_start not in taken
+    ]
+    
+    with db.transaction():
+        slot_ids = db.insert_many('scheduled_slots', new_slots)
+        if not allocation['generated_until'] or allocation['generated_until'] < end_date.isoformat():
+            db.update('time_allocations', {'generated_until': end_date.isoformat()},
+                      'id = ?', (time_allocation_id,))
+    generated = [{**slot_data, 'id': slot_id} for slot_data, slot_id in zip(new_slots, slot_ids)]
+    
+    return generated
+
+
+def ensure_recurring_slots(until: date) -> int:
+    """
+    Make sure every time allocation is generated through until (and the rolling
+    horizon); each allocation continues after its generated_until
+    Returns number of slots added
+    """
+    if _generated_until is not None and until <= _generated_until:
+        return 0
+    
+    with _generate_lock:
+        if _generated_until is not None and until <= _generated_until:
+            return 0
         
-        slot_end = slot_start + timedelta(hours=allocation['duration_hours'])
+        target = max(until, date.today() + timedelta(days=RECURRING_HORIZON_DAYS))
+        allocations = db.execute("""
+            SELECT id, generated_until FROM time_allocations
+            WHERE storage = 'materialized'
+            AND (generated_until IS NULL
+                 OR (generated_until < ? AND (end_date IS NULL OR generated_until < end_date)))
+        """, (target.isoformat(),))
         
-        # Check if already exists
-        exists = db.execute_one("""
-            SELECT id FROM scheduled_slots
-            WHERE task_id = ?
-            AND start_datetime = ?
-            AND is_override = 0
-        """, (allocation['task_id'], slot_start.isoformat()))
+        added = 0
+        for allocation in allocations:
+            from_date = None
+            if allocation['generated_until']:
+                from_date = date.fromisoformat(allocation['generated_until']) + timedelta(days=1)
+            try:
+                added += len(generate_recurring_slots(allocation['id'], from_date=from_date, until=target))
+            except RecurrenceError:
+                # A stored rule that no longer parses generates nothing further
+                continue
         
-        if not exists:
-            slot_data = {
+        # Inside a transaction the rows only count once it commits
+        db.after_commit(lambda: _advance_generated_until(target))
+        return added
+
+
+def _advance_generated_until(target: date):
+    global _generated_until
+    with _generate_lock:
+        if _generated_until is None or _generated_until < target:
+            _generated_until = target
+
+
+def _instance_starts(allocation: Dict, range_start: datetime, range_end: datetime) -> List[datetime]:
+    """Start times of an allocation's instances overlapping [range_start, range_end)"""
+    start_date = datetime.fromisoformat(allocation['start_date']).date()
+    dtstart = datetime.combine(start_date, time(0, 0))
+    time_of_day = datetime.strptime(allocation['time_of_day'], "%H:%M").time()
+    duration = timedelta(hours=allocation['duration_hours'])
+    
+    last_date = range_end.date()
+    if allocation['end_date']:
+        last_date = min(last_date, datetime.fromisoformat(allocation['end_date']).date())
+    
+    # An instance starting the day before can still run into the range
+    starts = []
+    for occurrence in rrule_between(allocation['rrule'], dtstart,
+                                    datetime.combine(range_start.date() - timedelta(days=1), time.min),
+                                    datetime.combine(last_date, time.max)):
+        instance_start = datetime.combine(occurrence.date(), time_of_day)
+        if instance_start < range_end and instance_start + duration > range_start:
+            starts.append(instance_start)
+    return starts
+
+
+def _stored_until(allocation: Dict) -> Optional[date]:
+    """Last date an allocation's instances are stored as slot rows (None: no rows)"""
+    if allocation['storage'] == 'virtual' or not allocation['generated_until']:
+        return None
+    return date.fromisoformat(allocation['generated_until'])
+
+
+def virtual_instances(range_start: datetime, range_end: datetime) -> List[Dict]:
+    """
+    Instances without slot rows overlapping [range_start, range_end), by start:
+    every instance of a virtual allocation, and those of materialized ones past
+    their generated_until (reads beyond the rolling horizon never store rows)
+    
+    Expanded from the rules on every read; deleted and detached instances (the
+    latter are real slot rows) are skipped using one exceptions query. Rows are
+    shaped like scheduled_slots rows with id None, plus allocation_id and virtual.
+    """
+    allocations = db.execute("""
+        SELECT a.*, t.title, t.priority, t.status, t.is_reschedulable,
+               p.name as project_name, p.colour as project_colour
+        FROM time_allocations a
+        JOIN tasks t ON a.task_id = t.id
+        LEFT JOIN projects p ON t.project_id = p.id
+        WHERE (a.storage = 'virtual' OR a.generated_until IS NULL OR a.generated_until < ?)
+        AND a.start_date <= ?
+        AND (a.end_date IS NULL OR a.end_date >= ?)
+    """, (range_end.date().isoformat(), range_end.date().isoformat(),
+          (range_start.date() - timedelta(days=1)).isoformat()))
+    if not allocations:
+        return []
+    
+    exceptions = {
+        (row['allocation_id'], row['original_start'])
+        for row in db.execute(f"""
+            SELECT allocation_id, original_start FROM recurring_exceptions
+            WHERE allocation_id IN ({','.join('?' * len(allocations))})
+            AND original_start >= ? AND original_start < ?
+        """, (*[allocation['id'] for allocation in allocations],
+              (range_start - timedelta(days=1)).isoformat(), range_end.isoformat()))
+    }
+    
+    instances = []
+    for allocation in allocations:
+        try:
+            starts = _instance_starts(allocation, range_start, range_end)
+        except Exception:
+            # A stored rule that no longer parses has no instances
+            continue
+        duration = timedelta(hours=allocation['duration_hours'])
+        stored_until = _stored_until(allocation)
+        for instance_start in starts:
+            if (allocation['id'], instance_start.isoformat()) in exceptions:
+                continue
+            if stored_until and instance_start.date() <= stored_until:
+                continue
+            instances.append({
+                'id': None,
                 'task_id': allocation['task_id'],
-                'start_datetime': slot_start.isoformat(),
-                'end_datetime': slot_end.isoformat(),
+                'allocation_id': allocation['id'],
+                'start_datetime': instance_start.isoformat(),
+                'end_datetime': (instance_start + duration).isoformat(),
                 'source': 'allocation',
-                'is_override': 0
-            }
-            
-            slot_id = db.insert('scheduled_slots', slot_data)
-            generated.append({**slot_data, 'id': slot_id})
+                'is_override': 0,
+                'original_start': instance_start.isoformat(),
+                'is_fixed': 0,
+                'completed': 0,
+                'virtual': True,
+                **{key: allocation[key] for key in TASK_COLUMNS}
+            })
+    instances.sort(key=lambda instance: instance['start_datetime'])
+    return instances
+
+
+def _virtual_instance(allocation_id: int, original_start: datetime) -> Dict:
+    """The allocation and end time of one instance without a slot row"""
+    allocation = db.execute_one("SELECT * FROM time_allocations WHERE id = ?", (allocation_id,))
+    if not allocation:
+        raise RecurrenceError(f"Time allocation {allocation_id} not found")
+    original_start = original_start.replace(tzinfo=None)
+    stored_until = _stored_until(allocation)
+    if stored_until and original_start.date() <= stored_until:
+        raise RecurrenceError("Instance is stored as a slot row; edit it through the slot endpoints")
     
-    return generated
+    try:
+        starts = _instance_starts(allocation, original_start, original_start + timedelta(seconds=1))
+    except Exception as e:
+        raise RecurrenceError(f"Invalid rrule: {str(e)}")
+    if original_start not in starts:
+        raise RecurrenceError(f"No instance of allocation {allocation_id} starts at {original_start.isoformat()}")
+    
+    exception = db.execute_one("""
+        SELECT * FROM recurring_exceptions WHERE allocation_id = ? AND original_start = ?
+    """, (allocation_id, original_start.isoformat()))
+    if exception:
+        raise RecurrenceError(f"Instance at {original_start.isoformat()} is already {exception['kind']}")
+    
+    return {
+        'allocation': allocation,
+        'start': original_start,
+        'end': original_start + timedelta(hours=allocation['duration_hours'])
+    }
+
+
+def detach_virtual_instance(allocation_id: int, original_start: datetime) -> Dict:
+    """
+    Store one virtual instance as a real slot row, so it can be moved, resized
+    or completed like any other slot; the pattern skips it from then on
+    """
+    instance = _virtual_instance(allocation_id, original_start)
+    slot_data = {
+        'task_id': instance['allocation']['task_id'],
+        'start_datetime': instance['start'].isoformat(),
+        'end_datetime': instance['end'].isoformat(),
+        'source': 'allocation',
+        'is_override': 1,
+        'original_start': instance['start'].isoformat(),
+        'allocation_id': allocation_id
+    }
+    with db.transaction():
+        slot_id = db.insert('scheduled_slots', slot_data)
+        db.insert('recurring_exceptions', {
+            'allocation_id': allocation_id,
+            'original_start': instance['start'].isoformat(),
+            'original_end': instance['end'].isoformat(),
+            'kind': 'detached',
+            'slot_id': slot_id
+        })
+    return {**slot_data, 'id': slot_id}
+
+
+def delete_virtual_instance(allocation_id: int, original_start: datetime):
+    """Delete one virtual instance (recorded as an exception; the pattern continues)"""
+    instance = _virtual_instance(allocation_id, original_start)
+    db.insert('recurring_exceptions', {
+        'allocation_id': allocation_id,
+        'original_start': instance['start'].isoformat(),
+        'original_end': instance['end'].isoformat(),
+        'kind': 'deleted'
+    })
+
+
+def allocation_for_slot(slot: Dict) -> Optional[Dict]:
+    """
+    The time allocation a slot row is an instance of: its allocation_id, or for
+    rows without one, the task's latest allocation starting on or before it
+    """
+    if slot.get('allocation_id'):
+        return db.execute_one("SELECT * FROM time_allocations WHERE id = ?", (slot['allocation_id'],))
+    return db.execute_one("""
+        SELECT * FROM time_allocations
+        WHERE task_id = ? AND start_date <= ?
+        ORDER BY start_date DESC LIMIT 1
+    """, (slot['task_id'], (slot['original_start'] or slot['start_datetime'])[:10]))
+
+
+def record_deleted_instance(slot: Dict) -> bool:
+    """
+    Record a deleted slot row of a recurring allocation as a deleted instance,
+    so the pattern doesn't bring it back; returns False if the slot isn't one
+    """
+    original_start = slot['original_start'] or slot['start_datetime']
+    allocation = allocation_for_slot(slot)
+    if not allocation:
+        return False
+    
+    # A detached instance's exception is replaced
+    with db.transaction():
+        db.delete('recurring_exceptions', 'allocation_id = ? AND original_start = ?',
+                  (allocation['id'], original_start))
+        db.insert('recurring_exceptions', {
+            'allocation_id': allocation['id'],
+            'original_start': original_start,
+            'original_end': (
+                datetime.fromisoformat(original_start) + timedelta(hours=allocation['duration_hours'])
+            ).isoformat(),
+            'kind': 'deleted'
+        })
+    return True
 
 
 def edit_recurring_instance(slot_id: int, mode: str, 
@@ -143,9 +442,7 @@ def edit_recurring_instance(slot_id: int, mode: str,
         raise RecurrenceError("Can only edit recurring allocation instances")
     
     # Get the time allocation
-    allocation = db.execute_one("""
-        SELECT * FROM time_allocations WHERE task_id = ?
-    """, (slot['task_id'],))
+    allocation = allocation_for_slot(slot)
     
     if not allocation:
         raise RecurrenceError("Time allocation not found")
@@ -180,19 +477,42 @@ def edit_recurring_instance(slot_id: int, mode: str,
         }
     
     elif mode == 'this_and_future':
-        # Split into old task (ends yesterday) + new task (starts today)
-        original_task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (slot['task_id'],))
-        split_date = datetime.fromisoformat(slot['start_datetime']).date()
-        
+        return split_recurring_allocation(slot, allocation, new_rrule, new_duration, new_time)
+    
+    else:
+        raise RecurrenceError(f"Invalid mode: {mode}")
+
+
+def split_recurring_allocation(slot: Dict, allocation: Dict, new_rrule: str = None,
+                               new_duration: float = None, new_time: str = None) -> Dict:
+    """
+    Split an allocation at a slot's date: the old task and allocation end the
+    day before, a cloned task gets a new allocation (with the edits) from then on
+    
+    Runs as one transaction. Future pattern slots are removed in one delete and
+    the new pattern is generated in one batch; future manual overrides and
+    deleted instances move to the new allocation, matched to its instances by
+    date (their original_start takes the new time of day), so they survive the
+    split without the pattern regenerating them.
+    Returns the slot diff (removed ids, added rows, reassigned rows) so clients
+    can patch their calendar instead of refetching it.
+    """
+    original_task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (slot['task_id'],))
+    split_date = datetime.fromisoformat(slot['original_start'] or slot['start_datetime']).date()
+    split_start = datetime.combine(split_date, time.min).isoformat()
+    
+    with db.transaction():
         # End the current time allocation
-        db.update('time_allocations', {
-            'end_date': (split_date - timedelta(days=1)).isoformat()
-        }, 'id = ?', (allocation['id'],))
+        ended_allocation = {**allocation, 'end_date': (split_date - timedelta(days=1)).isoformat()}
+        db.update('time_allocations', {'end_date': ended_allocation['end_date']}, 'id = ?', (allocation['id'],))
         
-        # Delete future slots from old allocation
-        db.delete('scheduled_slots', 
-                 'task_id = ? AND start_datetime >= ? AND is_override = 0',
-                 (slot['task_id'], slot['start_datetime']))
+        # Delete future pattern slots from the old allocation
+        removed = db.execute("""
+            SELECT id FROM scheduled_slots
+            WHERE allocation_id = ? AND is_override = 0 AND start_datetime >= ?
+        """, (allocation['id'], split_start))
+        db.delete('scheduled_slots', 'allocation_id = ? AND is_override = 0 AND start_datetime >= ?',
+                  (allocation['id'], split_start))
         
         # Create new task with new pattern
         new_task_data = {
@@ -220,11 +540,43 @@ def edit_recurring_instance(slot_id: int, mode: str,
             'duration_hours': new_duration or allocation['duration_hours'],
             'time_of_day': new_time or allocation['time_of_day'],
             'start_date': split_date.isoformat(),
-            'end_date': allocation['end_date']
+            'end_date': allocation['end_date'],
+            'storage': allocation['storage']
         }
         
         new_allocation_id = db.insert('time_allocations', new_allocation_data)
         
+        # Future overrides (moved, edited or detached instances) and deleted
+        # instances now stand in for the new allocation's instance on their date
+        time_of_day = datetime.strptime(new_allocation_data['time_of_day'], "%H:%M").time()
+        duration = timedelta(hours=new_allocation_data['duration_hours'])
+        
+        def instance_start(original_start: str) -> datetime:
+            return datetime.combine(date.fromisoformat(original_start[:10]), time_of_day)
+        
+        reassigned = db.execute("""
+            SELECT id, original_start FROM scheduled_slots
+            WHERE allocation_id = ? AND is_override = 1 AND original_start >= ?
+        """, (allocation['id'], split_start))
+        for row in reassigned:
+            row['original_start'] = instance_start(row['original_start']).isoformat()
+            db.update('scheduled_slots', {
+                'task_id': new_task_id,
+                'allocation_id': new_allocation_id,
+                'original_start': row['original_start']
+            }, 'id = ?', (row['id'],))
+        
+        for row in db.execute("""
+            SELECT id, original_start FROM recurring_exceptions
+            WHERE allocation_id = ? AND original_start >= ?
+        """, (allocation['id'], split_start)):
+            start = instance_start(row['original_start'])
+            db.update('recurring_exceptions', {
+                'allocation_id': new_allocation_id,
+                'original_start': start.isoformat(),
+                'original_end': (start + duration).isoformat()
+            }, 'id = ?', (row['id'],))
+        
         # Generate new slots
         generated = generate_recurring_slots(new_allocation_id, from_date=split_date)
         
@@ -236,53 +588,59 @@ def edit_recurring_instance(slot_id: int, mode: str,
             'new_data': json.dumps({
                 'new_task_id': new_task_id,
                 'split_date': split_date.isoformat(),
-                'generated_slots': len(generated)
+                'generated_slots': len(generated),
+                'removed_slots': len(removed),
+                'reassigned_slots': len(reassigned)
             })
         })
-        
-        return {
-            "mode": "split_task",
-            "original_task_id": slot['task_id'],
-            "new_task_id": new_task_id,
-            "new_allocation_id": new_allocation_id,
-            "split_date": split_date.isoformat(),
-            "generated_slots": len(generated)
-        }
     
-    else:
-        raise RecurrenceError(f"Invalid mode: {mode}")
+    return {
+        "mode": "split_task",
+        "original_task_id": slot['task_id'],
+        "original_allocation_id": allocation['id'],
+        "new_task_id": new_task_id,
+        "new_allocation_id": new_allocation_id,
+        "split_date": split_date.isoformat(),
+        "generated_slots": len(generated),
+        "diff": {
+            "removed_slot_ids": [row['id'] for row in removed],
+            "added_slots": generated,
+            "reassigned_slots": [
+                {'id': row['id'], 'task_id': new_task_id, 'allocation_id': new_allocation_id,
+                 'original_start': row['original_start']}
+                for row in reassigned
+            ],
+            "allocations": {
+                "ended": ended_allocation,
+                "created": {**new_allocation_data, 'id': new_allocation_id}
+            }
+        }
+    }
 
 
 def delete_recurring_instance(slot_id: int) -> Dict:
     """
     Delete a single instance of a recurring pattern
-    Marks as override so it doesn't regenerate
+    Recorded as a deleted instance so it doesn't regenerate
     """
     slot = db.execute_one("SELECT * FROM scheduled_slots WHERE id = ?", (slot_id,))
     if not slot:
         raise RecurrenceError(f"Slot {slot_id} not found")
     
-    if slot['source'] == 'allocation':
-        # Mark as deleted override
-        db.update('scheduled_slots', {
-            'is_override': 1,
-            'start_datetime': None,
-            'end_datetime': None,
-            'original_start': slot['start_datetime']
-        }, 'id = ?', (slot_id,))
-        
-        return {
-            "deleted": False,
-            "marked_as_override": True,
-            "message": "Instance hidden, pattern continues"
-        }
-    else:
-        # Actually delete non-recurring slots
+    with db.transaction():
         db.delete('scheduled_slots', 'id = ?', (slot_id,))
+        recurring = (slot['source'] == 'allocation' or slot['original_start']) and record_deleted_instance(slot)
+    
+    if recurring:
         return {
             "deleted": True,
-            "message": "Slot deleted"
+            "marked_as_override": True,
+            "message": "Instance removed, pattern continues"
         }
+    return {
+        "deleted": True,
+        "message": "Slot deleted"
+    }
 
 
 def regenerate_all_recurring_slots(task_id: int) -> Dict:
@@ -0,0 +1,122 @@
+"""
+Scenario worker - plans one what-if scenario against a schedule snapshot
+
+Runs in the scenario process pool (scenarios.py). Imports only the in-memory
+planners, so starting a worker never opens the database or runs migrations.
+"""
+from datetime import datetime, time, timedelta
+from multiprocessing.connection import Connection
+from time import perf_counter
+from typing import Dict
+from busy_index import BusyIndex
+from planning import get_task_window, generate_available_slots, plan_tasks_greedy
+from solver import solve_schedule
+
+
+def scenario_calendar(calendar_settings: Dict, scenario: Dict) -> Dict:
+    """Baseline calendar with the scenario's overrides and time off applied"""
+    settings = dict(calendar_settings)
+    for key in ('work_schedule', 'custom_days', 'work_start_time', 'work_end_time'):
+        if scenario.get(key) is not None:
+            settings[key] = scenario[key]
+    
+    # Time off is kept as ranges; the work calendar skips each in one step
+    settings['excluded_ranges'] = list(settings.get('excluded_ranges') or []) + [
+        {'start_date': time_off['start_date'].isoformat(), 'end_date': time_off['end_date'].isoformat()}
+        for time_off in scenario.get('time_off', [])
+    ]
+    return settings
+
+
+def evaluate_scenario(snapshot: Dict, scenario: Dict, strategy: str = 'greedy') -> Dict:
+    """
+    Plan one scenario against the snapshot (runs in a worker process)
+    Returns completion dates and infeasible tasks for the scenario
+    """
+    started = perf_counter()
+    calendar_settings = scenario_calendar(snapshot['calendar_settings'], scenario)
+    
+    # Added tasks get negative ids so they cannot collide with real ones
+    tasks = list(snapshot['tasks'])
+    for position, added in enumerate(scenario.get('add_tasks', []), start=1):
+        tasks.append({
+            **added,
+            'id': -position,
+            'start_date': added['start_date'].isoformat() if added.get('start_date') else None,
+            'deadline': added['deadline'].isoformat() if added.get('deadline') else None
+        })
+    
+    result = {
+        'name': scenario['name'],
+        'completion_dates': {},
+        'infeasible': [],
+        'hours_planned': 0,
+        'last_completion': None
+    }
+    
+    if tasks:
+        # The snapshot holds nothing before today, so nothing is planned there
+        windows = {}
+        for task in tasks:
+            start_date, end_date = get_task_window(task)
+            windows[task['id']] = (max(start_date, snapshot['today']), end_date)
+        horizon_end = max(end for _, end in windows.values())
+        
+        available_slots = generate_available_slots(snapshot['today'], horizon_end, calendar_settings)
+        busy = BusyIndex.from_intervals(
+            datetime.combine(snapshot['today'], time.min),
+            datetime.combine(horizon_end + timedelta(days=1), time.min),
+            snapshot['busy']
+        )
+        
+        planner = solve_schedule if strategy == 'solver' else plan_tasks_greedy
+        plan = planner(tasks, windows, available_slots, busy)
+        
+        completion = {}
+        planned_hours = {}
+        for session in plan['sessions']:
+            task_id, end = session['task_id'], session['end_datetime']
+            completion[task_id] = max(completion.get(task_id, end), end)
+            planned_hours[task_id] = planned_hours.get(task_id, 0) + (
+                datetime.fromisoformat(end) - datetime.fromisoformat(session['start_datetime'])
+            ).total_seconds() / 3600
+        
+        complete_ids = {entry['task_id'] for entry in plan['scheduled']}
+        for task in tasks:
+            if task['id'] in complete_ids:
+                if task['id'] in completion:
+                    result['completion_dates'][task['id']] = completion[task['id']][:10]
+            else:
+                result['infeasible'].append({
+                    'task_id': task['id'],
+                    'title': task['title'],
+                    'deadline': task['deadline'],
+                    'required_hours': task['estimated_hours'],
+                    'shortfall_hours': round(task['estimated_hours'] - planned_hours.get(task['id'], 0), 2)
+                })
+        
+        result['hours_planned'] = round(sum(planned_hours.values()), 2)
+        result['last_completion'] = max(result['completion_dates'].values(), default=None)
+    
+    result['summary'] = (
+        f"{len(result['completion_dates'])} tasks complete, {len(result['infeasible'])} infeasible"
+    )
+    result['elapsed_ms'] = round((perf_counter() - started) * 1000, 2)
+    return result
+
+
+def serve(connection: Connection):
+    """
+    Worker process loop: run each (function, args) received on the connection
+    and send back ('ok', result) or ('error', message), until the pool closes it
+    """
+    while True:
+        try:
+            function, args = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            reply = ('ok', function(*args))
+        except Exception as e:
+            reply = ('error', str(e))
+        connection.send(reply)
@@ -0,0 +1,240 @@
+"""
+What-if scenario planning - evaluate several schedule variants in parallel
+
+The current schedule is read once into a plain snapshot; each scenario is then
+planned in a worker process (scenario_worker.py) against its own in-memory busy
+index, so scenarios never touch the live database and do not block each other.
+One pool is started with the app and shared by all requests.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, time, timedelta
+from time import perf_counter
+from typing import List, Dict, Optional, Callable
+from database import db
+from busy_index import BusyInterval, parse_stored_datetime
+from block_occurrences import blocked_occurrences, BLOCK_HORIZON_DAYS
+from rrule_utils import virtual_instances
+from scheduling import get_calendar_settings, get_task_window, SCHEDULING_STRATEGIES, SchedulingError
+from scenario_worker import evaluate_scenario, serve
+
+
+MAX_SCENARIO_WORKERS = 4
+
+_pool: Optional['ScenarioPool'] = None
+_pool_lock = threading.Lock()
+
+
+class ScenarioWorker:
+    """One worker process, running one call at a time sent over a pipe"""
+    
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+    
+    def terminate(self):
+        self.connection.close()
+        self.process.terminate()
+        self.process.join()
+
+
+class ScenarioPool:
+    """
+    Worker processes shared by all requests
+    
+    Each call gets a worker to itself, and its timeout starts once it has one;
+    a call that overruns has just its own worker killed and replaced, so the
+    scenarios other requests are running carry on.
+    """
+    
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle: List[ScenarioWorker] = []
+        self._workers = set()
+        self._closed = False
+    
+    def _checkout(self) -> ScenarioWorker:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scenario pool is shut down")
+            if self._idle:
+                return self._idle.pop()
+            worker = ScenarioWorker(self._context)
+            self._workers.add(worker)
+            return worker
+    
+    def _checkin(self, worker: ScenarioWorker, healthy: bool):
+        with self._lock:
+            if healthy and not self._closed:
+                self._idle.append(worker)
+                return
+            self._workers.discard(worker)
+        worker.terminate()
+    
+    def run(self, function: Callable, args: tuple, timeout: float):
+        """
+        Run function(*args) in a worker, waiting for a free one first
+        Raises TimeoutError if it runs longer than timeout seconds
+        """
+        with self._slots:
+            worker = self._checkout()
+            healthy = False
+            try:
+                worker.connection.send((function, args))
+                if not worker.connection.poll(timeout):
+                    raise TimeoutError(f"Timed out after {timeout}s")
+                status, value = worker.connection.recv()
+                healthy = True
+            except TimeoutError:
+                raise
+            except (EOFError, OSError):
+                raise RuntimeError("Scenario worker stopped unexpectedly")
+            finally:
+                self._checkin(worker, healthy)
+        if status == 'error':
+            raise RuntimeError(value)
+        return value
+    
+    def shutdown(self):
+        """Stop every worker, including ones still running a call"""
+        with self._lock:
+            self._closed = True
+            workers, self._workers, self._idle = list(self._workers), set(), []
+        for worker in workers:
+            worker.terminate()
+
+
+def start_scenario_pool() -> ScenarioPool:
+    """Start the shared worker pool (at app startup; on first use otherwise)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ScenarioPool(min(MAX_SCENARIO_WORKERS, os.cpu_count() or 1))
+        return _pool
+
+
+def shutdown_scenario_pool():
+    """Stop the shared worker pool (at app shutdown)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+def take_snapshot() -> Dict:
+    """
+    Read everything scenario planning needs in one go
+    
+    Movable work (reschedulable, unfinished tasks without a time allocation)
+    is taken off the calendar and re-planned in every scenario; its completed
+    and fixed sessions count towards the estimate. Everything else that is
+    incomplete, plus blocked times, stays put as busy time.
+    """
+    today = date.today()
+    snapshot_start = datetime.combine(today, time.min)
+    
+    tasks = db.execute("""
+        SELECT t.*,
+               COALESCE(SUM(CASE WHEN s.completed = 1 OR s.is_fixed = 1
+                   THEN (julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 END), 0) as locked_hours
+        FROM tasks t
+        LEFT JOIN scheduled_slots s ON s.task_id = t.id
+        WHERE t.has_time_allocation = 0
+        AND t.is_reschedulable = 1
+        AND t.status != 'completed'
+        AND t.archived = 0
+        GROUP BY t.id
+        ORDER BY t.deadline ASC, t.priority DESC
+    """)
+    for task in tasks:
+        task['estimated_hours'] = max(round(task['estimated_hours'] - task.pop('locked_hours'), 2), 0)
+    
+    movable_ids = [task['id'] for task in tasks]
+    slots = db.execute(f"""
+        SELECT s.id, s.task_id, t.title, s.start_datetime, s.end_datetime
+        FROM scheduled_slots s
+        JOIN tasks t ON s.task_id = t.id
+        WHERE s.completed = 0
+        AND s.end_datetime > ?
+        AND (s.is_fixed = 1 OR s.task_id NOT IN ({','.join('?' * len(movable_ids))}))
+    """, (snapshot_start.isoformat(), *movable_ids))
+    
+    # Blocked-time occurrences out to the furthest task window (at least the
+    # block horizon, so scenarios adding later tasks still see them)
+    blocks_end = max(
+        [today + timedelta(days=BLOCK_HORIZON_DAYS)] + [get_task_window(task)[1] for task in tasks]
+    )
+    snapshot_end = datetime.combine(blocks_end + timedelta(days=1), time.min)
+    blocks = blocked_occurrences(snapshot_start, snapshot_end)
+    slots += virtual_instances(snapshot_start, snapshot_end)
+    
+    busy = [
+        BusyInterval(parse_stored_datetime(row['start_datetime']), parse_stored_datetime(row['end_datetime']),
+                     'slot', row['id'], row['task_id'], row['title'])
+        for row in slots
+    ] + [
+        BusyInterval(parse_stored_datetime(row['start_datetime']), parse_stored_datetime(row['end_datetime']),
+                     'block', row['id'], title=row['title'])
+        for row in blocks
+    ]
+    
+    return {
+        'today': today,
+        'calendar_settings': get_calendar_settings(),
+        'tasks': tasks,
+        'busy': busy
+    }
+
+
+def run_scenarios(scenarios: List[Dict], strategy: str = 'greedy',
+                  timeout_seconds: float = 10.0) -> Dict:
+    """
+    Snapshot the schedule once and evaluate every scenario in the worker pool
+    A scenario that runs longer than timeout_seconds (counted from when a
+    worker picks it up) is reported as timed out and its worker killed; the
+    others are unaffected
+    """
+    if strategy not in SCHEDULING_STRATEGIES:
+        raise SchedulingError(f"Unknown scheduling strategy '{strategy}'")
+    
+    started = perf_counter()
+    snapshot = take_snapshot()
+    snapshot_ms = round((perf_counter() - started) * 1000, 2)
+    
+    # The baseline is always evaluated alongside the requested scenarios
+    scenarios = [{'name': 'baseline'}] + list(scenarios)
+    
+    results = []
+    pool = start_scenario_pool()
+    with ThreadPoolExecutor(max_workers=min(pool.size, len(scenarios))) as dispatch:
+        futures = [
+            dispatch.submit(pool.run, evaluate_scenario, (snapshot, scenario, strategy), timeout_seconds)
+            for scenario in scenarios
+        ]
+        for scenario, future in zip(scenarios, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({
+                    'name': scenario['name'],
+                    'error': str(e)
+                })
+    
+    return {
+        'strategy': strategy,
+        'snapshot': {
+            'tasks': len(snapshot['tasks']),
+            'busy_intervals': len(snapshot['busy']),
+            'snapshot_ms': snapshot_ms
+        },
+        'scenarios': results,
+        'elapsed_ms': round((perf_counter() - started) * 1000, 2)
+    }
@@ -2,18 +2,31 @@
 Scheduling algorithms - the brain of the task manager
 """
 from datetime import datetime, date, time, timedelta
-from typing import List, Dict, Tuple, Optional, Any
-from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Any, Iterable
+from dataclasses import dataclass, asdict
+from contextlib import nullcontext
+import heapq
+from math import gcd
+from time import perf_counter
 from database import db
+from busy_index import BusyIndex, parse_stored_datetime, stored_duration_hours
+from planning import (
+    MAX_SESSION_HOURS, get_task_window, generate_available_slots, iter_available_slots,
+    create_task_sessions, plan_tasks_greedy
+)
+from block_occurrences import blocked_occurrences, ensure_block_occurrences
+from rrule_utils import virtual_instances, record_deleted_instance, recurring_horizon
+from availability_grid import AvailabilityGrid, grid_engine_available
+from work_calendar import get_work_calendar
 import json
 
 
 # Constants
-MAX_SESSION_HOURS = 4
-WORK_SCHEDULES = {
-    'weekdays': 'MO,TU,WE,TH,FR',
-    'all_week': 'MO,TU,WE,TH,FR,SA,SU',
-}
+# 'interval' answers availability from sorted busy intervals; 'grid' from a
+# NumPy quantum grid (optional dependency)
+AVAILABILITY_ENGINES = ('interval', 'grid')
+# 'greedy' places tasks one by one; 'solver' plans them all at once (solver.py)
+SCHEDULING_STRATEGIES = ('greedy', 'solver')
 
 
 class SchedulingError(Exception):
@@ -35,27 +48,55 @@ class BumpCandidate:
 
 
 def get_calendar_settings():
-    """Get calendar settings with parsed excluded dates"""
-    settings = db.execute_one("SELECT * FROM calendar_settings WHERE id = 1")
-    if settings:
-        settings['excluded_dates'] = json.loads(settings.get('excluded_dates', '[]'))
-    return settings
+    """
+    Get calendar settings with parsed excluded dates and ranges
+    Served from the work calendar cache; treat the dict as read-only
+    """
+    return get_work_calendar().settings
 
 
-def get_work_days(calendar_settings):
-    """Get list of work day codes (MO, TU, etc.)"""
-    if calendar_settings['work_schedule'] == 'custom':
-        return calendar_settings['custom_days'].split(',')
-    return WORK_SCHEDULES.get(calendar_settings['work_schedule'], 'MO,TU,WE,TH,FR').split(',')
+def build_availability(task: Dict, start_date: date, end_date: date,
+                       calendar_settings: Dict, engine: str = 'interval',
+                       busy: BusyIndex = None):
+    """
+    Availability structure for a task's window using the chosen engine
+    Returns a BusyIndex or an AvailabilityGrid; both work as create_task_sessions' busy
+    """
+    if engine not in AVAILABILITY_ENGINES:
+        raise SchedulingError(f"Unknown availability engine '{engine}'")
+    
+    if busy is None or not busy.covers_dates(start_date, end_date):
+        busy = BusyIndex.for_dates(start_date, end_date)
+    
+    if engine == 'grid':
+        if not grid_engine_available():
+            raise SchedulingError("The grid availability engine requires numpy")
+        return AvailabilityGrid.from_busy_index(busy, start_date, end_date, calendar_settings,
+                                                exclude_task_id=task.get('id'))
+    return busy
 
 
 def has_conflict(start_datetime: datetime, end_datetime: datetime, 
-                exclude_task_id: int = None, exclude_slot_id: int = None) -> Dict:
+                exclude_task_id: int = None, exclude_slot_id: int = None,
+                busy: BusyIndex = None) -> Dict:
     """
     Check if time slot conflicts with existing slots or blocked times
+    Answers from the busy index when one covering the range is given
     Returns dict with conflict info
     """
-    # Check scheduled slots
+    if busy is not None and busy.covers(start_datetime, end_datetime):
+        overlapping = busy.overlapping(start_datetime, end_datetime,
+                                       exclude_task_id=exclude_task_id,
+                                       exclude_slot_id=exclude_slot_id)
+        if overlapping:
+            return {
+                "has_conflict": True,
+                "slot_conflicts": [e.as_conflict() for e in overlapping if e.kind == 'slot'],
+                "block_conflicts": [e.as_conflict() for e in overlapping if e.kind == 'block']
+            }
+        return {"has_conflict": False}
+    
+    # Check scheduled slots (and recurring instances without slot rows)
     query = """
         SELECT s.id, t.title, s.start_datetime, s.end_datetime
         FROM scheduled_slots s
@@ -75,18 +116,16 @@ def has_conflict(start_datetime: datetime, end_datetime: datetime,
     query += """
         AND s.completed = 0
         AND NOT (s.end_datetime <= ? OR s.start_datetime >= ?)
-        AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
     """
     params.extend([start_datetime.isoformat(), end_datetime.isoformat()])
     
-    slot_conflicts = db.execute(query, tuple(params))
+    slot_conflicts = db.execute(query, tuple(params)) + [
+        instance for instance in virtual_instances(start_datetime, end_datetime)
+        if instance['task_id'] != exclude_task_id
+    ]
     
-    # Check blocked times
-    block_conflicts = db.execute("""
-        SELECT id, title, start_datetime, end_datetime
-        FROM blocked_times
-        WHERE NOT (end_datetime <= ? OR start_datetime >= ?)
-    """, (start_datetime.isoformat(), end_datetime.isoformat()))
+    # Check blocked times (every occurrence of recurring ones)
+    block_conflicts = blocked_occurrences(start_datetime, end_datetime)
     
     if slot_conflicts or block_conflicts:
         return {
@@ -98,141 +137,342 @@ def has_conflict(start_datetime: datetime, end_datetime: datetime,
     return {"has_conflict": False}
 
 
-def get_available_time_in_slot(slot_start: datetime, slot_end: datetime, 
-                               exclude_task_id: int = None) -> List[Tuple[datetime, datetime]]:
-    """
-    Given a time range, return all available sub-ranges accounting for conflicts
-    Returns list of (start, end) tuples
+def has_conflicts_batch(intervals: List[Tuple], exclude_slot_ids: Iterable[int] = (),
+                        busy: BusyIndex = None) -> List[Dict]:
     """
-    # Get all conflicts in this range
-    conflicts = []
+    Check many candidate intervals against slots and blocked times at once
     
-    # Get scheduled slot conflicts
-    slot_conflicts = db.execute("""
-        SELECT start_datetime, end_datetime
+    intervals are (start, end) or (start, end, exclude_slot_id) tuples; slots in
+    exclude_slot_ids are ignored for every interval. Busy time for the whole
+    span is loaded in one go (or read from a covering busy index), then a single
+    sweep over the sorted start/end events pairs intervals with what they overlap.
+    Returns one has_conflict()-shaped dict per interval, in input order
+    """
+    results = [{"has_conflict": False} for _ in intervals]
+    if not intervals:
+        return results
+    
+    excluded = set(exclude_slot_ids)
+    range_start = min(interval[0] for interval in intervals)
+    range_end = max(interval[1] for interval in intervals)
+    if busy is None or not busy.covers(range_start, range_end):
+        busy = BusyIndex.load(range_start, range_end)
+    entries = [
+        entry for entry in busy.overlapping(range_start, range_end)
+        if entry.start < entry.end and not (entry.kind == 'slot' and entry.id in excluded)
+    ]
+    
+    # (time, 0 = end / 1 = start, 0 = interval / 1 = busy, position); ends sort
+    # before starts at the same instant since the ranges are half-open
+    events = []
+    for position, interval in enumerate(intervals):
+        if interval[0] < interval[1]:
+            events.append((interval[0], 1, 0, position))
+            events.append((interval[1], 0, 0, position))
+    for position, entry in enumerate(entries):
+        events.append((entry.start, 1, 1, position))
+        events.append((entry.end, 0, 1, position))
+    events.sort()
+    
+    conflicts = [[] for _ in intervals]
+    open_intervals, open_entries = set(), set()
+    for _, is_start, is_busy, position in events:
+        if not is_start:
+            (open_entries if is_busy else open_intervals).discard(position)
+        elif is_busy:
+            for interval_position in open_intervals:
+                conflicts[interval_position].append(position)
+            open_entries.add(position)
+        else:
+            conflicts[position].extend(open_entries)
+            open_intervals.add(position)
+    
+    for position, interval in enumerate(intervals):
+        own_slot_id = interval[2] if len(interval) > 2 else None
+        overlapping = [
+            entries[entry_position] for entry_position in sorted(conflicts[position])
+            if not (own_slot_id and entries[entry_position].kind == 'slot'
+                    and entries[entry_position].id == own_slot_id)
+        ]
+        if overlapping:
+            results[position] = {
+                "has_conflict": True,
+                "slot_conflicts": [e.as_conflict() for e in overlapping if e.kind == 'slot'],
+                "block_conflicts": [e.as_conflict() for e in overlapping if e.kind == 'block']
+            }
+    return results
+
+
+def find_schedule_overlaps() -> List[Dict]:
+    """
+    Every pair of incomplete slots that overlap each other (double-booked) and
+    every incomplete slot overlapping a blocked time
+    
+    Recurring instances without slot rows count as slots from today through the
+    last stored slot or the rolling horizon, whichever is later; findings name
+    them by allocation_id and original_start (slot_id None), which is what the
+    instance endpoints take to detach or delete one.
+    
+    Slots and block occurrences are read with two queries and sorted by parsed
+    start time (stored timestamps may carry seconds, fractions or an offset
+    suffix, so their strings do not order reliably); one sweep keeps the
+    intervals still open in end-ordered heaps, so the pass is O(n log n) plus
+    the number of findings. Titles are looked up for findings only.
+    """
+    slots = db.execute("""
+        SELECT 0 as is_block, id, start_datetime, end_datetime
+        FROM scheduled_slots
+        WHERE completed = 0
+    """)
+    for slot in slots:
+        slot['start'] = parse_stored_datetime(slot['start_datetime'])
+        slot['end'] = parse_stored_datetime(slot['end_datetime'])
+    
+    today = datetime.combine(date.today(), datetime.min.time())
+    last_end = max([slot['end'] for slot in slots] +
+                   [datetime.combine(recurring_horizon() + timedelta(days=1), datetime.min.time())])
+    for instance in virtual_instances(today, last_end):
+        instance['is_block'] = 0
+        instance['start'] = parse_stored_datetime(instance['start_datetime'])
+        instance['end'] = parse_stored_datetime(instance['end_datetime'])
+        slots.append(instance)
+    if not slots:
+        return []
+    ensure_block_occurrences(last_end.date())
+    
+    blocks = db.execute("""
+        SELECT 1 as is_block, block_id as id, start_datetime, end_datetime
+        FROM blocked_time_occurrences
+        WHERE date(start_datetime) <= ?
+    """, (last_end.date().isoformat(),))
+    for block in blocks:
+        block['start'] = parse_stored_datetime(block['start_datetime'])
+        block['end'] = parse_stored_datetime(block['end_datetime'])
+    
+    intervals = sorted(slots + [block for block in blocks if block['start'] < last_end],
+                       key=lambda interval: interval['start'])
+    
+    # (slot interval, other interval) pairs; blocks overlapping blocks are fine
+    pairs = []
+    open_slots, open_blocks = [], []
+    heappush, heappop = heapq.heappush, heapq.heappop
+    for position, interval in enumerate(intervals):
+        start = interval['start']
+        while open_slots and open_slots[0][0] <= start:
+            heappop(open_slots)
+        while open_blocks and open_blocks[0][0] <= start:
+            heappop(open_blocks)
+        
+        if open_slots:
+            pairs.extend((slot_position, position) for _, slot_position in open_slots)
+        if interval['is_block']:
+            heappush(open_blocks, (interval['end'], position))
+        else:
+            if open_blocks:
+                pairs.extend((position, block_position) for _, block_position in open_blocks)
+            heappush(open_slots, (interval['end'], position))
+    
+    if not pairs:
+        return []
+    
+    slot_ids = {intervals[p]['id'] for pair in pairs for p in pair
+                if not intervals[p]['is_block'] and intervals[p]['id'] is not None}
+    block_ids = {intervals[p]['id'] for _, p in pairs if intervals[p]['is_block']}
+    slot_details = {row['id']: row for row in db.execute("""
+        SELECT s.id, s.task_id, t.title
         FROM scheduled_slots s
         JOIN tasks t ON s.task_id = t.id
-        WHERE (t.id != ? OR ? IS NULL)
-        AND s.completed = 0
-        AND NOT (end_datetime <= ? OR start_datetime >= ?)
-        AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
-        ORDER BY start_datetime
-    """, (exclude_task_id, exclude_task_id, slot_start.isoformat(), slot_end.isoformat()))
-    
-    # Get blocked time conflicts
-    block_conflicts = db.execute("""
-        SELECT start_datetime, end_datetime
-        FROM blocked_times
-        WHERE NOT (end_datetime <= ? OR start_datetime >= ?)
-        ORDER BY start_datetime
-    """, (slot_start.isoformat(), slot_end.isoformat()))
-    
-    # Combine and sort all conflicts
-    all_conflicts = []
-    for conflict in slot_conflicts + block_conflicts:
-        all_conflicts.append((
-            datetime.fromisoformat(conflict['start_datetime']),
-            datetime.fromisoformat(conflict['end_datetime'])
-        ))
-    all_conflicts.sort(key=lambda x: x[0])
-    
-    # Find gaps between conflicts
-    available = []
-    current_start = slot_start
-    
-    for conflict_start, conflict_end in all_conflicts:
-        if current_start < conflict_start:
-            # There's a gap before this conflict
-            available.append((current_start, conflict_start))
-        current_start = max(current_start, conflict_end)
-    
-    # Check if there's time after the last conflict
-    if current_start < slot_end:
-        available.append((current_start, slot_end))
-    
-    return available
+        WHERE s.id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted(slot_ids)),))}
+    block_titles = {row['id']: row['title'] for row in db.execute("""
+        SELECT id, title FROM blocked_times WHERE id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted(block_ids)),))}
+    
+    def details(slot: Dict) -> Dict:
+        # Recurring instances without a slot row carry their task and title
+        return slot if slot['id'] is None else slot_details[slot['id']]
+    
+    findings = []
+    for slot_position, other_position in pairs:
+        slot, other = intervals[slot_position], intervals[other_position]
+        finding = {
+            'type': 'blocked_time' if other['is_block'] else 'double_booked',
+            'slot_id': slot['id'],
+            'task_id': details(slot)['task_id'],
+            'title': details(slot)['title'],
+            'start_datetime': slot['start_datetime'],
+            'end_datetime': slot['end_datetime'],
+            'overlap_start': max(slot['start'], other['start']).isoformat(),
+            'overlap_end': min(slot['end'], other['end']).isoformat()
+        }
+        if slot['id'] is None:
+            finding['allocation_id'] = slot['allocation_id']
+            finding['original_start'] = slot['original_start']
+        if other['is_block']:
+            finding['block_id'] = other['id']
+            finding['block_title'] = block_titles.get(other['id'])
+        else:
+            finding['other_slot_id'] = other['id']
+            finding['other_task_id'] = details(other)['task_id']
+            finding['other_title'] = details(other)['title']
+            if other['id'] is None:
+                finding['other_allocation_id'] = other['allocation_id']
+                finding['other_original_start'] = other['original_start']
+        findings.append(finding)
+    return findings
+
 
+def delete_scheduled_slot(slot: Dict):
+    """Delete a slot; a recurring instance is recorded as deleted so it doesn't regenerate"""
+    with db.transaction():
+        db.delete('scheduled_slots', 'id = ?', (slot['id'],))
+        if slot['source'] == 'allocation' or slot['original_start']:
+            record_deleted_instance(slot)
 
-def generate_available_slots(start_date: date, end_date: date, 
-                            calendar_settings: Dict) -> List[Tuple[datetime, datetime]]:
+
+def apply_slot_operations(operations: List[Dict], dry_run: bool = False) -> Dict:
     """
-    Generate all possible work slots based on calendar settings
-    Returns list of (start_datetime, end_datetime) tuples
+    Validate and apply many slot operations (move, delete, fix, unfix) at once
+    
+    A move takes new_start or shift_minutes and keeps the slot's duration.
+    Target slots are read in one query and every move is checked against one
+    busy index, with moved and deleted slots taken off their old times and
+    moved slots put on their new ones, so a block of slots can shift past
+    itself. Nothing is written unless every operation is valid; then all are
+    applied in one transaction.
     """
-    slots = []
-    current_date = start_date
-    
-    work_days = get_work_days(calendar_settings)
-    excluded_dates = calendar_settings.get('excluded_dates', [])
-    
-    work_start = datetime.strptime(calendar_settings['work_start_time'], "%H:%M").time()
-    work_end = datetime.strptime(calendar_settings['work_end_time'], "%H:%M").time()
+    slot_ids = [operation['slot_id'] for operation in operations]
+    if len(set(slot_ids)) != len(slot_ids):
+        raise SchedulingError("Each slot can appear in only one operation")
+    
+    slots = {
+        slot['id']: slot for slot in db.execute(f"""
+            SELECT s.*, t.is_reschedulable
+            FROM scheduled_slots s
+            JOIN tasks t ON s.task_id = t.id
+            WHERE s.id IN ({','.join('?' * len(slot_ids))})
+        """, tuple(slot_ids))
+    }
     
-    while current_date <= end_date:
-        # Check if it's a work day and not excluded
-        day_code = current_date.strftime('%a').upper()[:2]  # MO, TU, etc.
+    results = []
+    moves = []
+    for operation in operations:
+        slot = slots.get(operation['slot_id'])
+        result = {'slot_id': operation['slot_id'], 'op': operation['op'], 'success': True}
+        results.append(result)
         
-        if day_code in work_days and current_date.isoformat() not in excluded_dates:
-            slot_start = datetime.combine(current_date, work_start)
-            slot_end = datetime.combine(current_date, work_end)
-            slots.append((slot_start, slot_end))
+        if slot is None:
+            result.update(success=False, error="Slot not found")
+        elif operation['op'] == 'move':
+            if slot['is_fixed']:
+                result.update(success=False, error="This slot is fixed and cannot be moved")
+            elif not slot['is_reschedulable'] and slot['source'] != 'manual':
+                result.update(success=False, error="This task cannot be rescheduled")
+            elif operation.get('new_start') is None and operation.get('shift_minutes') is None:
+                result.update(success=False, error="A move needs new_start or shift_minutes")
+            else:
+                old_start = parse_stored_datetime(slot['start_datetime'])
+                old_end = parse_stored_datetime(slot['end_datetime'])
+                if operation.get('new_start') is not None:
+                    new_start = operation['new_start'].replace(tzinfo=None)
+                else:
+                    new_start = old_start + timedelta(minutes=operation['shift_minutes'])
+                new_end = new_start + (old_end - old_start)
+                result['start_datetime'] = new_start.isoformat()
+                result['end_datetime'] = new_end.isoformat()
+                moves.append((result, slot, new_start, new_end))
+    
+    if moves:
+        busy = BusyIndex.load(min(move[2] for move in moves), max(move[3] for move in moves))
+        for operation in operations:
+            if operation['op'] in ('move', 'delete'):
+                busy.remove_slot(operation['slot_id'])
+        for _, slot, new_start, new_end in moves:
+            busy.add(new_start, new_end, 'slot', slot['id'], slot['task_id'])
         
-        current_date += timedelta(days=1)
+        checks = has_conflicts_batch(
+            [(new_start, new_end, slot['id']) for _, slot, new_start, new_end in moves], busy=busy
+        )
+        for (result, _, _, _), conflict in zip(moves, checks):
+            if conflict['has_conflict']:
+                result.update(
+                    success=False, error="Time slot conflicts with existing schedule",
+                    slot_conflicts=conflict['slot_conflicts'], block_conflicts=conflict['block_conflicts']
+                )
+    
+    failed = sum(1 for result in results if not result['success'])
+    applied = not failed and not dry_run
+    if applied:
+        with db.transaction():
+            for result, slot, new_start, new_end in moves:
+                db.update('scheduled_slots', {
+                    'start_datetime': new_start.isoformat(),
+                    'end_datetime': new_end.isoformat(),
+                    'is_override': 1,
+                    'original_start': slot['original_start'] or slot['start_datetime'],
+                    'source': 'manual'
+                }, 'id = ?', (slot['id'],))
+            for operation in operations:
+                if operation['op'] == 'delete':
+                    delete_scheduled_slot(slots[operation['slot_id']])
+                elif operation['op'] in ('fix', 'unfix'):
+                    db.update('scheduled_slots', {
+                        'is_fixed': 1 if operation['op'] == 'fix' else 0
+                    }, 'id = ?', (operation['slot_id'],))
+            
+            db.insert('activity_log', {
+                'action': 'bulk_slot_update',
+                'entity_type': 'slot',
+                'old_data': json.dumps([
+                    {key: slots[slot_id][key] for key in ('id', 'start_datetime', 'end_datetime', 'is_fixed')}
+                    for slot_id in slot_ids
+                ]),
+                'new_data': json.dumps([
+                    {key: value for key, value in result.items() if key != 'success'} for result in results
+                ])
+            })
     
-    return slots
+    return {
+        'success': not failed,
+        'applied': applied,
+        'dry_run': dry_run,
+        'failed_count': failed,
+        'results': results
+    }
 
 
-def create_task_sessions(task: Dict, available_slots: List[Tuple[datetime, datetime]], 
-                        min_session_hours: float = None) -> Tuple[List[Dict], float]:
+def get_available_time_in_slot(slot_start: datetime, slot_end: datetime, 
+                               exclude_task_id: int = None,
+                               busy: BusyIndex = None) -> List[Tuple[datetime, datetime]]:
     """
-    Split task into sessions and fit them into available slots
-    Returns (list of session dicts, remaining_hours)
+    Given a time range, return all available sub-ranges accounting for conflicts
+    Answers from the busy index when one covering the range is given, else
+    from one loaded for the range
+    Returns list of (start, end) tuples
     """
-    if min_session_hours is None:
-        min_session_hours = task.get('min_session_hours', 2.0)
-    
-    sessions = []
-    remaining = task['estimated_hours']
+    if busy is not None and busy.covers(slot_start, slot_end):
+        return busy.free_gaps(slot_start, slot_end, exclude_task_id=exclude_task_id)
     
-    for slot_start, slot_end in available_slots:
-        if remaining <= 0:
-            break
-        
-        # Get available time within this slot (accounting for conflicts)
-        available_ranges = get_available_time_in_slot(slot_start, slot_end, task['id'])
-        
-        for range_start, range_end in available_ranges:
-            if remaining <= 0:
-                break
-            
-            range_duration = (range_end - range_start).total_seconds() / 3600
-            
-            # Only use this range if it's at least min_session_hours
-            if range_duration >= min_session_hours:
-                session_duration = min(MAX_SESSION_HOURS, range_duration, remaining)
-                session_end = range_start + timedelta(hours=session_duration)
-                
-                sessions.append({
-                    'task_id': task['id'],
-                    'start_datetime': range_start.isoformat(),
-                    'end_datetime': session_end.isoformat(),
-                    'source': 'auto',
-                    'is_override': 0
-                })
-                
-                remaining -= session_duration
-    
-    return sessions, remaining
-
-
-def auto_schedule_task(task_id: int) -> Dict:
+    # Otherwise load one for just this range (slots, recurring instances
+    # without slot rows and blocked times)
+    return BusyIndex.load(slot_start, slot_end).free_gaps(slot_start, slot_end, exclude_task_id=exclude_task_id)
+
+
+def auto_schedule_task(task_id: int, busy: BusyIndex = None, engine: str = 'interval',
+                       dry_run: bool = False, task: Dict = None) -> Dict:
     """
     Auto-schedule a single task into available slots
+    A shared busy index may be passed in; it is updated with the new sessions
+    dry_run plans without writing and returns the sessions; it may be given an
+    unsaved task dict instead of loading task_id
     Returns dict with scheduling result
     """
-    task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    if not task:
-        raise SchedulingError(f"Task {task_id} not found")
+    if task is None:
+        task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        if not task:
+            raise SchedulingError(f"Task {task_id} not found")
+    elif not dry_run:
+        raise SchedulingError("An unsaved task can only be scheduled as a dry run")
     
     if task['has_time_allocation']:
         raise SchedulingError("Task has recurring time allocation, cannot auto-schedule")
@@ -240,33 +480,114 @@ def auto_schedule_task(task_id: int) -> Dict:
     calendar_settings = get_calendar_settings()
     
     # Generate available slots
-    start_date = datetime.fromisoformat(task['start_date']).date() if task['start_date'] else date.today()
-    end_date = datetime.fromisoformat(task['deadline']).date() if task['deadline'] else (date.today() + timedelta(days=365))
+    start_date, end_date = get_task_window(task)
     
-    available_slots = generate_available_slots(start_date, end_date, calendar_settings)
+    available_slots = iter_available_slots(start_date, end_date, calendar_settings)
+    availability = build_availability(task, start_date, end_date, calendar_settings, engine, busy)
     
     # Create sessions
-    sessions, remaining = create_task_sessions(task, available_slots)
+    sessions, remaining = create_task_sessions(task, available_slots, busy=availability)
     
-    if sessions:
-        # Insert sessions
-        for session in sessions:
-            db.insert('scheduled_slots', session)
+    slot_ids = None
+    if sessions and not dry_run:
+        # Insert sessions in one batch
+        slot_ids = db.insert_many('scheduled_slots', sessions)
+    if busy is not None:
+        busy.add_sessions(sessions, slot_ids)
     
-    return {
+    result = {
         "task_id": task_id,
         "scheduled": remaining == 0,
         "hours_scheduled": task['estimated_hours'] - remaining,
         "hours_remaining": remaining,
         "session_count": len(sessions)
     }
+    if dry_run:
+        result['dry_run'] = True
+        result['sessions'] = sessions
+    return result
 
 
-def auto_schedule_all_tasks() -> Dict:
+def reschedule_task_window(task_id: int) -> Dict:
+    """
+    Incrementally reschedule a task after its start date or deadline changed
+    
+    Movable sessions still inside the new window are kept (same ids); only those
+    that fell outside are removed, and only the hours now missing are placed.
+    Placement scans the whole new window, not just newly opened days: when the
+    window shrinks, the hours removed can only go into days it already had.
+    Returns dict with kept/removed/added counts
+    """
+    task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
+    if not task:
+        raise SchedulingError(f"Task {task_id} not found")
+    
+    if task['has_time_allocation']:
+        raise SchedulingError("Task has recurring time allocation, cannot auto-schedule")
+    
+    start_date, end_date = get_task_window(task)
+    
+    with db.transaction():
+        # Drop movable sessions outside the new window
+        removed = db.delete('scheduled_slots', """
+            task_id = ? AND is_fixed = 0 AND completed = 0 AND source != 'allocation'
+            AND (date(start_datetime) < ? OR date(start_datetime) > ?)
+        """, (task_id, start_date.isoformat(), end_date.isoformat()))
+        
+        kept = db.execute_one("""
+            SELECT COUNT(*) as count FROM scheduled_slots
+            WHERE task_id = ? AND is_fixed = 0 AND completed = 0 AND source != 'allocation'
+            AND date(start_datetime) BETWEEN ? AND ?
+        """, (task_id, start_date.isoformat(), end_date.isoformat()))
+        
+        # Completed, fixed and allocation hours still count towards the estimate
+        scheduled = db.execute_one("""
+            SELECT COALESCE(MAX(scheduled_hours), 0) as hours FROM task_hours WHERE task_id = ?
+        """, (task_id,))
+        missing = round(task['estimated_hours'] - scheduled['hours'], 2)
+        
+        sessions = []
+        remaining = max(missing, 0)
+        if missing > 0:
+            calendar_settings = get_calendar_settings()
+            available_slots = iter_available_slots(start_date, end_date, calendar_settings)
+            busy = BusyIndex.for_dates(start_date, end_date)
+            
+            # Kept sessions stay put, so new ones must not overlap them
+            sessions, remaining = create_task_sessions(
+                {**task, 'estimated_hours': missing}, available_slots,
+                busy=busy, avoid_own_slots=True
+            )
+            db.insert_many('scheduled_slots', sessions)
+    
+    return {
+        "task_id": task_id,
+        "scheduled": remaining == 0,
+        "kept": kept['count'],
+        "removed": removed,
+        "added": len(sessions),
+        "hours_added": round(max(missing, 0) - remaining, 2),
+        "hours_remaining": remaining
+    }
+
+
+def auto_schedule_all_tasks(strategy: str = 'greedy', dry_run: bool = False) -> Dict:
     """
     Auto-schedule all unscheduled, reschedulable tasks
-    Returns summary of what was scheduled
+    
+    Plans every task in memory against one shared busy index, then writes all
+    sessions in a single transaction. strategy 'greedy' places tasks one by one
+    (later tasks see earlier placements); 'solver' plans all of them at once
+    with deadline-aware admission (see solver.py) and reports infeasible tasks.
+    dry_run returns the planned sessions instead of writing them.
+    Returns summary of what was scheduled, with per-phase timings
     """
+    if strategy not in SCHEDULING_STRATEGIES:
+        raise SchedulingError(f"Unknown scheduling strategy '{strategy}'")
+    
+    phase_start = perf_counter()
+    timings = {}
+    
     # Get tasks that need scheduling
     tasks = db.execute("""
         SELECT t.* FROM tasks t
@@ -281,40 +602,48 @@ def auto_schedule_all_tasks() -> Dict:
         ORDER BY t.deadline ASC, t.priority DESC
     """)
     
-    scheduled = []
-    partial = []
-    failed = []
-    
-    for task in tasks:
-        try:
-            result = auto_schedule_task(task['id'])
-            
-            if result['scheduled']:
-                scheduled.append({
-                    'task_id': task['id'],
-                    'title': task['title'],
-                    'sessions': result['session_count']
-                })
-            else:
-                partial.append({
-                    'task_id': task['id'],
-                    'title': task['title'],
-                    'scheduled_hours': result['hours_scheduled'],
-                    'remaining_hours': result['hours_remaining']
-                })
-        except SchedulingError as e:
-            failed.append({
-                'task_id': task['id'],
-                'title': task['title'],
-                'error': str(e)
-            })
+    plan = {"sessions": [], "scheduled": [], "partial": [], "failed": []}
     
-    return {
-        "scheduled": scheduled,
-        "partial": partial,
-        "failed": failed,
-        "summary": f"Scheduled {len(scheduled)}, Partial {len(partial)}, Failed {len(failed)}"
+    if tasks:
+        # Load settings, work windows and busy intervals once for the whole horizon
+        calendar_settings = get_calendar_settings()
+        windows = {task['id']: get_task_window(task) for task in tasks}
+        horizon_start = min(start for start, _ in windows.values())
+        horizon_end = max(end for _, end in windows.values())
+        
+        available_slots = generate_available_slots(horizon_start, horizon_end, calendar_settings)
+        busy = BusyIndex.for_dates(horizon_start, horizon_end)
+        timings['load_ms'] = round((perf_counter() - phase_start) * 1000, 2)
+        
+        phase_start = perf_counter()
+        if strategy == 'solver':
+            from solver import solve_schedule
+            plan = solve_schedule(tasks, windows, available_slots, busy)
+        else:
+            plan = plan_tasks_greedy(tasks, windows, available_slots, busy)
+        timings['plan_ms'] = round((perf_counter() - phase_start) * 1000, 2)
+        
+        # Persist every session in one transaction
+        if not dry_run:
+            phase_start = perf_counter()
+            db.insert_many('scheduled_slots', plan['sessions'])
+            timings['write_ms'] = round((perf_counter() - phase_start) * 1000, 2)
+    
+    result = {
+        "strategy": strategy,
+        "scheduled": plan['scheduled'],
+        "partial": plan['partial'],
+        "failed": plan['failed'],
+        "sessions_created": len(plan['sessions']),
+        "timings": timings,
+        "summary": f"Scheduled {len(plan['scheduled'])}, Partial {len(plan['partial'])}, Failed {len(plan['failed'])}"
     }
+    if strategy == 'solver':
+        result['infeasible'] = plan.get('infeasible', [])
+    if dry_run:
+        result['dry_run'] = True
+        result['sessions'] = plan['sessions']
+    return result
 
 
 def find_bumpable_slots(required_hours: float, new_priority: int, 
@@ -340,7 +669,6 @@ def find_bumpable_slots(required_hours: float, new_priority: int,
         AND t.status != 'completed'
         AND DATE(s.start_datetime) >= ?
         AND DATE(s.start_datetime) <= ?
-        AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
         ORDER BY 
             t.priority ASC,
             t.deadline DESC,
@@ -364,10 +692,13 @@ def find_bumpable_slots(required_hours: float, new_priority: int,
 
 
 def reschedule_with_flexible_sessions(task_id: int, remaining_hours: float, 
-                                     min_session_hours: float) -> List[Dict]:
+                                     min_session_hours: float,
+                                     busy: BusyIndex = None,
+                                     dry_run: bool = False) -> List[Dict]:
     """
     Reschedule a task with flexible session sizes
-    Returns list of new sessions
+    A shared busy index may be passed in; it is updated with the new sessions
+    Returns list of new sessions (not written when dry_run)
     """
     task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
     if not task:
@@ -375,48 +706,62 @@ def reschedule_with_flexible_sessions(task_id: int, remaining_hours: float,
     
     calendar_settings = get_calendar_settings()
     
-    start_date = datetime.fromisoformat(task['start_date']).date() if task['start_date'] else date.today()
-    end_date = datetime.fromisoformat(task['deadline']).date() if task['deadline'] else (date.today() + timedelta(days=365))
+    start_date, end_date = get_task_window(task)
     
-    available_slots = generate_available_slots(start_date, end_date, calendar_settings)
+    available_slots = iter_available_slots(start_date, end_date, calendar_settings)
+    
+    if busy is None or not busy.covers_dates(start_date, end_date):
+        busy = BusyIndex.for_dates(start_date, end_date)
     
     # Create flexible sessions
     task_copy = dict(task)
     task_copy['estimated_hours'] = remaining_hours
-    sessions, remaining = create_task_sessions(task_copy, available_slots, min_session_hours)
+    sessions, remaining = create_task_sessions(task_copy, available_slots, min_session_hours, busy)
     
     if remaining > 0:
         raise SchedulingError(f"Could not reschedule task {task_id}. {remaining:.1f}h remaining.")
     
-    # Insert sessions
-    for session in sessions:
-        db.insert('scheduled_slots', session)
+    # Insert sessions in one batch
+    slot_ids = None if dry_run else db.insert_many('scheduled_slots', sessions)
+    busy.add_sessions(sessions, slot_ids)
     
     return sessions
 
 
-def attempt_with_bumping(task_id: int) -> Dict:
+def attempt_with_bumping(task_id: int, dry_run: bool = False, task: Dict = None) -> Dict:
     """
     Try to schedule a high-priority task by bumping lower-priority ones
+    dry_run plays the whole plan (bumps included) against the in-memory busy
+    index and returns it without writing; it may be given an unsaved task dict
     Returns dict with scheduling result and list of bumped tasks
     """
-    task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
-    if not task:
-        raise SchedulingError(f"Task {task_id} not found")
+    if task is None:
+        task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (task_id,))
+        if not task:
+            raise SchedulingError(f"Task {task_id} not found")
+    elif not dry_run:
+        raise SchedulingError("An unsaved task can only be scheduled as a dry run")
     
     calendar_settings = get_calendar_settings()
     
-    start_date = datetime.fromisoformat(task['start_date']).date() if task['start_date'] else date.today()
-    end_date = datetime.fromisoformat(task['deadline']).date() if task['deadline'] else (date.today() + timedelta(days=365))
+    start_date, end_date = get_task_window(task)
     
     # First try normal scheduling
     available_slots = generate_available_slots(start_date, end_date, calendar_settings)
-    sessions, remaining = create_task_sessions(task, available_slots)
+    busy = BusyIndex.for_dates(start_date, end_date)
+    sessions, remaining = create_task_sessions(task, available_slots, busy=busy)
     
     if remaining == 0:
         # Fits without bumping
-        for session in sessions:
-            db.insert('scheduled_slots', session)
+        if dry_run:
+            return {
+                "scheduled": True,
+                "bumped_tasks": [],
+                "method": "normal",
+                "dry_run": True,
+                "sessions": sessions
+            }
+        db.insert_many('scheduled_slots', sessions)
         return {
             "scheduled": True,
             "bumped_tasks": [],
@@ -447,62 +792,101 @@ def attempt_with_bumping(task_id: int) -> Dict:
             f"Even after bumping {len(to_bump)} slots, still short by {remaining - accumulated_hours:.1f}h"
         )
     
-    # Remove bumped slots
+    # One index covering this task's and every bumped task's window, so the
+    # bumps and all rescheduling (dry run included) play out against it
+    bumped_windows = [
+        get_task_window(row) for row in db.execute(
+            f"SELECT * FROM tasks WHERE id IN ({','.join('?' * len(bumped_task_ids))})",
+            tuple(bumped_task_ids)
+        )
+    ]
+    busy = BusyIndex.for_dates(
+        min([start_date] + [start for start, _ in bumped_windows]),
+        max([end_date] + [end for _, end in bumped_windows])
+    )
+    
+    # Bumped slots are still in the database during a dry run
+    bumped_hours = {}
     for candidate in to_bump:
-        db.delete('scheduled_slots', 'id = ?', (candidate.slot_id,))
-    
-    # Now reschedule the high-priority task
-    available_slots = generate_available_slots(start_date, end_date, calendar_settings)
-    new_sessions, still_remaining = create_task_sessions(task, available_slots)
-    
-    if still_remaining > 0:
-        raise SchedulingError("Failed to schedule after bumping (bug)")
-    
-    # Insert new sessions
-    for session in new_sessions:
-        db.insert('scheduled_slots', session)
-    
-    # Try to reschedule bumped tasks
-    rescheduled = {}
-    failures = []
-    
-    for bumped_task_id in bumped_task_ids:
-        bumped_task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (bumped_task_id,))
+        bumped_hours[candidate.task_id] = bumped_hours.get(candidate.task_id, 0) + candidate.duration_hours
+    
+    # Bump, reschedule and log as one unit of work so a failure leaves
+    # the original schedule untouched; a dry run only touches the busy index
+    with (nullcontext() if dry_run else db.transaction()):
+        # Remove bumped slots
+        for candidate in to_bump:
+            if not dry_run:
+                db.delete('scheduled_slots', 'id = ?', (candidate.slot_id,))
+            busy.remove_slot(candidate.slot_id)
         
-        # Calculate remaining hours
-        existing = db.execute("""
-            SELECT SUM(CAST((julianday(end_datetime) - julianday(start_datetime)) * 24 AS REAL)) as total
-            FROM scheduled_slots
-            WHERE task_id = ?
-        """, (bumped_task_id,))
+        # Now reschedule the high-priority task
+        new_sessions, still_remaining = create_task_sessions(task, available_slots, busy=busy)
         
-        already_scheduled = existing[0]['total'] or 0
-        task_remaining = bumped_task['estimated_hours'] - already_scheduled
+        if still_remaining > 0:
+            raise SchedulingError("Failed to schedule after bumping (bug)")
         
-        if task_remaining <= 0:
-            continue
+        # Insert new sessions
+        slot_ids = None if dry_run else db.insert_many('scheduled_slots', new_sessions)
+        busy.add_sessions(new_sessions, slot_ids)
+        
+        # Try to reschedule bumped tasks
+        rescheduled = {}
+        rescheduled_sessions = {}
+        failures = []
         
-        try:
-            result = reschedule_with_flexible_sessions(
-                bumped_task_id, 
-                task_remaining,
-                min_session_hours=bumped_task.get('min_session_hours', 2.0)
+        for bumped_task_id in bumped_task_ids:
+            bumped_task = db.execute_one("SELECT * FROM tasks WHERE id = ?", (bumped_task_id,))
+            
+            # Calculate remaining hours
+            existing = db.execute_one(
+                "SELECT scheduled_hours FROM task_hours WHERE task_id = ?", (bumped_task_id,)
             )
-            rescheduled[bumped_task_id] = len(result)
-        except SchedulingError:
-            failures.append(bumped_task_id)
-    
-    # Log bumping activity
-    db.insert('activity_log', {
-        'action': 'bump_tasks',
-        'entity_type': 'task',
-        'entity_id': task_id,
-        'new_data': json.dumps({
-            'bumped': list(bumped_task_ids),
-            'rescheduled': list(rescheduled.keys()),
-            'failed': failures
+            
+            already_scheduled = existing['scheduled_hours'] if existing else 0
+            if dry_run:
+                already_scheduled -= bumped_hours[bumped_task_id]
+            task_remaining = bumped_task['estimated_hours'] - already_scheduled
+            
+            if task_remaining <= 0:
+                continue
+            
+            try:
+                result = reschedule_with_flexible_sessions(
+                    bumped_task_id, 
+                    task_remaining,
+                    min_session_hours=bumped_task.get('min_session_hours', 2.0),
+                    busy=busy,
+                    dry_run=dry_run
+                )
+                rescheduled[bumped_task_id] = len(result)
+                rescheduled_sessions[bumped_task_id] = result
+            except SchedulingError:
+                failures.append(bumped_task_id)
+        
+        if dry_run:
+            return {
+                "scheduled": True,
+                "method": "with_bumping",
+                "bumped_tasks": list(bumped_task_ids),
+                "rescheduled": rescheduled,
+                "failed_reschedules": failures,
+                "dry_run": True,
+                "sessions": new_sessions,
+                "bumped_slots": [asdict(candidate) for candidate in to_bump],
+                "rescheduled_sessions": rescheduled_sessions
+            }
+        
+        # Log bumping activity
+        db.insert('activity_log', {
+            'action': 'bump_tasks',
+            'entity_type': 'task',
+            'entity_id': task_id,
+            'new_data': json.dumps({
+                'bumped': list(bumped_task_ids),
+                'rescheduled': list(rescheduled.keys()),
+                'failed': failures
+            })
         })
-    })
     
     return {
         "scheduled": True,
@@ -513,6 +897,45 @@ def attempt_with_bumping(task_id: int) -> Dict:
     }
 
 
+def pack_gap(items: List[Tuple[float, float, Any]], capacity_hours: float) -> Dict[int, Tuple[float, List[Any]]]:
+    """
+    0/1 knapsack of (hours, score, payload) items into a gap of capacity_hours
+    
+    Weights are exact minutes (slot times are minute-resolution), divided by
+    their common divisor so the usual quarter-hour durations keep the DP small.
+    Only the best capacity // weight items of each weight can ever be used
+    together, so the rest are dropped first; thousands of candidates shrink to
+    a few dozen before the DP runs.
+    Returns {filled minutes: (total score, payloads)} with the best packing for
+    every reachable total
+    """
+    capacity_minutes = int(capacity_hours * 60 + 1e-6)
+    weighted = [(round(hours * 60), score, payload) for hours, score, payload in items]
+    weighted = [entry for entry in weighted if 0 < entry[0] <= capacity_minutes]
+    if not weighted:
+        return {}
+    
+    step = gcd(*(minutes for minutes, _, _ in weighted))
+    capacity = capacity_minutes // step
+    by_weight: Dict[int, List[Tuple[float, Any]]] = {}
+    for minutes, score, payload in weighted:
+        by_weight.setdefault(minutes // step, []).append((score, payload))
+    
+    best: Dict[int, Tuple[float, Tuple]] = {0: (0.0, ())}
+    for weight, group in by_weight.items():
+        group.sort(key=lambda entry: entry[0], reverse=True)
+        for score, payload in group[:capacity // weight]:
+            for filled in sorted(best, reverse=True):
+                total = filled + weight
+                if total > capacity:
+                    continue
+                candidate = (best[filled][0] + score, best[filled][1] + (payload,))
+                if total not in best or candidate[0] > best[total][0]:
+                    best[total] = candidate
+    
+    return {filled * step: (score, list(payloads)) for filled, (score, payloads) in best.items() if payloads}
+
+
 def calculate_benefit_score(candidate: Dict) -> float:
     """Calculate how beneficial it is to move this task to available time"""
     score = 0.0
@@ -539,11 +962,124 @@ def calculate_benefit_score(candidate: Dict) -> float:
     return score
 
 
+def pack_available_time(available_start: datetime, available_end: datetime,
+                        mode: str = 'interactive', dry_run: bool = False) -> Dict:
+    """
+    Fill newly available time with the set of future movable slots that has the
+    highest total benefit score and fits, placed back to back
+    
+    Each free gap in the range (the largest first) gets its own knapsack over
+    the slots still unused; candidates are later slots that are not fixed, so
+    nothing already inside the range moves. In auto mode all moves are applied
+    in one transaction; dry_run reports them without writing.
+    """
+    busy = BusyIndex.load(available_start, available_end)
+    gaps = sorted(busy.free_gaps(available_start, available_end),
+                  key=lambda gap: gap[1] - gap[0], reverse=True)
+    largest_gap = (gaps[0][1] - gaps[0][0]).total_seconds() / 3600 if gaps else 0
+    
+    candidates = db.execute("""
+        SELECT 
+            s.id as slot_id,
+            s.task_id,
+            s.start_datetime as original_start,
+            s.end_datetime as original_end,
+            (julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 as duration_hours,
+            t.title,
+            t.priority,
+            t.deadline,
+            julianday(t.deadline) - julianday('now') as days_until_deadline
+        FROM scheduled_slots s
+        JOIN tasks t ON s.task_id = t.id
+        WHERE s.completed = 0
+        AND s.is_fixed = 0
+        AND s.start_datetime >= ?
+        AND t.is_reschedulable = 1
+        AND t.status != 'completed'
+        AND (julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 <= ? + 1e-6
+    """, (available_end.isoformat(), largest_gap))
+    for candidate in candidates:
+        candidate['duration_hours'] = stored_duration_hours(candidate['original_start'], candidate['original_end'])
+        candidate['benefit_score'] = calculate_benefit_score(candidate)
+    
+    moves = []
+    used = set()
+    for gap_start, gap_end in gaps:
+        packings = pack_gap(
+            [(c['duration_hours'], c['benefit_score'], c) for c in candidates if c['slot_id'] not in used],
+            (gap_end - gap_start).total_seconds() / 3600
+        )
+        if not packings:
+            continue
+        
+        _, packed = max(packings.values(), key=lambda packing: packing[0])
+        cursor = gap_start
+        for candidate in sorted(packed, key=lambda c: c['original_start']):
+            new_end = cursor + timedelta(hours=candidate['duration_hours'])
+            moves.append({
+                **candidate,
+                'new_start': cursor.isoformat(),
+                'new_end': new_end.isoformat()
+            })
+            used.add(candidate['slot_id'])
+            cursor = new_end
+    
+    result = {
+        "mode": mode,
+        "packed": True,
+        "available_time": {
+            "start": available_start.isoformat(),
+            "end": available_end.isoformat(),
+            "duration_hours": (available_end - available_start).total_seconds() / 3600
+        },
+        "candidates_considered": len(candidates),
+        "filled_hours": round(sum(move['duration_hours'] for move in moves), 2),
+        "total_benefit": round(sum(move['benefit_score'] for move in moves), 1)
+    }
+    
+    if mode != 'auto':
+        result['suggestions'] = moves
+        return result
+    
+    result['moved'] = moves
+    if dry_run:
+        result['dry_run'] = True
+        result['message'] = f"Would move {len(moves)} slots into available time"
+        return result
+    
+    with db.transaction():
+        for move in moves:
+            db.update('scheduled_slots', {
+                'start_datetime': move['new_start'],
+                'end_datetime': move['new_end'],
+                'source': 'manual',
+                'is_override': 1,
+                'original_start': move['original_start']
+            }, 'id = ?', (move['slot_id'],))
+            
+            db.insert('activity_log', {
+                'action': 'reallocate_auto',
+                'entity_type': 'slot',
+                'entity_id': move['slot_id'],
+                'old_data': json.dumps({'start': move['original_start']}),
+                'new_data': json.dumps({'start': move['new_start']})
+            })
+    
+    result['message'] = f"Moved {len(moves)} slots into available time"
+    return result
+
+
 def reallocate_to_available_time(available_start: datetime, available_end: datetime, 
-                                 mode: str = 'interactive', max_suggestions: int = 5) -> Dict:
+                                 mode: str = 'interactive', max_suggestions: int = 5,
+                                 dry_run: bool = False, pack: bool = False) -> Dict:
     """
     Find tasks that could be moved into newly available time
+    In auto mode, dry_run reports the move without making it
+    pack fills the time with several slots at once (see pack_available_time)
     """
+    if pack:
+        return pack_available_time(available_start, available_end, mode, dry_run)
+    
     available_duration = (available_end - available_start).total_seconds() / 3600
     
     # Find future slots that could be moved here
@@ -566,27 +1102,33 @@ def reallocate_to_available_time(available_start: datetime, available_end: datet
         WHERE s.start_datetime > ?
         AND t.is_reschedulable = 1
         AND t.status != 'completed'
-        AND CAST((julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 AS REAL) <= ?
-        AND (s.is_override = 0 OR (s.is_override = 1 AND s.start_datetime IS NOT NULL))
+        AND CAST((julianday(s.end_datetime) - julianday(s.start_datetime)) * 24 AS REAL) <= ? + 1e-6
         ORDER BY 
             t.priority DESC,
             days_until_deadline ASC,
             s.start_datetime ASC
         LIMIT ?
     """, (available_start.isoformat(), available_duration, max_suggestions * 2))
-    
-    # Check which fit without conflicts
-    viable = []
     for candidate in candidates:
-        new_end = available_start + timedelta(hours=candidate['duration_hours'])
-        
-        if new_end <= available_end:
-            conflict = has_conflict(available_start, new_end, exclude_slot_id=candidate['slot_id'])
-            if not conflict['has_conflict']:
-                candidate['new_start'] = available_start.isoformat()
-                candidate['new_end'] = new_end.isoformat()
-                candidate['benefit_score'] = calculate_benefit_score(candidate)
-                viable.append(candidate)
+        candidate['duration_hours'] = stored_duration_hours(candidate['original_start'], candidate['original_end'])
+    
+    # Check which fit without conflicts (one batch check for all candidates)
+    fitting = [
+        candidate for candidate in candidates
+        if available_start + timedelta(hours=candidate['duration_hours']) <= available_end
+    ]
+    conflicts = has_conflicts_batch([
+        (available_start, available_start + timedelta(hours=candidate['duration_hours']), candidate['slot_id'])
+        for candidate in fitting
+    ])
+    viable = []
+    for candidate, conflict in zip(fitting, conflicts):
+        if not conflict['has_conflict']:
+            new_end = available_start + timedelta(hours=candidate['duration_hours'])
+            candidate['new_start'] = available_start.isoformat()
+            candidate['new_end'] = new_end.isoformat()
+            candidate['benefit_score'] = calculate_benefit_score(candidate)
+            viable.append(candidate)
     
     # Sort by benefit
     viable.sort(key=lambda x: x['benefit_score'], reverse=True)
@@ -596,21 +1138,30 @@ def reallocate_to_available_time(available_start: datetime, available_end: datet
         # Auto-move the best candidate
         best = viable[0]
         
-        db.update('scheduled_slots', {
-            'start_datetime': best['new_start'],
-            'end_datetime': best['new_end'],
-            'source': 'manual',
-            'is_override': 1,
-            'original_start': best['original_start']
-        }, 'id = ?', (best['slot_id'],))
+        if dry_run:
+            return {
+                "mode": "auto",
+                "dry_run": True,
+                "moved": best,
+                "message": f"Would move '{best['title']}' to available slot"
+            }
         
-        db.insert('activity_log', {
-            'action': 'reallocate_auto',
-            'entity_type': 'slot',
-            'entity_id': best['slot_id'],
-            'old_data': json.dumps({'start': best['original_start']}),
-            'new_data': json.dumps({'start': best['new_start']})
-        })
+        with db.transaction():
+            db.update('scheduled_slots', {
+                'start_datetime': best['new_start'],
+                'end_datetime': best['new_end'],
+                'source': 'manual',
+                'is_override': 1,
+                'original_start': best['original_start']
+            }, 'id = ?', (best['slot_id'],))
+            
+            db.insert('activity_log', {
+                'action': 'reallocate_auto',
+                'entity_type': 'slot',
+                'entity_id': best['slot_id'],
+                'old_data': json.dumps({'start': best['original_start']}),
+                'new_data': json.dumps({'start': best['new_start']})
+            })
         
         return {
             "mode": "auto",
@@ -629,21 +1180,36 @@ def reallocate_to_available_time(available_start: datetime, available_end: datet
     }
 
 
-def check_deadline_feasibility(task: Dict) -> Dict:
-    """Check if task can fit before deadline"""
+def check_deadline_feasibility(task: Dict, busy: BusyIndex = None, engine: str = 'capacity') -> Dict:
+    """
+    Check if task can fit before deadline
+    engine 'capacity' (default) reads the cached prefix-sum capacity index;
+    'interval' and 'grid' recompute the window from scratch
+    """
     calendar_settings = get_calendar_settings()
     
-    start_date = datetime.fromisoformat(task['start_date']).date() if task['start_date'] else date.today()
-    end_date = datetime.fromisoformat(task['deadline']).date() if task['deadline'] else (date.today() + timedelta(days=365))
-    
-    available_slots = generate_available_slots(start_date, end_date, calendar_settings)
+    start_date, end_date = get_task_window(task)
     
     # Calculate total available hours
-    total_available = 0
-    for slot_start, slot_end in available_slots:
-        ranges = get_available_time_in_slot(slot_start, slot_end, task.get('id'))
-        for range_start, range_end in ranges:
-            total_available += (range_end - range_start).total_seconds() / 3600
+    if engine == 'capacity':
+        from capacity import get_capacity_index
+        capacity = get_capacity_index(start_date, end_date)
+        total_available = capacity.free_hours(start_date, end_date)
+        if task.get('id') is not None:
+            # The task's own sessions are time it can use
+            total_available += capacity.task_hours(task['id'], start_date, end_date)
+    elif engine == 'grid':
+        availability = build_availability(task, start_date, end_date, calendar_settings, engine, busy)
+        # Work hours are already stamped into the grid, so one vectorized count suffices
+        total_available = availability.free_hours(exclude_task_id=task.get('id'))
+    else:
+        availability = build_availability(task, start_date, end_date, calendar_settings, engine, busy)
+        total_available = 0
+        available_slots = generate_available_slots(start_date, end_date, calendar_settings)
+        for slot_start, slot_end in available_slots:
+            ranges = get_available_time_in_slot(slot_start, slot_end, task.get('id'), availability)
+            for range_start, range_end in ranges:
+                total_available += (range_end - range_start).total_seconds() / 3600
     
     feasible = total_available >= task['estimated_hours']
     
@@ -653,3 +1219,69 @@ def check_deadline_feasibility(task: Dict) -> Dict:
         "available_hours": round(total_available, 2),
         "shortfall": max(0, task['estimated_hours'] - total_available)
     }
+
+
+def check_all_deadlines_feasibility() -> Dict:
+    """
+    Feasibility of every open task in one pass over the capacity index
+    
+    Per task: free hours in its own window plus its own sessions, as in
+    check_deadline_feasibility. Across tasks: remaining hours summed in deadline
+    order (EDF) against the free and scheduled hours from today to each deadline,
+    which catches tasks that fit alone but not together.
+    """
+    tasks = db.execute("""
+        SELECT t.*, COALESCE(h.completed_hours, 0) as completed_hours
+        FROM tasks t
+        LEFT JOIN task_hours h ON h.task_id = t.id
+        WHERE t.status != 'completed'
+        AND t.archived = 0
+    """)
+    
+    if not tasks:
+        return {
+            "tasks": [],
+            "summary": {"total": 0, "feasible": 0, "at_risk": 0}
+        }
+    
+    from capacity import get_capacity_index
+    today = date.today()
+    windows = {task['id']: get_task_window(task) for task in tasks}
+    capacity = get_capacity_index(
+        min([today] + [start for start, _ in windows.values()]),
+        max(end for _, end in windows.values())
+    )
+    
+    results = []
+    cumulative_demand = 0
+    for task in sorted(tasks, key=lambda t: (windows[t['id']][1], -t['priority'], t['id'])):
+        start_date, end_date = windows[task['id']]
+        required = task['estimated_hours'] or 0
+        
+        available = capacity.free_hours(start_date, end_date) + capacity.task_hours(task['id'], start_date, end_date)
+        cumulative_demand += max(required - task['completed_hours'], 0)
+        cumulative_capacity = capacity.free_hours(today, end_date) + capacity.scheduled_hours(today, end_date)
+        
+        results.append({
+            "task_id": task['id'],
+            "title": task['title'],
+            "deadline": task['deadline'],
+            "priority": task['priority'],
+            "required_hours": required,
+            "available_hours": round(available, 2),
+            "feasible": available >= required,
+            "shortfall": round(max(0, required - available), 2),
+            "cumulative_demand": round(cumulative_demand, 2),
+            "cumulative_capacity": round(cumulative_capacity, 2),
+            "edf_feasible": cumulative_demand <= cumulative_capacity
+        })
+    
+    at_risk = sum(1 for r in results if not (r['feasible'] and r['edf_feasible']))
+    return {
+        "tasks": results,
+        "summary": {
+            "total": len(results),
+            "feasible": len(results) - at_risk,
+            "at_risk": at_risk
+        }
+    }
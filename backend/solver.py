@@ -0,0 +1,209 @@
+"""
+Global scheduling solver - plans every pending task at once
+
+Alternative to the one-task-at-a-time greedy planner. Tasks are ordered by
+deadline (earliest deadline first); a weighted Moore-Hodgson pass admits as
+many as the free work time before each deadline allows, dropping the lowest
+priority (then largest) task whenever the admitted demand overflows. Admitted
+tasks are placed first, in deadline order, so low-priority work with an early
+start can no longer take the gaps an urgent task needs; dropped tasks then get
+whatever time is left, highest priority first.
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple
+from planning import MAX_SESSION_HOURS
+
+
+# Gap lengths are tracked in float hours; anything below this is used up
+EPSILON_HOURS = 1e-6
+
+
+class GapTable:
+    """
+    Free work gaps of the horizon in date order, consumed from the front
+    
+    Gaps too short for any pending task are unlinked with a union-find
+    "next live gap" pointer, so later tasks skip them in near-constant time.
+    """
+    
+    def __init__(self, gaps: List[Tuple[datetime, datetime]], min_useful_hours: float):
+        self.cursor = [gap_start for gap_start, _ in gaps]
+        self.left = [(gap_end - gap_start).total_seconds() / 3600 for gap_start, gap_end in gaps]
+        self.dates = [gap_start.date() for gap_start, _ in gaps]
+        self.min_useful_hours = max(min_useful_hours, EPSILON_HOURS)
+        self._next = list(range(len(gaps) + 1))
+        
+        for position, hours in enumerate(self.left):
+            if hours < self.min_useful_hours:
+                self._next[position] = position + 1
+    
+    def _find(self, position: int) -> int:
+        root = position
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[position] != root:
+            self._next[position], position = root, self._next[position]
+        return root
+    
+    def hours_between(self, start_date: date, end_date: date) -> float:
+        """Free hours left in gaps dated start_date..end_date"""
+        low = bisect_left(self.dates, start_date)
+        high = bisect_right(self.dates, end_date)
+        return sum(self.left[low:high])
+    
+    def place(self, task: Dict, start_date: date, end_date: date) -> Tuple[List[Dict], float]:
+        """
+        Fill the task's window front to back, same session rules as create_task_sessions
+        Returns (list of session dicts, remaining_hours)
+        """
+        min_session_hours = task.get('min_session_hours', 2.0)
+        remaining = task['estimated_hours']
+        sessions = []
+        
+        position = self._find(bisect_left(self.dates, start_date))
+        high = bisect_right(self.dates, end_date)
+        
+        while remaining > 0 and position < high:
+            available = self.left[position]
+            if available >= min_session_hours:
+                duration = min(MAX_SESSION_HOURS, available, remaining)
+                session_start = self.cursor[position]
+                session_end = session_start + timedelta(hours=duration)
+                
+                sessions.append({
+                    'task_id': task['id'],
+                    'start_datetime': session_start.isoformat(),
+                    'end_datetime': session_end.isoformat(),
+                    'source': 'auto',
+                    'is_override': 0
+                })
+                
+                self.cursor[position] = session_end
+                self.left[position] = available - duration
+                remaining -= duration
+                if remaining < EPSILON_HOURS:
+                    remaining = 0
+                
+                if self.left[position] < self.min_useful_hours:
+                    self._next[position] = position + 1
+            
+            # At most one session per gap, as in the greedy planner
+            position = self._find(position + 1)
+        
+        return sessions, remaining
+
+
+def admit_by_deadline(tasks: List[Dict], windows: Dict[int, Tuple[date, date]],
+                      gaps: GapTable) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Weighted Moore-Hodgson admission over cumulative free hours
+    
+    Walks tasks in deadline order keeping a running demand; whenever demand
+    exceeds the free hours from the horizon start to the current deadline, the
+    admitted task with the lowest priority (largest estimate on ties) is dropped.
+    Start dates are not modelled here - placement catches those.
+    Returns (admitted, rejected), admitted in deadline order
+    """
+    horizon_start = min(start for start, _ in windows.values())
+    order = sorted(tasks, key=lambda t: (windows[t['id']][1], -t['priority'], windows[t['id']][0], t['id']))
+    
+    heap = []
+    demand = 0.0
+    rejected_ids = set()
+    capacity_cache = {}
+    
+    for task in order:
+        end_date = windows[task['id']][1]
+        heapq.heappush(heap, (task['priority'], -task['estimated_hours'], -task['id'], task['id']))
+        demand += task['estimated_hours']
+        
+        if end_date not in capacity_cache:
+            capacity_cache[end_date] = gaps.hours_between(horizon_start, end_date)
+        
+        while heap and demand > capacity_cache[end_date] + EPSILON_HOURS:
+            _, negative_hours, _, task_id = heapq.heappop(heap)
+            demand += negative_hours
+            rejected_ids.add(task_id)
+    
+    admitted = [task for task in order if task['id'] not in rejected_ids]
+    rejected = sorted(
+        (task for task in order if task['id'] in rejected_ids),
+        key=lambda t: (-t['priority'], windows[t['id']][1], t['id'])
+    )
+    return admitted, rejected
+
+
+def solve_schedule(tasks: List[Dict], windows: Dict[int, Tuple[date, date]],
+                   available_slots: List[Tuple[datetime, datetime]], busy) -> Dict:
+    """
+    Plan all tasks together against the busy index
+    Same result shape as scheduling.plan_tasks_greedy, plus an 'infeasible' list
+    of tasks that cannot be fully placed before their deadline
+    
+    Tasks rejected by admission are not dropped: they are placed after the
+    admitted ones and take whatever gaps are left. When the horizon is
+    overbooked there may be none, so they end up in 'failed' with nothing
+    placed - the trade-off for completing the admitted tasks in full.
+    """
+    gap_list = []
+    for slot_start, slot_end in available_slots:
+        gap_list.extend(busy.free_gaps(slot_start, slot_end))
+    
+    min_useful_hours = min((task.get('min_session_hours', 2.0) for task in tasks), default=0)
+    gaps = GapTable(gap_list, min_useful_hours)
+    
+    admitted, rejected = admit_by_deadline(tasks, windows, gaps)
+    
+    scheduled = []
+    partial = []
+    failed = []
+    infeasible = []
+    all_sessions = []
+    
+    for task in admitted + rejected:
+        start_date, end_date = windows[task['id']]
+        sessions, remaining = gaps.place(task, start_date, end_date)
+        all_sessions.extend(sessions)
+        
+        if remaining == 0:
+            scheduled.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'sessions': len(sessions)
+            })
+            continue
+        
+        scheduled_hours = round(task['estimated_hours'] - remaining, 2)
+        if sessions:
+            partial.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'scheduled_hours': scheduled_hours,
+                'remaining_hours': round(remaining, 2)
+            })
+        else:
+            failed.append({
+                'task_id': task['id'],
+                'title': task['title'],
+                'reason': 'No free time left in the task window'
+            })
+        
+        infeasible.append({
+            'task_id': task['id'],
+            'title': task['title'],
+            'deadline': task['deadline'],
+            'priority': task['priority'],
+            'required_hours': task['estimated_hours'],
+            'scheduled_hours': scheduled_hours,
+            'shortfall_hours': round(remaining, 2)
+        })
+    
+    return {
+        "sessions": all_sessions,
+        "scheduled": scheduled,
+        "partial": partial,
+        "failed": failed,
+        "infeasible": infeasible
+    }
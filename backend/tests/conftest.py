@@ -0,0 +1,50 @@
+"""
+Test setup - run the backend against a throwaway database
+
+database.py opens ../data/tasks.db relative to the working directory when it is
+first imported, so switch into a temporary directory before any backend module
+is loaded.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_workdir = Path(tempfile.mkdtemp(prefix='task-manager-tests-')) / 'backend'
+_workdir.mkdir()
+os.chdir(_workdir)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def task(client):
+    """A task with a project, for slot tests"""
+    project = client.post('/projects', json={'name': 'Tests'}).json()
+    response = client.post('/tasks', json={
+        'title': 'Test task', 'project_id': project['id'], 'estimated_hours': 4
+    })
+    return response.json()
+
+
+@pytest.fixture
+def calendar(client):
+    """Restore the calendar settings changed by a test"""
+    original = client.get('/settings/calendar').json()
+    yield
+    client.patch('/settings/calendar', json={
+        key: original[key] for key in (
+            'work_schedule', 'custom_days', 'work_start_time', 'work_end_time',
+            'excluded_dates', 'excluded_ranges'
+        ) if original.get(key) is not None
+    })
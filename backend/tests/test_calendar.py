@@ -0,0 +1,18 @@
+"""Work calendar cache tests"""
+
+
+def test_calendar_cache_follows_the_settings_row(client, calendar):
+    from database import db
+    from work_calendar import get_work_calendar
+    
+    cached = get_work_calendar()
+    assert get_work_calendar() is cached
+    
+    # Any write moves the data version on; the calendar is kept unless its row changed
+    client.post('/projects', json={'name': 'Unrelated'})
+    assert get_work_calendar() is cached
+    
+    # No version bump or explicit invalidation needed
+    db.update('calendar_settings', {'work_start_time': '07:45'}, 'id = 1')
+    assert get_work_calendar().work_start.strftime('%H:%M') == '07:45'
+    assert client.get('/settings/calendar').json()['work_start_time'] == '07:45'
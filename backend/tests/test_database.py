@@ -0,0 +1,46 @@
+"""Database tests - trigger-maintained aggregates"""
+import pytest
+
+
+def direct_hours(db, task_id: int) -> dict:
+    return db.execute_one("""
+        SELECT COUNT(*) as slot_count,
+               COALESCE(SUM((julianday(end_datetime) - julianday(start_datetime)) * 24), 0) as scheduled_hours,
+               COALESCE(SUM(CASE WHEN completed = 1
+                   THEN (julianday(end_datetime) - julianday(start_datetime)) * 24 END), 0) as completed_hours
+        FROM scheduled_slots WHERE task_id = ?
+    """, (task_id,))
+
+
+def assert_task_hours_match(db, *task_ids: int):
+    for task_id in task_ids:
+        expected = direct_hours(db, task_id)
+        stored = db.execute_one("SELECT * FROM task_hours WHERE task_id = ?", (task_id,)) or {
+            'slot_count': 0, 'scheduled_hours': 0, 'completed_hours': 0
+        }
+        assert stored['slot_count'] == expected['slot_count']
+        assert stored['scheduled_hours'] == pytest.approx(expected['scheduled_hours'], abs=1e-6)
+        assert stored['completed_hours'] == pytest.approx(expected['completed_hours'], abs=1e-6)
+
+
+def test_task_hours_follow_slot_changes(client, task):
+    from database import db
+    
+    other = client.post('/tasks', json={'title': 'Other', 'estimated_hours': 3}).json()
+    first, second = db.insert_many('scheduled_slots', [
+        {'task_id': task['id'], 'start_datetime': '2033-02-01T09:00:00', 'end_datetime': '2033-02-01T11:00:00'},
+        {'task_id': task['id'], 'start_datetime': '2033-02-02T09:00:00', 'end_datetime': '2033-02-02T10:30:00'}
+    ])
+    assert_task_hours_match(db, task['id'], other['id'])
+    
+    db.update('scheduled_slots', {'end_datetime': '2033-02-01T12:15:00', 'completed': 1}, 'id = ?', (first,))
+    assert_task_hours_match(db, task['id'], other['id'])
+    
+    db.update('scheduled_slots', {'task_id': other['id']}, 'id = ?', (second,))
+    assert_task_hours_match(db, task['id'], other['id'])
+    
+    db.delete('scheduled_slots', 'id = ?', (first,))
+    assert_task_hours_match(db, task['id'], other['id'])
+    
+    assert client.delete(f"/tasks/{other['id']}").status_code == 200
+    assert db.execute_one("SELECT * FROM task_hours WHERE task_id = ?", (other['id'],)) is None
@@ -0,0 +1,97 @@
+"""Deadline feasibility - the capacity, interval and grid engines agree"""
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from availability_grid import grid_engine_available
+
+ENGINES = ['capacity', 'interval'] + (['grid'] if grid_engine_available() else [])
+
+
+def quarter(rng: random.Random, first: int, last: int) -> time:
+    """A random quarter-hour time between first:00 and last:00"""
+    minutes = rng.randrange(first * 4, last * 4 + 1) * 15
+    return time(minutes // 60, minutes % 60)
+
+
+def at(day: date, clock: time) -> str:
+    return datetime.combine(day, clock).isoformat()
+
+
+def build_calendar(client, rng: random.Random, window_start: date, window_end: date) -> int:
+    """Random work hours, exclusions, blocked times and slots; returns the task to check"""
+    work_start, work_end = quarter(rng, 8, 10), quarter(rng, 15, 19)
+    excluded = [window_start + timedelta(days=rng.randrange((window_end - window_start).days)) for _ in range(2)]
+    range_start = window_start + timedelta(days=rng.randrange((window_end - window_start).days))
+    client.patch('/settings/calendar', json={
+        'work_schedule': rng.choice(['weekdays', 'all_week', 'custom']),
+        'custom_days': ','.join(rng.sample(['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU'], 4)),
+        'work_start_time': work_start.strftime('%H:%M'),
+        'work_end_time': work_end.strftime('%H:%M'),
+        'excluded_dates': sorted({day.isoformat() for day in excluded}),
+        'excluded_ranges': [{'start_date': range_start.isoformat(),
+                             'end_date': (range_start + timedelta(days=rng.randrange(1, 6))).isoformat()}]
+    })
+    
+    def create_task(title: str, hours: float) -> int:
+        return client.post('/tasks', json={
+            'title': title, 'estimated_hours': hours, 'min_session_hours': 0.5,
+            'start_date': window_start.isoformat(), 'deadline': window_end.isoformat()
+        }).json()['id']
+    
+    task_id = create_task('Checked', rng.choice([4, 12, 30, 80, 200]))
+    other_id = create_task('Other', 10)
+    
+    # A daily block at a fixed time, some of it outside work hours
+    days = (window_end - window_start).days + 1
+    block_start = quarter(rng, 7, 17)
+    block_end = (datetime.combine(window_start, block_start) + timedelta(minutes=rng.choice([30, 60, 90]))).time()
+    client.post('/blocked-times', json={
+        'title': 'Standup', 'start_datetime': at(window_start, block_start),
+        'end_datetime': at(window_start, block_end), 'rrule': f'FREQ=DAILY;COUNT={days}'
+    })
+    
+    # Non-overlapping slots and one-off blocks inside work hours, clear of the daily block
+    for offset in range(days):
+        day = window_start + timedelta(days=offset)
+        cursor = datetime.combine(day, work_start)
+        for _ in range(rng.randrange(4)):
+            start = cursor + timedelta(minutes=15 * rng.randrange(0, 8))
+            end = start + timedelta(minutes=15 * rng.randrange(1, 9))
+            if end > datetime.combine(day, work_end):
+                break
+            if start.time() < block_end and end.time() > block_start:
+                cursor = datetime.combine(day, block_end)
+                continue
+            kind = rng.choice(['own', 'other', 'block'])
+            if kind == 'block':
+                client.post('/blocked-times', json={
+                    'title': 'Meeting', 'start_datetime': start.isoformat(), 'end_datetime': end.isoformat()
+                })
+            else:
+                client.post('/slots/manual', json={
+                    'task_id': task_id if kind == 'own' else other_id,
+                    'start_datetime': start.isoformat(), 'end_datetime': end.isoformat()
+                })
+            cursor = end
+    return task_id
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_engines_agree_on_random_calendars(client, calendar, seed):
+    rng = random.Random(seed)
+    # Each seed gets its own stretch of calendar, clear of the other tests' slots
+    window_start = date.today() + timedelta(days=90 + 60 * seed)
+    window_end = window_start + timedelta(days=rng.randrange(5, 40))
+    task_id = build_calendar(client, rng, window_start, window_end)
+    
+    results = {
+        engine: client.get(f'/schedule/feasibility/{task_id}', params={'engine': engine}).json()
+        for engine in ENGINES
+    }
+    
+    expected = results['capacity']
+    for engine, result in results.items():
+        assert result['available_hours'] == pytest.approx(expected['available_hours'], abs=0.01), engine
+        assert result['feasible'] == expected['feasible'], engine
@@ -0,0 +1,152 @@
+"""Recurring slot and blocked time horizon tests"""
+from datetime import date, timedelta
+
+import pytest
+
+
+class Abort(Exception):
+    pass
+
+
+def test_rolled_back_generation_does_not_advance_horizons(client, task):
+    import block_occurrences
+    import rrule_utils
+    from database import db
+    
+    start = date.today()
+    assert client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=WEEKLY', 'duration_hours': 1,
+        'time_of_day': '06:00', 'start_date': start.isoformat()
+    }).status_code == 200
+    assert client.post('/blocked-times', json={
+        'title': 'Gym', 'start_datetime': f'{start}T05:00:00',
+        'end_datetime': f'{start}T06:00:00', 'rrule': 'FREQ=WEEKLY'
+    }).status_code == 200
+    
+    until = start + timedelta(days=900)
+    with pytest.raises(Abort):
+        with db.transaction():
+            rrule_utils.ensure_recurring_slots(until)
+            block_occurrences.ensure_block_occurrences(until)
+            raise Abort()
+    
+    assert rrule_utils._generated_until is None or rrule_utils._generated_until < until
+    assert block_occurrences._expanded_until is None or block_occurrences._expanded_until < until
+    
+    # Reads expand what was rolled back in memory, without storing it
+    week_start = until - timedelta(days=6)
+    slots = client.get('/slots', params={
+        'start_date': week_start.isoformat(), 'end_date': until.isoformat()
+    }).json()['slots']
+    assert len([slot for slot in slots if slot['task_id'] == task['id']]) == 1
+    assert rrule_utils._generated_until is None or rrule_utils._generated_until < until
+    
+    rrule_utils.ensure_recurring_slots(until)
+    assert rrule_utils._generated_until >= until
+    block_occurrences.ensure_block_occurrences(until)
+    assert block_occurrences._expanded_until >= until
+    assert db.execute_one("""
+        SELECT COUNT(*) as count FROM blocked_time_occurrences o
+        JOIN blocked_times b ON o.block_id = b.id
+        WHERE b.title = 'Gym' AND o.start_datetime >= ?
+    """, (week_start.isoformat(),))['count'] == 1
+
+
+def test_virtual_allocations_count_towards_capacity(client, task):
+    day = date.today() + timedelta(days=2)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    before = client.get('/stats/capacity', params={'from': day.isoformat(), 'to': day.isoformat()}).json()['days'][0]
+    
+    assert client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY', 'duration_hours': 2,
+        'time_of_day': '10:00', 'start_date': day.isoformat(), 'end_date': day.isoformat(),
+        'storage': 'virtual'
+    }).status_code == 200
+    
+    after = client.get('/stats/capacity', params={'from': day.isoformat(), 'to': day.isoformat()}).json()['days'][0]
+    assert after['committed']['allocation'] == before['committed']['allocation'] + 2
+    assert after['committed_hours'] == before['committed_hours'] + 2
+    assert after['free_hours'] == before['free_hours'] - 2
+    
+    mismatches = client.get('/tasks/sanity-check').json()['mismatches']
+    assert task['id'] not in [mismatch['task_id'] for mismatch in mismatches]
+
+
+def test_allocations_of_one_task_generate_independently(client, task):
+    from database import db
+    
+    start = date.today() + timedelta(days=1)
+    allocation_ids = [
+        client.post('/time-allocations', json={
+            'task_id': task['id'], 'rrule': 'FREQ=DAILY;COUNT=3', 'duration_hours': 1,
+            'time_of_day': '18:00', 'start_date': start.isoformat()
+        }).json()['id']
+        for _ in range(2)
+    ]
+    
+    for allocation_id in allocation_ids:
+        assert db.execute_one(
+            "SELECT COUNT(*) as count FROM scheduled_slots WHERE allocation_id = ?", (allocation_id,)
+        )['count'] == 3
+
+
+def test_virtual_instances_are_busy_without_a_busy_index(client, task):
+    from datetime import datetime
+    from email_reminders import generate_daily_deadline_alert
+    from scheduling import get_available_time_in_slot
+    
+    today = date.today()
+    other = client.post('/tasks', json={
+        'title': 'Due today', 'estimated_hours': 1, 'deadline': today.isoformat()
+    }).json()
+    assert client.post('/time-allocations', json={
+        'task_id': other['id'], 'rrule': 'FREQ=DAILY', 'duration_hours': 1,
+        'time_of_day': '23:00', 'start_date': today.isoformat(), 'storage': 'virtual'
+    }).status_code == 200
+    
+    evening = datetime.combine(today, datetime.min.time()) + timedelta(hours=22)
+    assert get_available_time_in_slot(evening, evening + timedelta(hours=2)) == [
+        (evening, evening + timedelta(hours=1))
+    ]
+    assert '1.0h scheduled today' in generate_daily_deadline_alert()
+
+
+def test_split_keeps_moved_and_deleted_instances_at_the_new_time(client, task):
+    from scheduling import find_schedule_overlaps
+    
+    day = date.today() + timedelta(days=20)
+    assert client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY', 'duration_hours': 1, 'time_of_day': '19:00',
+        'start_date': day.isoformat(), 'end_date': (day + timedelta(days=4)).isoformat()
+    }).status_code == 200
+    slots = sorted(
+        (slot for slot in client.get('/slots', params={
+            'start_date': day.isoformat(), 'end_date': (day + timedelta(days=4)).isoformat()
+        }).json()['slots'] if slot['task_id'] == task['id']),
+        key=lambda slot: slot['start_datetime']
+    )
+    assert len(slots) == 5
+    
+    # Move the third instance to 21:00 and delete the fourth, then move the
+    # pattern from the second onwards to 20:00
+    moved_day, deleted_day = day + timedelta(days=2), day + timedelta(days=3)
+    assert client.put(f"/slots/{slots[2]['id']}/move", json={'new_start': f'{moved_day}T21:00:00'}).json()['success']
+    assert client.delete(f"/slots/{slots[3]['id']}").status_code == 200
+    split = client.put(f"/slots/{slots[1]['id']}/edit-recurrence", json={
+        'mode': 'this_and_future', 'time_of_day': '20:00'
+    }).json()
+    
+    new_slots = [
+        slot for slot in client.get('/slots', params={
+            'start_date': day.isoformat(), 'end_date': (day + timedelta(days=4)).isoformat()
+        }).json()['slots'] if slot['task_id'] == split['new_task_id']
+    ]
+    # No 20:00 instance next to the moved one, and the deleted one stays deleted
+    assert sorted(slot['start_datetime'] for slot in new_slots) == [
+        f'{day + timedelta(days=1)}T20:00:00', f'{moved_day}T21:00:00', f'{day + timedelta(days=4)}T20:00:00'
+    ]
+    assert not [
+        finding for finding in find_schedule_overlaps()
+        if finding['type'] == 'double_booked' and finding['task_id'] == split['new_task_id']
+    ]
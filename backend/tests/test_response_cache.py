@@ -0,0 +1,37 @@
+"""Conditional GET and response cache tests"""
+
+
+def test_etag_answers_304_until_a_write(client):
+    first = client.get('/projects')
+    etag = first.headers['ETag']
+    
+    assert client.get('/projects', headers={'If-None-Match': etag}).status_code == 304
+    hits = client.get('/stats/response-cache').json()['hits']
+    assert client.get('/projects').json() == first.json()
+    assert client.get('/stats/response-cache').json()['hits'] == hits + 1
+    
+    project = client.post('/projects', json={'name': 'Cache test'}).json()
+    
+    changed = client.get('/projects', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert project['id'] in [row['id'] for row in changed.json()['projects']]
+    assert client.get('/projects', headers={'If-None-Match': changed.headers['ETag']}).status_code == 304
+
+
+def test_slot_write_invalidates_cached_slots(client, task):
+    params = {'start_date': '2034-06-05', 'end_date': '2034-06-05'}
+    before = client.get('/slots', params=params)
+    assert task['id'] not in [slot['task_id'] for slot in before.json()['slots']]
+    
+    assert client.post('/slots/manual', json={
+        'task_id': task['id'], 'start_datetime': '2034-06-05T09:00:00', 'end_datetime': '2034-06-05T10:00:00'
+    }).json()['success']
+    
+    after = client.get('/slots', params=params, headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert task['id'] in [slot['task_id'] for slot in after.json()['slots']]
+    
+    # Query parameters are part of the tag
+    other_day = client.get('/slots', params={**params, 'end_date': '2034-06-06'})
+    assert other_day.headers['ETag'] != after.headers['ETag']
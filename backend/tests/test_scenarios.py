@@ -0,0 +1,61 @@
+"""Scenario planning tests"""
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import BACKEND_DIR
+
+
+@pytest.fixture
+def scenario_pool():
+    import scenarios
+    yield scenarios
+    scenarios.shutdown_scenario_pool()
+
+
+def test_worker_module_does_not_import_database():
+    output = subprocess.run(
+        [sys.executable, '-c', "import sys, scenario_worker; print('database' in sys.modules)"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == 'False'
+
+
+def test_scenarios_share_one_pool(client, task, scenario_pool):
+    request = {'scenarios': [{'name': 'time off', 'time_off': [
+        {'start_date': '2031-01-06', 'end_date': '2031-01-10'}
+    ]}]}
+    
+    first = client.post('/schedule/scenarios', json=request).json()
+    pool = scenario_pool._pool
+    second = client.post('/schedule/scenarios', json=request).json()
+    
+    assert [result['name'] for result in first['scenarios']] == ['baseline', 'time off']
+    assert not any('error' in result for result in first['scenarios'] + second['scenarios'])
+    assert scenario_pool._pool is pool
+
+
+def test_overrunning_worker_is_replaced_alone(scenario_pool):
+    pool = scenario_pool.ScenarioPool(2)
+    try:
+        with ThreadPoolExecutor(max_workers=2) as dispatch:
+            other = dispatch.submit(pool.run, time.sleep, (1,), 5)
+            with pytest.raises(TimeoutError):
+                pool.run(time.sleep, (60,), 0.2)
+            assert other.result() is None
+        assert len(pool._workers) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_timeout_starts_when_a_worker_is_free(scenario_pool):
+    pool = scenario_pool.ScenarioPool(1)
+    try:
+        with ThreadPoolExecutor(max_workers=3) as dispatch:
+            calls = [dispatch.submit(pool.run, time.sleep, (0.3,), 0.6) for _ in range(3)]
+            assert [call.result() for call in calls] == [None] * 3
+    finally:
+        pool.shutdown()
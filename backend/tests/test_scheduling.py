@@ -0,0 +1,89 @@
+"""Scheduling engine tests"""
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def workday(client, calendar):
+    """A far-off day in an every-day 09:00-17:00 calendar"""
+    client.patch('/settings/calendar', json={
+        'work_schedule': 'all_week', 'work_start_time': '09:00', 'work_end_time': '17:00',
+        'excluded_dates': [], 'excluded_ranges': []
+    })
+    return date.today() + timedelta(days=1000)
+
+
+def schedule_state(db) -> tuple:
+    return (
+        db.execute("SELECT * FROM scheduled_slots ORDER BY id"),
+        db.execute_one("SELECT MAX(id) as id FROM schedule_changes")['id'],
+        db.data_version()
+    )
+
+
+def test_bumping_dry_run_writes_nothing_and_matches_the_real_run(client, workday):
+    from database import db
+    from block_occurrences import ensure_block_occurrences
+    from scheduling import attempt_with_bumping
+    
+    low = client.post('/tasks', json={
+        'title': 'Low', 'priority': 1, 'estimated_hours': 8, 'min_session_hours': 1,
+        'start_date': workday.isoformat(), 'deadline': (workday + timedelta(days=3)).isoformat()
+    }).json()
+    assert client.post('/slots/manual', json={
+        'task_id': low['id'], 'start_datetime': f'{workday}T09:00:00', 'end_datetime': f'{workday}T17:00:00'
+    }).json()['success']
+    high = client.post('/tasks', json={
+        'title': 'High', 'priority': 5, 'estimated_hours': 2, 'min_session_hours': 1,
+        'start_date': workday.isoformat(), 'deadline': workday.isoformat()
+    }).json()
+    
+    # Blocked-time occurrences are expanded as far as any read reaches; do
+    # that first so only the plan itself is compared
+    ensure_block_occurrences(workday + timedelta(days=30))
+    
+    before = schedule_state(db)
+    plan = attempt_with_bumping(high['id'], dry_run=True)
+    assert schedule_state(db) == before
+    assert plan['method'] == 'with_bumping' and plan['bumped_tasks'] == [low['id']]
+    
+    result = attempt_with_bumping(high['id'])
+    assert result['bumped_tasks'] == plan['bumped_tasks']
+    assert result['rescheduled'] == plan['rescheduled']
+    
+    def times(task_id: int) -> list:
+        return [
+            (row['start_datetime'], row['end_datetime']) for row in db.execute("""
+                SELECT start_datetime, end_datetime FROM scheduled_slots WHERE task_id = ? ORDER BY start_datetime
+            """, (task_id,))
+        ]
+    assert times(high['id']) == [(s['start_datetime'], s['end_datetime']) for s in plan['sessions']]
+    assert times(low['id']) == sorted(
+        (s['start_datetime'], s['end_datetime']) for s in plan['rescheduled_sessions'][low['id']]
+    )
+
+
+def test_solver_gives_rejected_tasks_the_leftover_time():
+    from datetime import datetime, time
+    from busy_index import BusyIndex
+    from solver import solve_schedule
+    
+    first = date.today() + timedelta(days=1)
+    days = [first + timedelta(days=offset) for offset in range(3)]
+    available_slots = [(datetime.combine(day, time(9)), datetime.combine(day, time(17))) for day in days]
+    busy = BusyIndex.from_intervals(available_slots[0][0], available_slots[-1][1], [])
+    
+    # 28h demanded, 24h free: the low-priority task is rejected by admission
+    tasks = [
+        {'id': 1, 'title': 'Urgent', 'priority': 5, 'estimated_hours': 12, 'min_session_hours': 1,
+         'deadline': days[-1].isoformat()},
+        {'id': 2, 'title': 'Later', 'priority': 1, 'estimated_hours': 16, 'min_session_hours': 1,
+         'deadline': days[-1].isoformat()}
+    ]
+    plan = solve_schedule(tasks, {task['id']: (first, days[-1]) for task in tasks}, available_slots, busy)
+    
+    assert [entry['task_id'] for entry in plan['scheduled']] == [1]
+    assert plan['partial'] == [{'task_id': 2, 'title': 'Later', 'scheduled_hours': 12, 'remaining_hours': 4}]
+    assert plan['failed'] == []
+    assert [entry['task_id'] for entry in plan['infeasible']] == [2]
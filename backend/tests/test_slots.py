@@ -0,0 +1,285 @@
+"""Slot endpoint tests"""
+from datetime import date, timedelta
+
+
+def test_conflict_check_accepts_utc_intervals(client, task):
+    slot = client.post('/slots/manual', json={
+        'task_id': task['id'],
+        'start_datetime': '2031-03-04T10:00:00',
+        'end_datetime': '2031-03-04T12:00:00'
+    }).json()
+    assert slot['success']
+    
+    response = client.post('/slots/conflicts', json={'intervals': [
+        {'start_datetime': '2031-03-04T11:00:00Z', 'end_datetime': '2031-03-04T13:00:00Z'},
+        {'start_datetime': '2031-03-04T12:00:00Z', 'end_datetime': '2031-03-04T13:00:00Z'}
+    ]})
+    
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert results[0]['has_conflict']
+    assert results[0]['start_datetime'] == '2031-03-04T11:00:00'
+    assert not results[1]['has_conflict']
+    assert response.json()['conflict_count'] == 1
+
+
+def test_offset_slots_load_into_busy_index(client, task):
+    day = date.today() + timedelta(days=3)
+    # /slots/manual stores aware inputs with their +00:00 offset
+    slot = client.post('/slots/manual', json={
+        'task_id': task['id'],
+        'start_datetime': f'{day}T09:00:00Z',
+        'end_datetime': f'{day}T10:00:00Z'
+    }).json()
+    assert slot['success']
+    client.post('/slots/manual', json={
+        'task_id': task['id'],
+        'start_datetime': f'{day}T10:00:00',
+        'end_datetime': f'{day}T11:00:00'
+    })
+    
+    assert client.get('/stats/capacity').status_code == 200
+    assert client.get('/schedule/feasibility').status_code == 200
+    assert client.get(f"/schedule/feasibility/{task['id']}").status_code == 200
+    assert client.post('/schedule/auto').status_code == 200
+    
+    response = client.post('/slots/conflicts', json={'intervals': [
+        {'start_datetime': f'{day}T09:30:00', 'end_datetime': f'{day}T09:45:00'}
+    ]})
+    assert response.json()['results'][0]['has_conflict']
+
+
+def test_slots_far_ahead_include_recurring_instances(client, task):
+    start = date.today()
+    response = client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY', 'duration_hours': 1,
+        'time_of_day': '07:00', 'start_date': start.isoformat()
+    })
+    assert response.status_code == 200
+    
+    from rrule_utils import recurring_horizon
+    week_start = recurring_horizon() + timedelta(days=60)
+    slots = client.get('/slots', params={
+        'start_date': week_start.isoformat(),
+        'end_date': (week_start + timedelta(days=6)).isoformat()
+    }).json()['slots']
+    
+    instances = [slot for slot in slots if slot['task_id'] == task['id']]
+    assert [slot['start_datetime'][:10] for slot in instances] == [
+        (week_start + timedelta(days=offset)).isoformat() for offset in range(7)
+    ]
+    
+    # Past the rolling horizon they are expanded on read, not stored
+    from database import db
+    assert db.execute_one(
+        "SELECT COUNT(*) as count FROM scheduled_slots WHERE task_id = ? AND start_datetime >= ?",
+        (task['id'], week_start.isoformat())
+    )['count'] == 0
+
+
+def test_instances_past_the_horizon_can_be_moved_onto_and_swapped(client, task):
+    from rrule_utils import recurring_horizon
+    day = recurring_horizon() + timedelta(days=90)
+    allocation = client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY;COUNT=1', 'duration_hours': 1,
+        'time_of_day': '16:00', 'start_date': day.isoformat()
+    }).json()
+    other = client.post('/tasks', json={'title': 'Movable', 'estimated_hours': 1}).json()
+    slot_id = client.post('/slots/manual', json={
+        'task_id': other['id'], 'start_datetime': f'{day}T14:00:00', 'end_datetime': f'{day}T15:00:00'
+    }).json()['slot_id']
+
+    # The instance has no slot row: the conflict names it by allocation and original start
+    moved = client.put(f'/slots/{slot_id}/move', json={'new_start': f'{day}T16:00:00'}).json()
+    assert moved['conflict'] and moved['conflicting_slot']['id'] is None
+    assert moved['conflicting_slot']['allocation_id'] == allocation['id']
+
+    # ...which is what the frontend detaches before swapping
+    detached = client.post(f"/time-allocations/{allocation['id']}/instances/detach", json={
+        'original_start': moved['conflicting_slot']['original_start']
+    }).json()['slot']
+    assert client.put(f"/slots/{slot_id}/move-with-swap", params={'swap_with_id': detached['id']},
+                      json={'new_start': f'{day}T16:00:00'}).status_code == 200
+    slots = client.get('/slots', params={'start_date': day.isoformat(), 'end_date': day.isoformat()}).json()['slots']
+    assert sorted((slot['task_id'], slot['start_datetime'][11:16]) for slot in slots
+                  if slot['task_id'] in (task['id'], other['id'])) == [
+        (task['id'], '14:00'), (other['id'], '16:00')
+    ]
+
+
+def test_fill_and_pack_report_exact_durations(client, task):
+    gap_day = date.today() + timedelta(days=500)
+    later = gap_day + timedelta(days=3)
+    for start, end in (('09:00', '11:00'), ('13:00', '15:00')):
+        assert client.post('/slots/manual', json={
+            'task_id': task['id'],
+            'start_datetime': f'{later}T{start}:00',
+            'end_datetime': f'{later}T{end}:00'
+        }).json()['success']
+    
+    fill = client.get('/slots/fill-suggestions', params={
+        'start_time': f'{gap_day}T09:00:00Z', 'end_time': f'{gap_day}T13:00:00Z', 'limit': 50, 'lookahead_days': 5
+    }).json()
+    assert [suggestion['duration'] for suggestion in fill['suggestions']
+            if suggestion['task_id'] == task['id']] == [2.0, 2.0]
+    
+    for pack in (True, False):
+        suggestions = client.post('/schedule/reallocate-now', json={
+            'available_start': f'{gap_day}T09:00:00', 'available_end': f'{gap_day}T13:00:00', 'pack': pack
+        }).json()['suggestions']
+        assert suggestions
+        for suggestion in suggestions:
+            # No julianday noise such as 1.9999999981373549
+            assert suggestion['duration_hours'] == round(suggestion['duration_hours'], 6)
+            assert suggestion['new_end'].endswith(':00')
+
+
+def test_pack_gap_fills_gaps_off_the_quarter_hour():
+    from scheduling import pack_gap
+    
+    assert pack_gap([(100 / 60, 10, 'a')], 100 / 60) == {100: (10, ['a'])}
+    packings = pack_gap([(50 / 60, 5, 'a'), (50 / 60, 4, 'b'), (1, 9, 'c')], 100 / 60)
+    assert sorted(packings[100][1]) == ['a', 'b']
+    assert 110 not in packings
+
+
+def test_reschedule_window_counts_only_kept_movable_sessions(client):
+    from scheduling import reschedule_task_window
+    
+    start = date.today() + timedelta(days=700)
+    while start.weekday() != 0:
+        start += timedelta(days=1)
+    task = client.post('/tasks', json={
+        'title': 'Window', 'estimated_hours': 2, 'min_session_hours': 1,
+        'start_date': start.isoformat(), 'deadline': (start + timedelta(days=4)).isoformat()
+    }).json()
+    assert client.post('/slots/manual', json={
+        'task_id': task['id'], 'is_fixed': True,
+        'start_datetime': f'{start}T06:00:00', 'end_datetime': f'{start}T07:00:00'
+    }).json()['success']
+    assert client.post(f"/schedule/task/{task['id']}").status_code == 200
+    
+    result = reschedule_task_window(task['id'])
+    assert (result['kept'], result['removed'], result['added']) == (1, 0, 0)
+
+
+def test_overlap_sweep_pairs(client, task):
+    from database import db
+    from scheduling import find_schedule_overlaps
+    
+    day = date.today() + timedelta(days=900)
+    
+    def slot(start: str, end: str) -> int:
+        return db.insert('scheduled_slots', {
+            'task_id': task['id'], 'start_datetime': f'{day}T{start}', 'end_datetime': f'{day}T{end}',
+            'source': 'manual'
+        })
+    
+    # Adjacent (one end written with a UTC suffix), nested, and three-way
+    adjacent = [slot('06:00:00', '07:00:00Z'), slot('07:00:00', '08:00:00')]
+    outer, inner = slot('09:00:00', '13:00:00'), slot('10:00:00', '11:00:00')
+    three = [slot('14:00:00', '16:00:00'), slot('14:30:00', '15:30:00'), slot('15:00:00.500000', '17:00:00')]
+    ids = set(adjacent + [outer, inner] + three)
+    
+    pairs = {
+        frozenset((finding['slot_id'], finding['other_slot_id'])): finding
+        for finding in find_schedule_overlaps()
+        if finding['type'] == 'double_booked' and finding['slot_id'] in ids
+    }
+    assert set(pairs) == {
+        frozenset((outer, inner)),
+        frozenset(three[:2]), frozenset(three[::2]), frozenset(three[1:])
+    }
+    assert pairs[frozenset((outer, inner))]['overlap_start'] == f'{day}T10:00:00'
+    assert pairs[frozenset(three[1:])]['overlap_end'] == f'{day}T15:30:00'
+    
+    db.delete('scheduled_slots', f"id IN ({','.join('?' * len(ids))})", tuple(ids))
+
+
+def test_overlap_sweep_includes_virtual_instances(client, task):
+    from database import db
+    from scheduling import find_schedule_overlaps
+
+    day = date.today() + timedelta(days=10)
+    allocation = client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY;COUNT=1', 'duration_hours': 1,
+        'time_of_day': '20:00', 'start_date': day.isoformat(), 'storage': 'virtual'
+    }).json()
+    slot_id = db.insert('scheduled_slots', {
+        'task_id': task['id'], 'start_datetime': f'{day}T20:30:00', 'end_datetime': f'{day}T21:30:00',
+        'source': 'manual'
+    })
+
+    findings = [finding for finding in find_schedule_overlaps() if finding.get('other_slot_id') == slot_id]
+    assert len(findings) == 1
+    # The instance has no slot row; it is named the way the instance endpoints take it
+    assert findings[0]['slot_id'] is None
+    assert findings[0]['allocation_id'] == allocation['id']
+    assert findings[0]['original_start'] == f'{day}T20:00:00'
+    assert findings[0]['overlap_start'] == f'{day}T20:30:00'
+
+    db.delete('scheduled_slots', 'id = ?', (slot_id,))
+
+
+def manual_slot(client, task_id: int, day: date, start: str, end: str) -> int:
+    response = client.post('/slots/manual', json={
+        'task_id': task_id, 'start_datetime': f'{day}T{start}:00', 'end_datetime': f'{day}T{end}:00'
+    }).json()
+    assert response['success']
+    return response['slot_id']
+
+
+def slot_times(slot_id: int) -> tuple:
+    from database import db
+    row = db.execute_one("SELECT start_datetime, end_datetime FROM scheduled_slots WHERE id = ?", (slot_id,))
+    return row['start_datetime'][11:16], row['end_datetime'][11:16]
+
+
+def test_bulk_operations_roll_back_together(client, task):
+    day = date.today() + timedelta(days=910)
+    first, second, third = (manual_slot(client, task['id'], day, start, end)
+                            for start, end in (('12:00', '13:00'), ('14:00', '15:00'), ('16:00', '17:00')))
+    
+    response = client.post('/slots/bulk', json={'operations': [
+        {'op': 'move', 'slot_id': first, 'shift_minutes': 30},
+        {'op': 'fix', 'slot_id': second},
+        {'op': 'move', 'slot_id': third, 'new_start': f'{day}T14:30:00'}
+    ]})
+    assert response.status_code == 409
+    assert [result['success'] for result in response.json()['detail']['results']] == [True, True, False]
+    assert [slot_times(slot_id) for slot_id in (first, second, third)] == [
+        ('12:00', '13:00'), ('14:00', '15:00'), ('16:00', '17:00')
+    ]
+    from database import db
+    assert not db.execute_one("SELECT is_fixed FROM scheduled_slots WHERE id = ?", (second,))['is_fixed']
+
+
+def test_bulk_move_swaps_two_slots(client, task):
+    day = date.today() + timedelta(days=911)
+    first, second = manual_slot(client, task['id'], day, '09:00', '10:00'), manual_slot(client, task['id'], day, '10:00', '11:00')
+    
+    response = client.post('/slots/bulk', json={'operations': [
+        {'op': 'move', 'slot_id': first, 'new_start': f'{day}T10:00:00'},
+        {'op': 'move', 'slot_id': second, 'new_start': f'{day}T09:00:00'}
+    ]})
+    assert response.status_code == 200 and response.json()['applied']
+    assert [slot_times(first), slot_times(second)] == [('10:00', '11:00'), ('09:00', '10:00')]
+
+
+def test_bulk_delete_of_recurring_instance_records_exception(client, task):
+    from database import db
+    
+    start = date.today() + timedelta(days=2)
+    allocation_id = client.post('/time-allocations', json={
+        'task_id': task['id'], 'rrule': 'FREQ=DAILY;COUNT=3', 'duration_hours': 1,
+        'time_of_day': '05:00', 'start_date': start.isoformat()
+    }).json()['id']
+    instance = db.execute_one("""
+        SELECT id, start_datetime FROM scheduled_slots WHERE allocation_id = ? ORDER BY start_datetime LIMIT 1
+    """, (allocation_id,))
+    
+    response = client.post('/slots/bulk', json={'operations': [{'op': 'delete', 'slot_id': instance['id']}]})
+    assert response.status_code == 200 and response.json()['applied']
+    assert db.execute_one("""
+        SELECT kind FROM recurring_exceptions WHERE allocation_id = ? AND original_start = ?
+    """, (allocation_id, instance['start_datetime']))['kind'] == 'deleted'
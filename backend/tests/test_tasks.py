@@ -0,0 +1,34 @@
+"""Task endpoint tests"""
+
+
+def test_unknown_project_is_rejected(client, task):
+    response = client.post('/tasks', json={'title': 'Orphan', 'estimated_hours': 1, 'project_id': 999999})
+    assert response.status_code == 404
+    
+    response = client.patch(f"/tasks/{task['id']}", json={'project_id': 999999})
+    assert response.status_code == 404
+    assert client.get(f"/tasks/{task['id']}").json()['project_id'] == task['project_id']
+
+
+def test_date_change_returns_rescheduling_result(client, task):
+    from datetime import date, timedelta
+    assert client.post(f"/schedule/task/{task['id']}").status_code == 200
+    
+    deadline = (date.today() + timedelta(days=90)).isoformat()
+    response = client.patch(f"/tasks/{task['id']}", json={'deadline': deadline})
+    assert response.status_code == 200
+    assert response.json()['deadline'] == deadline
+    assert set(response.json()['rescheduling']) >= {'kept', 'removed', 'added', 'scheduled'}
+
+
+def test_failed_reschedule_rolls_back_the_update(client, task, monkeypatch):
+    import scheduling
+    
+    def fail(task_id):
+        raise scheduling.SchedulingError("no room")
+    monkeypatch.setattr(scheduling, 'reschedule_task_window', fail)
+    
+    response = client.patch(f"/tasks/{task['id']}", json={'deadline': '2040-01-01', 'title': 'Renamed'})
+    assert response.status_code == 400
+    unchanged = client.get(f"/tasks/{task['id']}").json()
+    assert (unchanged['deadline'], unchanged['title']) == (task['deadline'], task['title'])
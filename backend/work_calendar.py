@@ -0,0 +1,144 @@
+"""
+Work calendar - work windows derived from calendar settings, cached per settings version
+
+The settings row is read and parsed once per settings version; excluded dates and
+excluded ranges (e.g. a two-week vacation) are merged into sorted date spans, so
+checking a day is a bisect and a long exclusion is skipped in one step. The cache
+is checked against the database's data version, so no writer has to drop it.
+"""
+import json
+import threading
+from bisect import bisect_right
+from datetime import datetime, date, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+WORK_SCHEDULES = {
+    'weekdays': 'MO,TU,WE,TH,FR',
+    'all_week': 'MO,TU,WE,TH,FR,SA,SU',
+}
+DAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+_calendar = None
+_calendar_data_version = None
+_calendar_lock = threading.Lock()
+
+
+def get_work_days(calendar_settings):
+    """Get list of work day codes (MO, TU, etc.)"""
+    if calendar_settings['work_schedule'] == 'custom':
+        return calendar_settings['custom_days'].split(',')
+    return WORK_SCHEDULES.get(calendar_settings['work_schedule'], 'MO,TU,WE,TH,FR').split(',')
+
+
+def parse_calendar_settings(row: Dict) -> Dict:
+    """Calendar settings row with excluded dates and ranges decoded"""
+    settings = dict(row)
+    settings['excluded_dates'] = json.loads(settings.get('excluded_dates') or '[]')
+    settings['excluded_ranges'] = json.loads(settings.get('excluded_ranges') or '[]')
+    return settings
+
+
+def merge_spans(spans: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """Sort inclusive (first, last) date spans and merge overlapping or adjacent ones"""
+    merged = []
+    for first, last in sorted(spans):
+        if merged and first <= merged[-1][1] + timedelta(days=1):
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+class WorkCalendar:
+    """Work days, work hours and excluded spans of one version of the calendar settings"""
+    
+    def __init__(self, calendar_settings: Dict):
+        self.settings = calendar_settings
+        self.version = calendar_settings.get('version')
+        self.row = None  # settings row the live calendar was built from
+        self.work_days = frozenset(DAY_CODES.index(code) for code in get_work_days(calendar_settings))
+        self.work_start = datetime.strptime(calendar_settings['work_start_time'], "%H:%M").time()
+        self.work_end = datetime.strptime(calendar_settings['work_end_time'], "%H:%M").time()
+        
+        spans = [(date.fromisoformat(day), date.fromisoformat(day))
+                 for day in calendar_settings.get('excluded_dates') or []]
+        spans += [(date.fromisoformat(str(span['start_date'])), date.fromisoformat(str(span['end_date'])))
+                  for span in calendar_settings.get('excluded_ranges') or []]
+        self.excluded_spans = merge_spans(spans)
+        self._span_starts = [first for first, _ in self.excluded_spans]
+    
+    def _excluded_span(self, day: date) -> Optional[Tuple[date, date]]:
+        """The excluded span containing day, if any"""
+        position = bisect_right(self._span_starts, day) - 1
+        if position >= 0 and day <= self.excluded_spans[position][1]:
+            return self.excluded_spans[position]
+        return None
+    
+    def is_work_day(self, day: date) -> bool:
+        return day.weekday() in self.work_days and self._excluded_span(day) is None
+    
+    def excluded_spans_between(self, start_date: date, end_date: date) -> List[Tuple[date, date]]:
+        """Excluded spans overlapping start_date..end_date, clipped to it"""
+        position = max(bisect_right(self._span_starts, start_date) - 1, 0)
+        spans = []
+        for first, last in self.excluded_spans[position:]:
+            if first > end_date:
+                break
+            if last >= start_date:
+                spans.append((max(first, start_date), min(last, end_date)))
+        return spans
+    
+    def iter_windows(self, start_date: date, end_date: date) -> Iterator[Tuple[datetime, datetime]]:
+        """
+        Lazily yield (start_datetime, end_datetime) work windows day by day
+        Callers that stop early (a task's hours are placed) never build the rest
+        """
+        if not self.work_days:
+            return
+        current = start_date
+        while current <= end_date:
+            span = self._excluded_span(current)
+            if span is not None:
+                current = span[1] + timedelta(days=1)
+                continue
+            if current.weekday() in self.work_days:
+                yield datetime.combine(current, self.work_start), datetime.combine(current, self.work_end)
+            current += timedelta(days=1)
+    
+    def windows(self, start_date: date, end_date: date) -> List[Tuple[datetime, datetime]]:
+        return list(self.iter_windows(start_date, end_date))
+
+
+def get_work_calendar() -> WorkCalendar:
+    """
+    The live calendar, re-read once the data version moves on and rebuilt only
+    when the settings row changed (so callers can keep comparing by identity)
+    """
+    global _calendar, _calendar_data_version
+    from database import db
+    data_version = db.data_version()
+    cached_version, calendar = _calendar_data_version, _calendar
+    if calendar is not None and cached_version == data_version:
+        return calendar
+    
+    with _calendar_lock:
+        row = db.execute_one("SELECT * FROM calendar_settings WHERE id = 1")
+        if _calendar is None or _calendar.row != row:
+            calendar = WorkCalendar(parse_calendar_settings(row))
+            calendar.row = row
+            _calendar = calendar
+        _calendar_data_version = data_version
+        return _calendar
+
+
+def work_calendar_for(calendar_settings: Dict) -> WorkCalendar:
+    """
+    Calendar for a settings dict: the cached one for the live settings, otherwise
+    a fresh one (scenario overrides, benchmark settings)
+    """
+    calendar = _calendar
+    if calendar is not None and calendar.settings is calendar_settings:
+        return calendar
+    return WorkCalendar(calendar_settings)
@@ -124,4 +124,29 @@ export const api = {
   }),
   getTimeAllocations: (taskId) => request(`/time-allocations/${taskId}`),
   deleteTimeAllocation: (id) => request(`/time-allocations/${id}`, { method: 'DELETE' }),
+  detachInstance: (allocationId, originalStart) => request(`/time-allocations/${allocationId}/instances/detach`, {
+    method: 'POST',
+    body: JSON.stringify({ original_start: originalStart }),
+  }),
+  deleteInstance: (allocationId, originalStart) =>
+    request(`/time-allocations/${allocationId}/instances?original_start=${encodeURIComponent(originalStart)}`, { method: 'DELETE' }),
 };
+
+// Recurring instances without a slot row (every instance of a virtual allocation,
+// and those past the rolling horizon) come from /slots with id null; they are
+// told apart by allocation and original start, and stored as a slot row
+// (detached) before they are edited through /slots/{id}
+export function slotKey(slot) {
+  return slot.id ?? `${slot.allocation_id}@${slot.original_start}`;
+}
+
+export async function slotIdFor(slot) {
+  if (slot.id != null) return slot.id;
+  const result = await api.detachInstance(slot.allocation_id, slot.original_start);
+  return result.slot.id;
+}
+
+export function deleteSlotOrInstance(slot) {
+  if (slot.id != null) return api.deleteSlot(slot.id);
+  return api.deleteInstance(slot.allocation_id, slot.original_start);
+}
@@ -25,7 +25,9 @@ echo -e "${BLUE}Starting backend...${NC}"
 cd backend
 source venv/bin/activate
 echo -e "Environment is activated"
-python main.py > ../backend.log 2>&1 &
+# Run through uvicorn's module entry point: scenario worker processes then import
+# only the worker module instead of re-running main.py (spawn start method)
+python -m uvicorn main:app --host 0.0.0.0 --port 8000 > ../backend.log 2>&1 &
 BACKEND_PID=$!
 cd ..
 
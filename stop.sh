@@ -5,7 +5,7 @@
 echo "Stopping PhD Task Manager..."
 
 # Kill backend (Python)
-pkill -f "python main.py"
+pkill -f "uvicorn main:app"
 
 # Kill frontend (npm/vite)
 pkill -f "vite"